@@ -0,0 +1,39 @@
+"""
+Add a Redis node to the sharded queue backend (QUEUE_BACKEND=redis-sharded)
+and move the jobs the hash ring now assigns to it
+Usage: python add_shard.py host:port
+
+Afterwards restart every API and worker process with the node added to
+REDIS_NODES, so they route jobs to the same ring.
+"""
+
+import os
+import sys
+
+# Add the project root directory to Python path
+project_root = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(project_root)
+
+from workers.queue_manager import QueueManager
+
+def main():
+    if len(sys.argv) != 2 or ':' not in sys.argv[1]:
+        print(__doc__)
+        sys.exit(1)
+    node = sys.argv[1]
+
+    queue_manager = QueueManager()
+    if not hasattr(queue_manager.backend, 'add_node'):
+        print(f"❌ The {queue_manager.backend.name} backend is not sharded (set QUEUE_BACKEND=redis-sharded)")
+        sys.exit(1)
+    if node in queue_manager.backend.shards:
+        print(f"❌ {node} is already a shard")
+        sys.exit(1)
+
+    moved = queue_manager.add_shard(node)
+    nodes = ','.join(queue_manager.backend.nodes)
+    print(f"✅ Added {node}, moved {moved} jobs onto it")
+    print(f"   Restart the API and workers with REDIS_NODES={nodes}")
+
+if __name__ == '__main__':
+    main()
@@ -1,11 +1,15 @@
 """
 REST API with WebSocket for real-time updates
 """
-from flask import Flask, request, jsonify, send_from_directory
+from flask import Flask, Response, request, jsonify, send_from_directory
 from flask_socketio import SocketIO, emit
 from flask_cors import CORS
 import os
 import sys
+import json
+import queue
+import time
+from datetime import datetime
 
 # Add parent directory to Python path
 current_dir = os.path.dirname(os.path.abspath(__file__))
@@ -17,14 +21,29 @@ from workers.queue_manager import QueueManager
 from database.db_manager import DatabaseManager
 import workers.tasks
 from workers.task_registry import task_registry
+from workers.events import FINAL_STATUSES
+from workers.admission import AdmissionRejected
+from workers import tracing
+from api.cache import ResponseCache
+from config import Config
 
 app = Flask(__name__)
 CORS(app)
 socketio = SocketIO(app, cors_allowed_origins="*")
 
-# Initialize managers
-queue_manager = QueueManager()
+# Initialize managers (one shared database engine)
 db_manager = DatabaseManager()
+queue_manager = QueueManager(db=db_manager)
+
+# Read endpoints the dashboard polls; job transitions published by
+# workers in other processes make them stale too
+response_cache = ResponseCache()
+queue_manager.events.add_listener(response_cache.invalidate)
+
+@app.before_request
+def start_job_events():
+    """Listen for job updates once the app serves requests, not at import"""
+    queue_manager.events.start()
 
 # ============================================================
 # WebSocket Events
@@ -42,6 +61,11 @@ def handle_disconnect():
     """Client disconnected from WebSocket"""
     print("💔 Client disconnected from WebSocket")
 
+def notify_job_change():
+    """A job changed state here: drop stale cached reads and push fresh data"""
+    response_cache.invalidate()
+    emit_updates()
+
 def emit_updates():
     """Emit all updates to connected clients"""
     try:
@@ -50,11 +74,8 @@ def emit_updates():
         socketio.emit('stats', {'stats': stats})
 
         # Emit queue status
-        queues = {
-            'high': queue_manager.get_queue_size('high'),
-            'default': queue_manager.get_queue_size('default'),
-            'low': queue_manager.get_queue_size('low')
-        }
+        # Priority queues plus any dedicated queues from TASK_ROUTES
+        queues = {name: queue_manager.get_queue_size(name) for name in queue_manager.queues}
         socketio.emit('queues', {'queues': queues})
 
         # Emit recent jobs
@@ -96,14 +117,29 @@ def api_info():
 # ============================================================
 
 @app.route('/api/jobs', methods=['GET'])
+@response_cache.cached()
 def get_jobs():
-    """Get all jobs"""
+    """Get all jobs, or one page filtered by ?status= and/or ?task="""
     try:
         limit = int(request.args.get('limit', 100))
-        jobs = db_manager.get_all_jobs(limit=limit)
+        status = request.args.get('status')
+        task_name = request.args.get('task')
+        if not (status or task_name):
+            jobs = db_manager.get_all_jobs(limit=limit)
+            return jsonify({
+                'success': True,
+                'jobs': jobs
+            })
+        
+        # Filtered views come from the queue backend's indexes
+        offset = int(request.args.get('offset', 0))
+        jobs, total = queue_manager.find_jobs(status, task_name, offset, min(limit, 1000))
         return jsonify({
             'success': True,
-            'jobs': jobs
+            'jobs': [job.to_dict() for job in jobs],
+            'total': total,
+            'offset': offset,
+            'limit': limit
         })
     except Exception as e:
         print(f"Error getting jobs: {e}")
@@ -117,21 +153,68 @@ def create_job():
     """Create a new job"""
     try:
         data = request.get_json()
-        job = Job(
-            task_name=data['task_name'],
-            task_data=data['task_data']
-        )
-        queue_name = data.get('queue', 'default')
-        job_id = queue_manager.add_job(job, queue_name)
-        
-        # Emit updates to all clients
-        emit_updates()
-        
+        tracer = queue_manager.tracer
+        upstream = tracing.parse_traceparent(request.headers.get('traceparent'))
+        with tracer.span('create_job', parent=upstream, task=data['task_name']) as root:
+            job = Job(
+                task_name=data['task_name'],
+                task_data=data['task_data'],
+                soft_time_limit=data.get('soft_time_limit'),
+                time_limit=data.get('time_limit'),
+                tenant=data.get('tenant')
+            )
+            root.job_id = job.id
+            if tracer.enabled:
+                # Every later span of this job, in any process, hangs off this one
+                job.trace = root.context
+            queue_name = data.get('queue', 'default')
+            
+            # A large analyze_data run can be split into partial jobs plus a reducer
+            partitions = 1
+            if job.task_name == 'analyze_data':
+                if not isinstance(job.task_data, dict):
+                    return jsonify({
+                        'success': False,
+                        'error': 'task_data must be an object'
+                    }), 400
+                partitions = job.task_data.get('partitions') or 1
+                if (not isinstance(partitions, int) or isinstance(partitions, bool)
+                        or not 1 <= partitions <= Config.MAP_REDUCE_MAX_PARTITIONS):
+                    return jsonify({
+                        'success': False,
+                        'error': f'partitions must be an integer from 1 to {Config.MAP_REDUCE_MAX_PARTITIONS}'
+                    }), 400
+            if partitions > 1:
+                job_id, partial_ids = queue_manager.add_map_reduce(job, partitions, queue_name, enforce_limits=True)
+                notify_job_change()
+                return jsonify({
+                    'success': True,
+                    'job_id': job_id,
+                    'partial_job_ids': partial_ids,
+                    'message': f'Job split into {len(partial_ids)} partial jobs and a reducer'
+                })
+            
+            job_id = queue_manager.add_job(job, queue_name, enforce_limits=True)
+            
+            # Emit updates to all clients
+            notify_job_change()
+            
+            return jsonify({
+                'success': True,
+                'job_id': job_id,
+                'message': 'Job created!'
+            })
+    except AdmissionRejected as e:
         return jsonify({
-            'success': True,
-            'job_id': job_id,
-            'message': 'Job created!'
-        })
+            'success': False,
+            'error': str(e),
+            'reason': e.reason
+        }), 429, {'Retry-After': str(e.retry_after)}
+    except ValueError as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 400
     except Exception as e:
         print(f"Error creating job: {e}")
         return jsonify({
@@ -147,7 +230,9 @@ def get_job(job_id):
         if job:
             return jsonify({
                 'success': True,
-                'job': job
+                'job': job,
+                # Traced steps (create, enqueue, queue wait, ..., execute)
+                'timeline': tracing.timeline(db_manager.get_job_spans(job_id))
             })
         return jsonify({
             'success': False,
@@ -160,22 +245,225 @@ def get_job(job_id):
             'error': str(e)
         }), 500
 
+@app.route('/api/jobs/lookup', methods=['POST'])
+def lookup_jobs():
+    """Status (or chosen fields) of many jobs in one request"""
+    try:
+        data = request.get_json() or {}
+        job_ids = data.get('job_ids')
+        fields = data.get('fields', ['status'])
+        if not isinstance(job_ids, list) or not all(isinstance(job_id, str) for job_id in job_ids):
+            return jsonify({
+                'success': False,
+                'error': 'job_ids must be a list of job IDs'
+            }), 400
+        if len(job_ids) > Config.LOOKUP_MAX_IDS:
+            return jsonify({
+                'success': False,
+                'error': f'At most {Config.LOOKUP_MAX_IDS} job IDs per lookup'
+            }), 400
+        if fields is not None and (not isinstance(fields, list)
+                                   or not all(isinstance(field, str) for field in fields)):
+            return jsonify({
+                'success': False,
+                'error': 'fields must be a list of field names, or null for whole jobs'
+            }), 400
+        
+        jobs, missing = queue_manager.lookup_jobs(job_ids, fields)
+        return jsonify({
+            'success': True,
+            'jobs': jobs,
+            'missing': missing
+        })
+    except Exception as e:
+        print(f"Error looking up jobs: {e}")
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+@app.route('/api/blobs/<digest>', methods=['GET'])
+def get_blob(digest):
+    """Raw JSON of an offloaded task_data/result ({"$blob": digest} in a job)"""
+    try:
+        blobs = queue_manager.blobs
+        if not blobs.exists(digest):
+            return jsonify({
+                'success': False,
+                'error': 'Blob not found'
+            }), 404
+        path = blobs.path(digest)
+        return send_from_directory(os.path.dirname(os.path.abspath(path)), digest,
+                                   mimetype='application/json', max_age=31536000)
+    except ValueError as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 400
+    except Exception as e:
+        print(f"Error getting blob: {e}")
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+@app.route('/api/blobs', methods=['POST'])
+def create_blob():
+    """Store a JSON body (e.g. a big dataset) and return its reference"""
+    try:
+        body = request.get_data()
+        json.loads(body)
+        return jsonify({
+            'success': True,
+            'ref': queue_manager.blobs.put(body)
+        }), 201
+    except ValueError as e:
+        return jsonify({
+            'success': False,
+            'error': f'Body must be JSON: {e}'
+        }), 400
+    except Exception as e:
+        print(f"Error storing blob: {e}")
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+def _current_job(job_id):
+    """Latest job state from the queue backend, falling back to the database"""
+    job = queue_manager.get_job(job_id)
+    if job:
+        return job.to_dict()
+    return db_manager.get_job(job_id)
+
+@app.route('/api/jobs/<job_id>/wait', methods=['GET'])
+def wait_for_job(job_id):
+    """Long-poll until the job finishes or the timeout (seconds) expires"""
+    try:
+        timeout = min(float(request.args.get('timeout', 30)), 300)
+        
+        # Subscribe before reading the state so no update is missed
+        waiter = queue_manager.events.subscribe(job_id)
+        try:
+            job = _current_job(job_id)
+            if not job:
+                return jsonify({
+                    'success': False,
+                    'error': 'Job not found'
+                }), 404
+            
+            deadline = time.monotonic() + timeout
+            status = job['status']
+            while status not in FINAL_STATUSES:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    status = waiter.get(timeout=remaining)
+                except queue.Empty:
+                    break
+        finally:
+            queue_manager.events.unsubscribe(job_id, waiter)
+        
+        if status != job['status']:
+            job = _current_job(job_id)
+        return jsonify({
+            'success': True,
+            'job': job,
+            'timed_out': job['status'] not in FINAL_STATUSES
+        })
+    except Exception as e:
+        print(f"Error waiting for job: {e}")
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+@app.route('/api/jobs/<job_id>/events', methods=['GET'])
+def job_events(job_id):
+    """Server-Sent Events stream of a job's status changes"""
+    waiter = queue_manager.events.subscribe(job_id)
+    job = _current_job(job_id)
+    if not job:
+        queue_manager.events.unsubscribe(job_id, waiter)
+        return jsonify({
+            'success': False,
+            'error': 'Job not found'
+        }), 404
+    
+    def stream():
+        try:
+            status = job['status']
+            yield f"event: status\ndata: {json.dumps({'job_id': job_id, 'status': status})}\n\n"
+            while status not in FINAL_STATUSES:
+                try:
+                    status = waiter.get(timeout=15)
+                except queue.Empty:
+                    # Keep proxies from closing an idle connection
+                    yield ": keep-alive\n\n"
+                    continue
+                yield f"event: status\ndata: {json.dumps({'job_id': job_id, 'status': status})}\n\n"
+        finally:
+            queue_manager.events.unsubscribe(job_id, waiter)
+    
+    return Response(stream(), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'
+    })
+
+@app.route('/api/jobs/<job_id>/cancel', methods=['POST'])
+def cancel_job(job_id):
+    """Cancel a queued or running job"""
+    try:
+        status = queue_manager.cancel_job(job_id)
+        if not status:
+            return jsonify({
+                'success': False,
+                'error': 'Job not found or already finished'
+            }), 409
+        
+        # Emit updates to all clients
+        notify_job_change()
+        
+        return jsonify({
+            'success': True,
+            'job_id': job_id,
+            'status': status
+        })
+    except Exception as e:
+        print(f"Error cancelling job: {e}")
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
 @app.route('/api/job-update', methods=['POST'])
 def job_update():
-    """Receive job updates from workers"""
+    """Receive job updates from workers
+
+    Takes one update ({job_id, status}) or a batch ({updates: [...]})
+    """
     try:
         data = request.get_json()
-        job_id = data.get('job_id')
-        status = data.get('status')
+        updates = data.get('updates') or [data]
+        updates = [u for u in updates if u.get('job_id') and u.get('status')]
         
-        if job_id and status:
-            # Emit updates to all clients
-            emit_updates()
+        if updates:
+            # Emit updates to all clients, once per request
+            notify_job_change()
             
+            if len(updates) == 1:
+                message = f"Job {updates[0]['job_id']} status updated to {updates[0]['status']}"
+            else:
+                message = f'{len(updates)} job updates received'
             return jsonify({
                 'success': True,
-                'message': f'Job {job_id} status updated to {status}'
+                'message': message
             })
+        return jsonify({
+            'success': False,
+            'error': 'job_id and status are required'
+        }), 400
     except Exception as e:
         print(f"Error handling job update: {e}")
         return jsonify({
@@ -188,18 +476,18 @@ def job_update():
 # ============================================================
 
 @app.route('/api/queues', methods=['GET'])
+@response_cache.cached()
 def get_queues():
     """Get queue status"""
     try:
-        queues = {
-            'high': queue_manager.get_queue_size('high'),
-            'default': queue_manager.get_queue_size('default'),
-            'low': queue_manager.get_queue_size('low')
-        }
+        # Priority queues plus any dedicated queues from TASK_ROUTES
+        queues = {name: queue_manager.get_queue_size(name) for name in queue_manager.queues}
         return jsonify({
             'success': True,
             'queues': queues,
-            'total': sum(queues.values())
+            'total': sum(queues.values()),
+            'pending': queue_manager.get_pending_summary(),
+            'tenants': queue_manager.get_tenant_backlog()
         })
     except Exception as e:
         print(f"Error getting queue status: {e}")
@@ -208,11 +496,126 @@ def get_queues():
             'error': str(e)
         }), 500
 
+@app.route('/api/workers', methods=['GET'])
+def get_workers():
+    """Registered workers with their latest heartbeat (add ?alive=1 for live ones only)"""
+    try:
+        workers = queue_manager.get_workers()
+        if request.args.get('alive') in ('1', 'true'):
+            workers = [w for w in workers if w['alive']]
+        return jsonify({
+            'success': True,
+            'workers': workers,
+            'alive': sum(1 for w in workers if w['alive'])
+        })
+    except Exception as e:
+        print(f"Error getting workers: {e}")
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+# ============================================================
+# Dead-Letter Queue Routes
+# ============================================================
+
+def _dead_letter_filters(data):
+    """Common task/time/error filters from query args or a JSON body"""
+    start = data.get('start')
+    end = data.get('end')
+    return {
+        'task_name': data.get('task'),
+        'start': datetime.fromisoformat(start) if start else None,
+        'end': datetime.fromisoformat(end) if end else None
+    }
+
+@app.route('/api/dead-letters', methods=['GET'])
+def get_dead_letters():
+    """Page through permanently failed jobs, newest first"""
+    try:
+        filters = _dead_letter_filters(request.args)
+        entries = queue_manager.get_dead_letters(
+            offset=int(request.args.get('offset', 0)),
+            limit=min(int(request.args.get('limit', 100)), 1000),
+            **filters
+        )
+        return jsonify({
+            'success': True,
+            'dead_letters': entries,
+            'counts': queue_manager.get_dead_letter_counts()
+        })
+    except ValueError as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 400
+    except Exception as e:
+        print(f"Error getting dead letters: {e}")
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+@app.route('/api/dead-letters/requeue', methods=['POST'])
+def requeue_dead_letters():
+    """Requeue dead-lettered jobs matching task/time/error filters"""
+    try:
+        data = request.get_json() or {}
+        requeued = queue_manager.requeue_dead_letters(
+            error_contains=data.get('error_contains'),
+            limit=data.get('limit'),
+            queue_name=data.get('queue'),
+            **_dead_letter_filters(data)
+        )
+        notify_job_change()
+        return jsonify({
+            'success': True,
+            'requeued': requeued
+        })
+    except ValueError as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 400
+    except Exception as e:
+        print(f"Error requeueing dead letters: {e}")
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+@app.route('/api/dead-letters/purge', methods=['POST'])
+def purge_dead_letters():
+    """Delete dead-lettered jobs matching task/time/error filters"""
+    try:
+        data = request.get_json() or {}
+        purged = queue_manager.purge_dead_letters(
+            error_contains=data.get('error_contains'),
+            limit=data.get('limit'),
+            **_dead_letter_filters(data)
+        )
+        return jsonify({
+            'success': True,
+            'purged': purged
+        })
+    except ValueError as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 400
+    except Exception as e:
+        print(f"Error purging dead letters: {e}")
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
 # ============================================================
 # Statistics Routes
 # ============================================================
 
 @app.route('/api/stats', methods=['GET'])
+@response_cache.cached()
 def get_stats():
     """Get job statistics"""
     try:
@@ -228,11 +631,47 @@ def get_stats():
             'error': str(e)
         }), 500
 
+@app.route('/api/analytics', methods=['GET'])
+def get_analytics():
+    """Per-task throughput, failure rate and execution time percentiles"""
+    try:
+        start = request.args.get('start')
+        end = request.args.get('end')
+        granularity = request.args.get('granularity', 'hour')
+        if granularity not in ('hour', 'day', 'total'):
+            return jsonify({
+                'success': False,
+                'error': "granularity must be 'hour', 'day' or 'total'"
+            }), 400
+        
+        analytics = db_manager.get_task_analytics(
+            task_name=request.args.get('task'),
+            start=datetime.fromisoformat(start) if start else None,
+            end=datetime.fromisoformat(end) if end else None,
+            granularity=granularity
+        )
+        return jsonify({
+            'success': True,
+            'analytics': analytics
+        })
+    except ValueError as e:
+        return jsonify({
+            'success': False,
+            'error': f'Invalid time range: {e}'
+        }), 400
+    except Exception as e:
+        print(f"Error getting analytics: {e}")
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
 # ============================================================
 # Task Management Routes
 # ============================================================
 
 @app.route('/api/tasks', methods=['GET'])
+@response_cache.cached(permanent=True)
 def get_tasks():
     """Get available tasks"""
     try:
@@ -0,0 +1,77 @@
+"""
+Short-lived response cache for read endpoints, with ETag revalidation
+
+A cached view's JSON body is kept per URL for up to API_CACHE_TTL
+seconds and sent with an ETag; a client that sends it back in
+If-None-Match gets an empty 304 while the data is unchanged.
+invalidate() is called on every job transition and makes entries stale,
+but an entry younger than API_CACHE_MIN_AGE is still served, so however
+fast jobs move, each URL is recomputed at most once per MIN_AGE no
+matter how many dashboards are polling it.
+"""
+
+import hashlib
+import threading
+import time
+from functools import wraps
+from flask import current_app, make_response, request
+from config import Config
+
+class ResponseCache:
+    def __init__(self, ttl=None, min_age=None, max_entries=256):
+        self.ttl = Config.API_CACHE_TTL if ttl is None else ttl
+        self.min_age = Config.API_CACHE_MIN_AGE if min_age is None else min_age
+        self.max_entries = max_entries
+        self.generation = 0
+        self._entries = {}  # URL -> (etag, body, created, generation)
+        self._locks = {}
+        self._lock = threading.Lock()
+
+    def invalidate(self, *args):
+        """Mark every entry stale (takes and ignores a job update's arguments)"""
+        self.generation += 1
+
+    def _fresh(self, entry, permanent):
+        if permanent:
+            return True
+        age = time.monotonic() - entry[2]
+        return age < self.min_age or (age < self.ttl and entry[3] == self.generation)
+
+    def _key_lock(self, key):
+        with self._lock:
+            if len(self._locks) >= self.max_entries:
+                self._entries.clear()
+                self._locks.clear()
+            return self._locks.setdefault(key, threading.Lock())
+
+    def cached(self, permanent=False):
+        """Decorator for a GET view; permanent views never expire or invalidate"""
+        def decorator(view):
+            @wraps(view)
+            def wrapper(*args, **kwargs):
+                if self.ttl <= 0 and not permanent:
+                    return view(*args, **kwargs)
+                key = request.full_path
+                entry = self._entries.get(key)
+                if not (entry and self._fresh(entry, permanent)):
+                    # One request recomputes; concurrent ones wait for its result
+                    with self._key_lock(key):
+                        entry = self._entries.get(key)
+                        if not (entry and self._fresh(entry, permanent)):
+                            # Read first, so a transition during the view invalidates it
+                            generation = self.generation
+                            response = make_response(view(*args, **kwargs))
+                            if response.status_code != 200:
+                                return response
+                            body = response.get_data()
+                            etag = hashlib.blake2b(body, digest_size=16).hexdigest()
+                            entry = (etag, body, time.monotonic(), generation)
+                            self._entries[key] = entry
+
+                response = current_app.response_class(entry[1], mimetype='application/json')
+                response.set_etag(entry[0])
+                # Browsers may keep the body but must revalidate before using it
+                response.headers['Cache-Control'] = 'no-cache'
+                return response.make_conditional(request)
+            return wrapper
+        return decorator
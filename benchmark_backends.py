@@ -0,0 +1,69 @@
+"""
+Compare queue backends: enqueue and dequeue throughput
+Usage: python benchmark_backends.py [num_jobs]
+"""
+
+import os
+import sys
+import tempfile
+import time
+
+# Add the project root directory to Python path
+project_root = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(project_root)
+
+from workers.job import Job
+
+QUEUE_KEYS = ['queue:high_priority', 'queue:default', 'queue:low_priority']
+
+def build_backends():
+    """Yield (label, backend) for every backend available here"""
+    from workers.backends.sqlite_backend import MemoryBackend, SQLiteBackend
+    yield 'memory', MemoryBackend()
+
+    path = os.path.join(tempfile.mkdtemp(), 'bench_queue.db')
+    yield 'sqlite (WAL)', SQLiteBackend(path)
+
+    try:
+        from workers.backends.redis_backend import RedisBackend
+        backend = RedisBackend()
+        backend.redis_client.ping()
+        yield 'redis', backend
+    except Exception as e:
+        print(f"⚠️  Skipping redis: {e}")
+
+def run(backend, num_jobs):
+    backend.clear_all(QUEUE_KEYS)
+    jobs = [Job('send_email', {'to': f'user{i}@example.com'}) for i in range(num_jobs)]
+
+    start = time.perf_counter()
+    for i, job in enumerate(jobs):
+        backend.enqueue(job.id, job.to_json(), QUEUE_KEYS[i % 3])
+    enqueue_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    dequeued = 0
+    while backend.dequeue(QUEUE_KEYS):
+        dequeued += 1
+    dequeue_time = time.perf_counter() - start
+
+    backend.clear_all(QUEUE_KEYS)
+    assert dequeued == num_jobs, f"expected {num_jobs} jobs, got {dequeued}"
+    return num_jobs / enqueue_time, num_jobs / dequeue_time
+
+def main():
+    num_jobs = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+
+    print("\n" + "=" * 60)
+    print(f"⏱️  Queue backend benchmark ({num_jobs} jobs)")
+    print("=" * 60)
+    print(f"{'backend':<16}{'enqueue/s':>14}{'dequeue/s':>14}")
+
+    for label, backend in build_backends():
+        enqueue_rate, dequeue_rate = run(backend, num_jobs)
+        print(f"{label:<16}{enqueue_rate:>14,.0f}{dequeue_rate:>14,.0f}")
+
+    print("=" * 60 + "\n")
+
+if __name__ == '__main__':
+    main()
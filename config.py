@@ -8,4 +8,83 @@ class Config:
     REDIS_PORT = int(os.getenv('REDIS_PORT', 6379))
     REDIS_PASSWORD = os.getenv('REDIS_PASSWORD', None)
     REDIS_DB = int(os.getenv('REDIS_DB', 0))
-    FLASK_PORT = int(os.getenv('PORT', 5000))
\ No newline at end of file
+    # Comma-separated host:port list for the 'redis-sharded' backend
+    REDIS_NODES = os.getenv('REDIS_NODES', '')
+    FLASK_PORT = int(os.getenv('PORT', 5000))
+
+    # Queue backend: 'redis', 'redis-streams', 'redis-sharded',
+    # 'sqlite' (single-node, durable) or 'memory' (tests)
+    QUEUE_BACKEND = os.getenv('QUEUE_BACKEND', 'redis')
+    SQLITE_QUEUE_PATH = os.getenv('SQLITE_QUEUE_PATH', 'queue.db')
+
+    # Redis Streams backend ('redis-streams')
+    STREAM_GROUP = os.getenv('STREAM_GROUP', 'workers')
+    STREAM_MAXLEN = int(os.getenv('STREAM_MAXLEN', 1000000))
+    STREAM_CLAIM_IDLE_MS = int(os.getenv('STREAM_CLAIM_IDLE_MS', 60000))
+    WORKER_PREFETCH = int(os.getenv('WORKER_PREFETCH', 1))
+
+    # Where archive_old_jobs writes jobs-YYYY-MM-DD.jsonl.gz files
+    ARCHIVE_DIR = os.getenv('ARCHIVE_DIR', 'archive')
+
+    # Admission control for POST /api/jobs (0 or empty = unlimited)
+    MAX_QUEUE_DEPTH = os.getenv('MAX_QUEUE_DEPTH', '')   # e.g. "high=100000,default=500000"
+    MAX_TASK_DEPTH = os.getenv('MAX_TASK_DEPTH', '')     # e.g. "send_email=200000"
+    SUBMIT_RATE_LIMIT = float(os.getenv('SUBMIT_RATE_LIMIT', 0))  # jobs/second, all clients
+    SUBMIT_BURST = float(os.getenv('SUBMIT_BURST', 0))
+    # Reject submissions to SHED_QUEUES once all queues hold SHED_TOTAL_DEPTH jobs
+    SHED_TOTAL_DEPTH = int(os.getenv('SHED_TOTAL_DEPTH', 0))
+    SHED_QUEUES = os.getenv('SHED_QUEUES', 'low')
+    ADMISSION_RETRY_AFTER = int(os.getenv('ADMISSION_RETRY_AFTER', 5))  # seconds
+
+    # Most job IDs one POST /api/jobs/lookup may ask for
+    LOOKUP_MAX_IDS = int(os.getenv('LOOKUP_MAX_IDS', 10000))
+
+    # Read endpoints the dashboard polls (/api/stats, /api/queues, GET
+    # /api/jobs) are cached this long; a job transition makes them stale,
+    # but they are recomputed at most once per API_CACHE_MIN_AGE (0 = off)
+    API_CACHE_TTL = float(os.getenv('API_CACHE_TTL', 5))
+    API_CACHE_MIN_AGE = float(os.getenv('API_CACHE_MIN_AGE', 0.5))
+
+    # Fair scheduling across tenants within a queue (weighted round-robin)
+    TENANT_WEIGHTS = os.getenv('TENANT_WEIGHTS', '')  # e.g. "search=4,billing=1"
+    TENANT_DEFAULT_WEIGHT = int(os.getenv('TENANT_DEFAULT_WEIGHT', 1))
+
+    # Route tasks to dedicated queues: "pattern=queue,..." (first match wins),
+    # e.g. "process_image=images,send_*=notifications"
+    TASK_ROUTES = os.getenv('TASK_ROUTES', '')
+
+    # task_data/results larger than this (bytes of JSON) are stored once in
+    # BLOB_DIR and referenced from the job; 0 keeps everything inline
+    BLOB_DIR = os.getenv('BLOB_DIR', 'blobs')
+    BLOB_THRESHOLD = int(os.getenv('BLOB_THRESHOLD', 256 * 1024))
+
+    # Worker heartbeats: a worker silent for HEARTBEAT_TTL seconds is dead
+    # and its in-flight jobs are put back on the queue
+    HEARTBEAT_INTERVAL = float(os.getenv('HEARTBEAT_INTERVAL', 5))
+    HEARTBEAT_TTL = int(os.getenv('HEARTBEAT_TTL', 15))
+
+    # On SIGTERM/SIGINT a worker stops taking jobs and gives the running
+    # one this many seconds to finish before putting it back on the queue
+    WORKER_SHUTDOWN_GRACE = float(os.getenv('WORKER_SHUTDOWN_GRACE', 30))
+
+    # analyze_data can stream datasets from files under DATA_DIR
+    # (task_data 'source' paths are relative to it)
+    DATA_DIR = os.getenv('DATA_DIR', 'data')
+    # Most partial jobs one analyze_data submission may be split into
+    MAP_REDUCE_MAX_PARTITIONS = int(os.getenv('MAP_REDUCE_MAX_PARTITIONS', 64))
+
+    # Job tracing: comma-separated exporters - 'database' (the timeline in
+    # GET /api/jobs/<id>), 'file' (OTLP/JSON lines in TRACE_FILE) or
+    # 'package.module:Class'; empty or 'none' turns tracing off
+    TRACE_EXPORTERS = os.getenv('TRACE_EXPORTERS', 'database')
+    TRACE_FILE = os.getenv('TRACE_FILE', 'traces.jsonl')
+
+    # Queue/worker logs (see workers.logs): level, 'json' or 'text' lines,
+    # the share of jobs whose per-job lines are kept (warnings and errors
+    # always are), the longest field value written, and how many records
+    # may wait for the output before new ones are dropped
+    LOG_LEVEL = os.getenv('LOG_LEVEL', 'INFO')
+    LOG_FORMAT = os.getenv('LOG_FORMAT', 'json')
+    LOG_JOB_SAMPLE_RATE = float(os.getenv('LOG_JOB_SAMPLE_RATE', 1.0))
+    LOG_MAX_FIELD = int(os.getenv('LOG_MAX_FIELD', 500))
+    LOG_QUEUE_SIZE = int(os.getenv('LOG_QUEUE_SIZE', 10000))
@@ -2,20 +2,73 @@
 Database Manager - Handles all database operations
 """
 
-from sqlalchemy import create_engine, desc, func
+from sqlalchemy import create_engine, desc, func, event, text
 from sqlalchemy.orm import sessionmaker
-from database.models import Base, JobModel
+from database.models import Base, JobModel, TaskRollupModel, TaskRollupBinModel, JobSpanModel
+from database import sketch
 from workers.job import Job
+from workers.logs import get_logger
+import gzip
 import json
-from datetime import datetime
+import os
+import threading
+import time
+from datetime import datetime, timedelta
+
+# One engine (and connection pool) per database URL for the whole process
+_engines = {}
+_schema_ready = set()
+_engine_lock = threading.Lock()
+
+log = get_logger('database')
+
+def get_engine(db_url):
+    """Shared engine for a database URL, created on first use"""
+    engine = _engines.get(db_url)
+    if engine is None:
+        with _engine_lock:
+            engine = _engines.get(db_url)
+            if engine is None:
+                engine = create_engine(db_url, echo=False)
+                if engine.dialect.name == 'sqlite':
+                    event.listen(engine, 'connect', _configure_sqlite)
+                _engines[db_url] = engine
+    return engine
+
+def _configure_sqlite(dbapi_connection, connection_record):
+    """WAL lets readers and short write batches interleave with archival"""
+    cursor = dbapi_connection.cursor()
+    # Must come first and only takes effect on a new database file
+    # (see compact_database for existing ones)
+    cursor.execute('PRAGMA auto_vacuum=INCREMENTAL')
+    cursor.execute('PRAGMA journal_mode=WAL')
+    cursor.execute('PRAGMA busy_timeout=5000')
+    cursor.close()
+
+# Statuses counted by the analytics rollups
+FINISHED_STATUSES = ('completed', 'failed')
 
 class DatabaseManager:
     def __init__(self, db_url='sqlite:///jobs.db'):
-        """Initialize database connection"""
-        self.engine = create_engine(db_url, echo=False)
-        Base.metadata.create_all(self.engine)
-        self.Session = sessionmaker(bind=self.engine)
-        print(f"✅ Database initialized: {db_url}")
+        """Initialize database connection (no I/O until first query)"""
+        self.db_url = db_url
+        self.engine = get_engine(db_url)
+        self._sessionmaker = sessionmaker(bind=self.engine)
+    
+    def ensure_schema(self):
+        """Create tables once per process, on first use"""
+        if self.db_url in _schema_ready:
+            return
+        with _engine_lock:
+            if self.db_url not in _schema_ready:
+                Base.metadata.create_all(self.engine)
+                _schema_ready.add(self.db_url)
+                log.info('database initialized', url=self.db_url)
+    
+    def Session(self):
+        """Open a session, creating the schema on first use"""
+        self.ensure_schema()
+        return self._sessionmaker()
     
     def save_job(self, job, queue_name='default', worker_id=None):
         """Save or update a job in database"""
@@ -23,47 +76,94 @@ class DatabaseManager:
         try:
             # Check if job already exists
             job_model = session.query(JobModel).filter_by(id=job.id).first()
+            self._merge_job(session, job_model, job, queue_name, worker_id)
+            session.commit()
+            return True
             
-            if job_model:
-                # Update existing job
-                job_model.status = job.status
-                job_model.retry_count = job.retry_count
-                job_model.started_at = datetime.fromisoformat(job.started_at) if job.started_at else None
-                job_model.completed_at = datetime.fromisoformat(job.completed_at) if job.completed_at else None
-                job_model.result = json.dumps(job.result) if job.result else None
-                job_model.error = job.error
-                job_model.worker_id = worker_id
-                
-                # Calculate execution time
-                if job_model.started_at and job_model.completed_at:
-                    delta = job_model.completed_at - job_model.started_at
-                    job_model.execution_time = delta.total_seconds()
-            else:
-                # Create new job
-                job_model = JobModel(
-                    id=job.id,
-                    task_name=job.task_name,
-                    task_data=json.dumps(job.task_data),
-                    priority=job.priority,
-                    max_retries=job.max_retries,
-                    retry_count=job.retry_count,
-                    status=job.status,
-                    created_at=datetime.fromisoformat(job.created_at),
-                    queue_name=queue_name,
-                    worker_id=worker_id
-                )
-                session.add(job_model)
-            
+        except Exception as e:
+            session.rollback()
+            log.error('could not save job', job=job, error=str(e))
+            return False
+        finally:
+            session.close()
+    
+    def save_jobs(self, jobs, queue_name='default', worker_id=None):
+        """Save or update many jobs with one SELECT and one commit"""
+        session = self.Session()
+        try:
+            existing = {
+                model.id: model for model in
+                session.query(JobModel).filter(JobModel.id.in_([job.id for job in jobs]))
+            }
+            for job in jobs:
+                self._merge_job(session, existing.get(job.id), job, queue_name, worker_id)
             session.commit()
             return True
             
         except Exception as e:
             session.rollback()
-            print(f"❌ Error saving job to database: {e}")
+            log.error('could not save jobs', count=len(jobs), error=str(e))
             return False
         finally:
             session.close()
     
+    def _merge_job(self, session, job_model, job, queue_name, worker_id):
+        """Copy a Job onto its row (creating it if job_model is None)"""
+        previous_status = job_model.status if job_model else None
+        
+        if job_model:
+            # Update existing job
+            job_model.status = job.status
+            job_model.retry_count = job.retry_count
+            job_model.started_at = datetime.fromisoformat(job.started_at) if job.started_at else None
+            job_model.completed_at = datetime.fromisoformat(job.completed_at) if job.completed_at else None
+            job_model.result = json.dumps(job.stored('result')) if job.stored('result') else None
+            job_model.error = job.error
+            job_model.worker_id = worker_id
+            
+            # Calculate execution time
+            if job_model.started_at and job_model.completed_at:
+                delta = job_model.completed_at - job_model.started_at
+                job_model.execution_time = delta.total_seconds()
+        else:
+            # Create new job
+            job_model = JobModel(
+                id=job.id,
+                task_name=job.task_name,
+                task_data=json.dumps(job.stored('task_data')),
+                priority=job.priority,
+                max_retries=job.max_retries,
+                retry_count=job.retry_count,
+                status=job.status,
+                created_at=datetime.fromisoformat(job.created_at),
+                queue_name=queue_name,
+                worker_id=worker_id
+            )
+            session.add(job_model)
+        
+        # Roll up each job once, when it first reaches a final state
+        if job.status in FINISHED_STATUSES and previous_status != job.status:
+            self._record_rollup(session, job_model)
+    
+    def bulk_update_jobs(self, job_ids, batch_size=1000, **fields):
+        """Set the same column values on many jobs, one UPDATE per batch"""
+        updated = 0
+        session = self.Session()
+        try:
+            for start in range(0, len(job_ids), batch_size):
+                chunk = job_ids[start:start + batch_size]
+                updated += session.query(JobModel).filter(JobModel.id.in_(chunk)).update(
+                    fields, synchronize_session=False
+                )
+            session.commit()
+            return updated
+        except Exception as e:
+            session.rollback()
+            log.error('could not update jobs', count=len(job_ids), error=str(e))
+            return 0
+        finally:
+            session.close()
+    
     def get_job(self, job_id):
         """Get job by ID"""
         session = self.Session()
@@ -73,6 +173,51 @@ class DatabaseManager:
         finally:
             session.close()
     
+    def get_jobs(self, job_ids, batch_size=500):
+        """Get several jobs by ID in one session (missing IDs are left out)
+
+        One IN (...) query per batch_size IDs keeps each statement under
+        SQLite's bound-parameter limit.
+        """
+        job_ids = list(job_ids)
+        if not job_ids:
+            return []
+        session = self.Session()
+        try:
+            jobs = []
+            for start in range(0, len(job_ids), batch_size):
+                chunk = job_ids[start:start + batch_size]
+                jobs.extend(session.query(JobModel).filter(JobModel.id.in_(chunk)).all())
+            return [job.to_dict() for job in jobs]
+        finally:
+            session.close()
+    
+    def save_spans(self, spans):
+        """Insert trace spans (dicts from Span.to_dict) in one commit"""
+        if not spans:
+            return
+        session = self.Session()
+        try:
+            session.bulk_insert_mappings(JobSpanModel, [
+                dict(span, attributes=json.dumps(span['attributes']) if span['attributes'] else None)
+                for span in spans
+            ])
+            session.commit()
+        except Exception:
+            session.rollback()
+            raise
+        finally:
+            session.close()
+    
+    def get_job_spans(self, job_id):
+        """Trace spans recorded for a job, oldest first"""
+        session = self.Session()
+        try:
+            spans = session.query(JobSpanModel).filter_by(job_id=job_id).order_by(JobSpanModel.start_time).all()
+            return [span.to_dict() for span in spans]
+        finally:
+            session.close()
+    
     def get_all_jobs(self, limit=100):
         """Get all jobs"""
         session = self.Session()
@@ -117,6 +262,105 @@ class DatabaseManager:
         finally:
             session.close()
     
+    def _record_rollup(self, session, job_model):
+        """Add a finished job to its task/hour rollup with atomic increments"""
+        finished_at = job_model.completed_at or datetime.now()
+        bucket_start = finished_at.replace(minute=0, second=0, microsecond=0)
+        execution_time = job_model.execution_time
+        key = {'task_name': job_model.task_name, 'bucket_start': bucket_start}
+        
+        self._upsert_increment(session, TaskRollupModel, key, {
+            'completed': 1 if job_model.status == 'completed' else 0,
+            'failed': 1 if job_model.status == 'failed' else 0,
+            'total_execution_time': execution_time or 0.0,
+            'timed_jobs': 1 if execution_time is not None else 0
+        })
+        if execution_time is not None:
+            self._upsert_increment(session, TaskRollupBinModel,
+                                   dict(key, bin=sketch.bin_index(execution_time)),
+                                   {'count': 1})
+    
+    def _upsert_increment(self, session, model, key, increments):
+        """INSERT ... ON CONFLICT DO UPDATE SET col = col + n"""
+        if self.engine.dialect.name == 'postgresql':
+            from sqlalchemy.dialects.postgresql import insert
+        else:
+            from sqlalchemy.dialects.sqlite import insert
+        
+        table = model.__table__
+        stmt = insert(table).values(**key, **increments)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=list(key),
+            set_={col: table.c[col] + stmt.excluded[col] for col in increments}
+        )
+        session.execute(stmt)
+    
+    def get_task_analytics(self, task_name=None, start=None, end=None, granularity='hour'):
+        """Throughput, failure rate and p50/p95/p99 execution time per task
+
+        Reads only the rollup tables, so cost depends on the time range
+        and number of tasks, not on how many jobs have run.
+        granularity is 'hour', 'day' or 'total'.
+        """
+        session = self.Session()
+        try:
+            rollups = session.query(TaskRollupModel)
+            bins = session.query(TaskRollupBinModel)
+            if task_name:
+                rollups = rollups.filter(TaskRollupModel.task_name == task_name)
+                bins = bins.filter(TaskRollupBinModel.task_name == task_name)
+            if start:
+                rollups = rollups.filter(TaskRollupModel.bucket_start >= start)
+                bins = bins.filter(TaskRollupBinModel.bucket_start >= start)
+            if end:
+                rollups = rollups.filter(TaskRollupModel.bucket_start < end)
+                bins = bins.filter(TaskRollupBinModel.bucket_start < end)
+            
+            groups = {}
+            for row in rollups:
+                group = groups.setdefault(self._analytics_key(row, granularity), {
+                    'completed': 0, 'failed': 0, 'total_execution_time': 0.0,
+                    'timed_jobs': 0, 'bins': {}
+                })
+                group['completed'] += row.completed
+                group['failed'] += row.failed
+                group['total_execution_time'] += row.total_execution_time
+                group['timed_jobs'] += row.timed_jobs
+            
+            for row in bins:
+                group = groups.get(self._analytics_key(row, granularity))
+                if group is not None:
+                    group['bins'][row.bin] = group['bins'].get(row.bin, 0) + row.count
+            
+            results = []
+            for (task, bucket), group in sorted(groups.items(), key=lambda item: (item[0][0], item[0][1] or '')):
+                total = group['completed'] + group['failed']
+                timed = group['timed_jobs']
+                q = sketch.quantiles(group['bins'], (0.5, 0.95, 0.99))
+                results.append({
+                    'task_name': task,
+                    'bucket_start': bucket,
+                    'throughput': total,
+                    'completed': group['completed'],
+                    'failed': group['failed'],
+                    'failure_rate': round(group['failed'] / total, 4) if total else 0,
+                    'avg_execution_time': _round(group['total_execution_time'] / timed if timed else None),
+                    'p50': _round(q[0.5]),
+                    'p95': _round(q[0.95]),
+                    'p99': _round(q[0.99])
+                })
+            return results
+        finally:
+            session.close()
+    
+    @staticmethod
+    def _analytics_key(row, granularity):
+        if granularity == 'total':
+            return (row.task_name, None)
+        if granularity == 'day':
+            return (row.task_name, row.bucket_start.strftime('%Y-%m-%dT00:00:00'))
+        return (row.task_name, row.bucket_start.isoformat())
+    
     def get_jobs_by_task(self, task_name, limit=50):
         """Get jobs by task name"""
         session = self.Session()
@@ -126,6 +370,48 @@ class DatabaseManager:
         finally:
             session.close()
     
+    def get_job_history(self, start=None, end=None, batch_size=1000):
+        """Yield what capacity planning needs of each job, oldest first
+
+        Only the scheduling columns are read (no payloads or results),
+        in chunks of batch_size rows, so any size of table fits in memory.
+        """
+        session = self.Session()
+        try:
+            query = session.query(
+                JobModel.task_name, JobModel.queue_name, JobModel.created_at, JobModel.status,
+                JobModel.retry_count, JobModel.max_retries, JobModel.execution_time
+            )
+            if start:
+                query = query.filter(JobModel.created_at >= start)
+            if end:
+                query = query.filter(JobModel.created_at < end)
+            for row in query.order_by(JobModel.created_at).yield_per(batch_size):
+                yield row._asdict()
+        finally:
+            session.close()
+    
+    def iter_job_states(self, batch_size=5000):
+        """Yield (id, status, queue_name) rows of every job, batch_size per list
+
+        Pages by primary key, so each batch is one index range scan however
+        far into the table it is, and no read transaction stays open between
+        batches while the caller writes its fixes.
+        """
+        last_id = ''
+        while True:
+            session = self.Session()
+            try:
+                rows = session.query(JobModel.id, JobModel.status, JobModel.queue_name).filter(
+                    JobModel.id > last_id
+                ).order_by(JobModel.id).limit(batch_size).all()
+            finally:
+                session.close()
+            if not rows:
+                return
+            yield [tuple(row) for row in rows]
+            last_id = rows[-1][0]
+    
     def delete_job(self, job_id):
         """Delete a job"""
         session = self.Session()
@@ -133,34 +419,115 @@ class DatabaseManager:
             job = session.query(JobModel).filter_by(id=job_id).first()
             if job:
                 session.delete(job)
+                session.query(JobSpanModel).filter_by(job_id=job_id).delete(synchronize_session=False)
                 session.commit()
                 return True
             return False
         except Exception as e:
             session.rollback()
-            print(f"❌ Error deleting job: {e}")
+            log.error('could not delete job', job_id=job_id, error=str(e))
             return False
         finally:
             session.close()
     
-    def clear_old_jobs(self, days=30):
-        """Delete jobs older than specified days"""
-        session = self.Session()
-        try:
-            from datetime import timedelta
-            cutoff_date = datetime.utcnow() - timedelta(days=days)
-            
-            deleted = session.query(JobModel).filter(
-                JobModel.created_at < cutoff_date,
-                JobModel.status.in_(['completed', 'failed'])
-            ).delete()
+    def clear_old_jobs(self, days=30, batch_size=500, pause=0.05):
+        """Delete finished jobs older than specified days, in small batches"""
+        return self.archive_old_jobs(days, archive_dir=None, batch_size=batch_size, pause=pause)
+    
+    def archive_old_jobs(self, days=30, archive_dir='archive', batch_size=500, pause=0.05,
+                         vacuum_pages=1000):
+        """Move finished jobs older than `days` into gzipped JSON-lines files
+
+        Rows are written to archive_dir/jobs-YYYY-MM-DD.jsonl.gz (by
+        created_at date) and then deleted, `batch_size` rows per short
+        transaction with `pause` seconds between batches so foreground
+        writes keep flowing. Pass archive_dir=None to delete without
+        archiving. Freed pages are returned to the OS incrementally.
+        """
+        # created_at is stored in local time
+        cutoff_date = datetime.now() - timedelta(days=days)
+        if archive_dir:
+            os.makedirs(archive_dir, exist_ok=True)
+        
+        total = 0
+        while True:
+            session = self.Session()
+            try:
+                batch = session.query(JobModel).filter(
+                    JobModel.created_at < cutoff_date,
+                    JobModel.status.in_(['completed', 'failed', 'cancelled'])
+                ).order_by(JobModel.created_at).limit(batch_size).all()
+                if not batch:
+                    break
+                
+                if archive_dir:
+                    self._write_archive(archive_dir, batch)
+                
+                ids = [job.id for job in batch]
+                session.query(JobModel).filter(JobModel.id.in_(ids)).delete(synchronize_session=False)
+                session.query(JobSpanModel).filter(JobSpanModel.job_id.in_(ids)).delete(synchronize_session=False)
+                session.commit()
+                total += len(ids)
+            except Exception as e:
+                session.rollback()
+                log.error('could not archive old jobs', archived=total, error=str(e))
+                break
+            finally:
+                session.close()
             
-            session.commit()
-            print(f"🗑️  Deleted {deleted} old jobs")
-            return deleted
-        except Exception as e:
-            session.rollback()
-            print(f"❌ Error clearing old jobs: {e}")
-            return 0
-        finally:
-            session.close()
\ No newline at end of file
+            self._incremental_vacuum(vacuum_pages)
+            if len(batch) < batch_size:
+                break
+            time.sleep(pause)
+        
+        log.info('old jobs archived' if archive_dir else 'old jobs deleted', count=total, days=days)
+        return total
+    
+    def _write_archive(self, archive_dir, jobs):
+        """Append rows to per-day gzip files and flush them to disk"""
+        by_day = {}
+        for job in jobs:
+            day = job.created_at.strftime('%Y-%m-%d') if job.created_at else 'unknown'
+            by_day.setdefault(day, []).append(json.dumps(job.to_dict()))
+        
+        for day, lines in by_day.items():
+            path = os.path.join(archive_dir, f'jobs-{day}.jsonl.gz')
+            # Appending adds a gzip member; gzip.open reads them all back
+            with open(path, 'ab') as raw:
+                with gzip.GzipFile(fileobj=raw, mode='ab') as archive:
+                    archive.write(('\n'.join(lines) + '\n').encode('utf-8'))
+                raw.flush()
+                os.fsync(raw.fileno())
+    
+    def _incremental_vacuum(self, pages):
+        if self.engine.dialect.name != 'sqlite':
+            return
+        with self.engine.connect() as conn:
+            conn.execute(text(f'PRAGMA incremental_vacuum({int(pages)})'))
+            conn.commit()
+    
+    def needs_compaction(self):
+        """True for a SQLite file that predates incremental auto-vacuum"""
+        if self.engine.dialect.name != 'sqlite':
+            return False
+        with self.engine.connect() as conn:
+            # 0 = none, 1 = full, 2 = incremental
+            return conn.execute(text('PRAGMA auto_vacuum')).scalar() != 2
+    
+    def compact_database(self):
+        """One-off full VACUUM that also enables incremental auto-vacuum
+
+        Needed once for database files created before incremental
+        vacuum was switched on; blocks writers while it runs.
+        """
+        if self.engine.dialect.name != 'sqlite':
+            return
+        with self.engine.connect() as conn:
+            conn.execute(text('PRAGMA auto_vacuum=INCREMENTAL'))
+            conn.commit()
+        with self.engine.connect().execution_options(isolation_level='AUTOCOMMIT') as conn:
+            conn.execute(text('VACUUM'))
+        log.info('database compacted', url=self.db_url)
+
+def _round(value):
+    return round(value, 3) if value is not None else None
@@ -57,4 +57,53 @@ class JobModel(Base):
         }
     
     def __repr__(self):
-        return f"<Job(id={self.id}, task={self.task_name}, status={self.status})>"
\ No newline at end of file
+        return f"<Job(id={self.id}, task={self.task_name}, status={self.status})>"
+
+class TaskRollupModel(Base):
+    """Per-task, per-hour totals maintained as jobs finish"""
+    __tablename__ = 'task_rollups'
+    
+    task_name = Column(String(100), primary_key=True)
+    bucket_start = Column(DateTime, primary_key=True)  # truncated to the hour
+    completed = Column(Integer, default=0)
+    failed = Column(Integer, default=0)
+    total_execution_time = Column(Float, default=0.0)  # in seconds
+    timed_jobs = Column(Integer, default=0)  # jobs with an execution_time
+
+class TaskRollupBinModel(Base):
+    """Execution-time sketch bins for a rollup bucket (see database/sketch.py)"""
+    __tablename__ = 'task_rollup_bins'
+    
+    task_name = Column(String(100), primary_key=True)
+    bucket_start = Column(DateTime, primary_key=True)
+    bin = Column(Integer, primary_key=True)
+    count = Column(Integer, default=0)
+
+class JobSpanModel(Base):
+    """One traced step of a job (see workers/tracing.py)"""
+    __tablename__ = 'job_spans'
+    
+    span_id = Column(String(16), primary_key=True)
+    trace_id = Column(String(32), nullable=False)
+    parent_id = Column(String(16), nullable=True)
+    job_id = Column(String(36), nullable=True, index=True)
+    name = Column(String(50), nullable=False)
+    service = Column(String(100), nullable=True)  # 'host:pid' or the worker ID
+    start_time = Column(Float, nullable=False)  # Unix seconds
+    duration_ms = Column(Float, nullable=False)
+    attributes = Column(Text, nullable=True)  # JSON string
+    error = Column(Text, nullable=True)
+    
+    def to_dict(self):
+        return {
+            'trace_id': self.trace_id,
+            'span_id': self.span_id,
+            'parent_id': self.parent_id,
+            'job_id': self.job_id,
+            'name': self.name,
+            'service': self.service,
+            'start_time': self.start_time,
+            'duration_ms': self.duration_ms,
+            'attributes': json.loads(self.attributes) if self.attributes else {},
+            'error': self.error
+        }
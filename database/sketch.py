@@ -0,0 +1,46 @@
+"""
+Mergeable quantile sketch (log-spaced buckets, DDSketch style)
+
+A value maps to bin ceil(log_gamma(value)). Storing only bin counts
+keeps every quantile within RELATIVE_ACCURACY of the true value, and
+sketches merge by adding counts - so hourly rollups can be summed
+into days or months without touching raw rows.
+"""
+
+import math
+
+RELATIVE_ACCURACY = 0.01
+GAMMA = (1 + RELATIVE_ACCURACY) / (1 - RELATIVE_ACCURACY)
+_LOG_GAMMA = math.log(GAMMA)
+
+# Values below this (seconds) share the lowest bin
+MIN_VALUE = 0.001
+
+def bin_index(value):
+    """Bin for a positive value"""
+    return int(math.ceil(math.log(max(value, MIN_VALUE)) / _LOG_GAMMA))
+
+def bin_value(index):
+    """Representative value of a bin (relative error <= RELATIVE_ACCURACY)"""
+    return 2 * GAMMA ** index / (GAMMA + 1)
+
+def quantiles(bin_counts, qs):
+    """Estimate quantiles from {bin index: count}
+
+    Returns {q: value}, or {q: None} when there are no samples
+    """
+    total = sum(bin_counts.values())
+    if not total:
+        return {q: None for q in qs}
+    
+    results = {}
+    ordered = sorted(bin_counts.items())
+    for q in qs:
+        rank = q * (total - 1)
+        seen = 0
+        for index, count in ordered:
+            seen += count
+            if seen > rank:
+                results[q] = bin_value(index)
+                break
+    return results
@@ -0,0 +1,45 @@
+"""
+Reconcile the queue backend with the jobs table, e.g. after a Redis restart
+Usage:
+    python reconcile.py --dry-run      # report the differences only
+    python reconcile.py                # report and fix them
+    python reconcile.py --batch-size 20000 --json
+"""
+
+import argparse
+import json
+import os
+import sys
+
+# Add the project root directory to Python path
+project_root = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(project_root)
+
+from workers.queue_manager import QueueManager
+from workers.reconcile import Reconciler, format_report
+
+def main():
+    parser = argparse.ArgumentParser(description="Find and fix jobs the queue backend and database disagree on")
+    parser.add_argument('--dry-run', action='store_true', help="report differences without fixing them")
+    parser.add_argument('--batch-size', type=int, default=5000, help="jobs read and fixed per batch")
+    parser.add_argument('--force', action='store_true', help="run even though workers are alive")
+    parser.add_argument('--json', action='store_true', help="print the report as JSON")
+    args = parser.parse_args()
+
+    queue_manager = QueueManager()
+
+    # A job popped by a worker between the scans would be enqueued twice
+    alive = [info['worker_id'] for info in queue_manager.get_workers() if info['alive']]
+    if alive and not (args.dry_run or args.force):
+        print(f"❌ {len(alive)} workers are running ({', '.join(alive)}): stop them first or pass --force")
+        sys.exit(1)
+
+    report = Reconciler(queue_manager, batch_size=args.batch_size, dry_run=args.dry_run).run()
+
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        print(format_report(report))
+
+if __name__ == '__main__':
+    main()
@@ -18,14 +18,16 @@ def main():
     print("="*60)
     
     worker_id = sys.argv[1] if len(sys.argv) > 1 else "worker-1"
+    # Optional comma-separated task set, e.g. "process_image" or "send_email,send_sms"
+    tasks = [t for t in sys.argv[2].split(',') if t] if len(sys.argv) > 2 else None
     
     print(f"Worker ID: {worker_id}")
-    print(f"Watching queues: high, default, low")
+    print(f"Tasks: {', '.join(tasks) if tasks else 'all'}")
     print("="*60 + "\n")
     
     try:
         # Create and start worker
-        worker = Worker(worker_id=worker_id)
+        worker = Worker(worker_id=worker_id, tasks=tasks)
         worker.start()
     except KeyboardInterrupt:
         print("\n⚠️ Shutting down worker...")
@@ -0,0 +1,77 @@
+"""
+Capacity planning: simulate a worker fleet against recorded or synthetic load
+Usage:
+    python simulate_capacity.py --workers 4 --workers 8            # replay the jobs table
+    python simulate_capacity.py --workers 8 --load 3 --start 2024-11-24
+    python simulate_capacity.py --workers 6,process_image=2 --profile send_email:5,process_image:0.5:12 --duration 3600
+"""
+
+import argparse
+import json
+import os
+import sys
+from datetime import datetime
+
+# Add the project root directory to Python path
+project_root = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(project_root)
+
+from workers.simulator import Simulator, Workload, TaskProfile, parse_profile, format_report, profiles_from_history
+from database.db_manager import DatabaseManager
+import workers.tasks  # Import to register tasks (batch sizes)
+
+def build_workload(args):
+    db = DatabaseManager()
+    if not args.profile:
+        return Workload.from_history(db, args.start, args.end, load=args.load)
+
+    # Synthetic arrivals; execution times as recorded unless given
+    rates, means = parse_profile(args.profile)
+    profiles = profiles_from_history(db.get_job_history(args.start, args.end))
+    for task_name, mean in means.items():
+        recorded = profiles.get(task_name)
+        profiles[task_name] = TaskProfile(
+            mean_duration=mean,
+            failure_rate=recorded.failure_rate if recorded else 0.0,
+            max_retries=recorded.max_retries if recorded else 3
+        )
+    rates = {task_name: rate * args.load for task_name, rate in rates.items()}
+    return Workload.synthetic(rates, args.duration, profiles=profiles, seed=args.seed)
+
+def main():
+    parser = argparse.ArgumentParser(description="Simulate queue waits and backlog for a worker fleet")
+    parser.add_argument('--workers', action='append', metavar='FLEET',
+                        help="fleet to simulate, e.g. 8 or 6,process_image=2 (repeat to compare)")
+    parser.add_argument('--start', type=datetime.fromisoformat, help="replay jobs created from (ISO date)")
+    parser.add_argument('--end', type=datetime.fromisoformat, help="replay jobs created before (ISO date)")
+    parser.add_argument('--load', type=float, default=1.0, help="multiply the arrival rate")
+    parser.add_argument('--profile', help="synthetic load task:jobs_per_second[:seconds_per_job],...")
+    parser.add_argument('--duration', type=float, default=3600, help="seconds of synthetic load")
+    parser.add_argument('--poll-interval', type=float, default=2.0, help="idle worker poll interval (s)")
+    parser.add_argument('--bucket', type=float, help="backlog timeline resolution (s)")
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--json', action='store_true', help="print the reports as JSON")
+    args = parser.parse_args()
+
+    try:
+        workload = build_workload(args)
+        reports = [
+            Simulator(workload, fleet, poll_interval=args.poll_interval,
+                      bucket_seconds=args.bucket, seed=args.seed).run()
+            for fleet in (args.workers or ['4'])
+        ]
+    except ValueError as e:
+        print(f"❌ {e}")
+        sys.exit(1)
+
+    if args.json:
+        print(json.dumps(reports, indent=2))
+        return
+
+    for report in reports:
+        print("\n" + "=" * 60)
+        print(format_report(report))
+    print("=" * 60 + "\n")
+
+if __name__ == '__main__':
+    main()
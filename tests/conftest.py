@@ -0,0 +1,144 @@
+"""
+Shared fixtures: queue managers on the in-process backends
+
+Redis-backed fixtures run against fakeredis (one fake server per
+host:port), so the suite needs neither a Redis server nor a worker.
+Every test runs in its own directory, where jobs.db, blobs/ and
+archive/ end up.
+"""
+
+import os
+import sys
+
+# Quiet, untraced defaults - set before anything reads Config
+os.environ.setdefault('QUEUE_BACKEND', 'memory')
+os.environ.setdefault('TRACE_EXPORTERS', 'none')
+os.environ.setdefault('LOG_LEVEL', 'WARNING')
+
+# Add the project root directory to Python path
+project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, project_root)
+
+import fakeredis
+import pytest
+import redis
+
+from database.db_manager import DatabaseManager
+from workers import connections
+from workers.admission import AdmissionPolicy
+from workers.queue_manager import QueueManager
+from workers.routing import TaskRouter
+
+BACKENDS = ['memory', 'redis', 'redis-streams', 'redis-sharded']
+SHARD_NODES = ['shard-a:6379', 'shard-b:6379']
+
+
+@pytest.fixture(autouse=True)
+def workdir(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    return tmp_path
+
+
+@pytest.fixture
+def fake_redis(monkeypatch):
+    """Point redis.Redis at fakeredis; returns {(host, port): FakeServer}"""
+    servers = {}
+
+    class FakeRedis(fakeredis.FakeRedis):
+        def __init__(self, connection_pool=None, **kwargs):
+            options = connection_pool.connection_kwargs if connection_pool else kwargs
+            node = (options.get('host', 'localhost'), options.get('port', 6379))
+            super().__init__(
+                server=servers.setdefault(node, fakeredis.FakeServer()),
+                decode_responses=options.get('decode_responses', False)
+            )
+
+    monkeypatch.setattr(redis, 'Redis', FakeRedis)
+    monkeypatch.setattr(connections, '_redis_pools', {})
+    return servers
+
+
+@pytest.fixture
+def db(tmp_path):
+    return DatabaseManager(f"sqlite:///{tmp_path / 'jobs.db'}")
+
+
+def build_backend(name):
+    if name == 'memory':
+        from workers.backends.sqlite_backend import MemoryBackend
+        return MemoryBackend()
+    if name == 'redis':
+        from workers.backends.redis_backend import RedisBackend
+        return RedisBackend()
+    if name == 'redis-streams':
+        from workers.backends.streams_backend import StreamsBackend
+        return StreamsBackend(consumer='test-consumer')
+    if name == 'redis-sharded':
+        from workers.backends.sharded_backend import ShardedRedisBackend
+        return ShardedRedisBackend(SHARD_NODES)
+    raise ValueError(name)
+
+
+@pytest.fixture
+def make_queue_manager(request, db):
+    """make_queue_manager(backend='memory', **QueueManager kwargs)
+
+    Admission limits and task routes default to none, whatever the
+    environment says.
+    """
+    def make(backend='memory', **kwargs):
+        if backend != 'memory':
+            request.getfixturevalue('fake_redis')
+        kwargs.setdefault('admission', AdmissionPolicy(
+            queue_depths={}, task_depths={}, rate=0, shed_depth=0
+        ))
+        kwargs.setdefault('router', TaskRouter(routes=[]))
+        return QueueManager(backend=build_backend(backend), db=db, **kwargs)
+    return make
+
+
+@pytest.fixture
+def queue_manager(make_queue_manager):
+    return make_queue_manager()
+
+
+@pytest.fixture(params=BACKENDS)
+def any_queue_manager(request, make_queue_manager):
+    """The same test on every backend"""
+    return make_queue_manager(request.param)
+
+
+@pytest.fixture
+def api(monkeypatch, queue_manager, db):
+    """Flask test client for api.app, backed by the test queue manager"""
+    from api import app as app_module
+
+    monkeypatch.setattr(app_module, 'queue_manager', queue_manager)
+    monkeypatch.setattr(app_module, 'db_manager', db)
+    app_module.response_cache.invalidate()
+    return app_module.app.test_client()
+
+
+@pytest.fixture
+def make_worker(queue_manager):
+    """make_worker(manager=None, **Worker kwargs)
+
+    The worker runs on the given (default: the test's) queue manager,
+    keeps the test's signal handlers and records the job updates it
+    would send to the API in worker.notified.
+    """
+    import signal
+    from workers.worker import Worker
+
+    def make(manager=None, worker_id='test-worker', **kwargs):
+        handlers = {s: signal.getsignal(s) for s in (signal.SIGINT, signal.SIGTERM)}
+        worker = Worker(worker_id, **kwargs)
+        for signum, handler in handlers.items():
+            signal.signal(signum, handler)
+        worker.queue_manager = manager or queue_manager
+        worker.tracer = worker.queue_manager.tracer
+        worker.notified = []
+        worker.notify_job_update = lambda job_id, status: worker.notified.append((job_id, status))
+        worker.notify_job_updates = worker.notified.extend
+        return worker
+    return make
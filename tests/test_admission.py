@@ -0,0 +1,114 @@
+"""Admission control: depth limits, submission rate and load shedding"""
+
+import uuid
+
+import pytest
+
+from conftest import BACKENDS, SHARD_NODES
+from workers.admission import AdmissionPolicy, AdmissionRejected, parse_limits
+from workers.job import Job
+
+
+def policy(**limits):
+    limits = dict({'queue_depths': {}, 'task_depths': {}, 'rate': 0, 'shed_depth': 0}, **limits)
+    return AdmissionPolicy(**limits)
+
+
+def submit(queue_manager, queue_name='default', task_name='clean_logs'):
+    return queue_manager.add_job(Job(task_name, {}), queue_name, enforce_limits=True)
+
+
+def rejection(queue_manager, queue_name='default', task_name='clean_logs'):
+    with pytest.raises(AdmissionRejected) as rejected:
+        submit(queue_manager, queue_name, task_name)
+    return rejected.value
+
+
+# The sharded backend splits each limit between its shards; it gets its
+# own test below
+@pytest.fixture(params=[b for b in BACKENDS if b != 'redis-sharded'])
+def make_limited(request, make_queue_manager):
+    def make(**limits):
+        return make_queue_manager(request.param, admission=policy(**limits))
+    return make
+
+
+def test_parse_limits():
+    assert parse_limits('high=100, low=5') == {'high': 100, 'low': 5}
+    assert parse_limits('') == {}
+
+
+def test_queue_depth_limit(make_limited):
+    queue_manager = make_limited(queue_depths={'default': 2})
+    submit(queue_manager)
+    submit(queue_manager)
+
+    assert rejection(queue_manager).reason == 'queue_full'
+    assert submit(queue_manager, 'high')
+
+    queue_manager.ack_job(queue_manager.get_next_job('default'))
+    assert submit(queue_manager)
+
+
+def test_task_depth_limit(make_limited):
+    queue_manager = make_limited(task_depths={'send_email': 1})
+    submit(queue_manager, task_name='send_email')
+
+    assert rejection(queue_manager, 'high', 'send_email').reason == 'task_full'
+    assert submit(queue_manager, task_name='clean_logs')
+
+
+def test_submission_rate_limit(make_limited):
+    queue_manager = make_limited(rate=0.5, burst=2)
+    submit(queue_manager)
+    submit(queue_manager)
+
+    rejected = rejection(queue_manager)
+    assert rejected.reason == 'rate_limited'
+    assert rejected.retry_after >= 1
+
+
+def test_low_priority_is_shed_under_pressure(make_limited):
+    queue_manager = make_limited(shed_depth=2, shed_queues=['low'])
+    submit(queue_manager, 'high')
+    submit(queue_manager, 'low')
+
+    assert rejection(queue_manager, 'low').reason == 'shed'
+    assert submit(queue_manager, 'default')
+
+
+def test_internal_requeues_skip_the_limits(make_limited):
+    queue_manager = make_limited(queue_depths={'default': 1})
+    submit(queue_manager)
+
+    assert queue_manager.add_job(Job('clean_logs', {}))
+    assert queue_manager.get_queue_size('default') == 2
+
+
+def test_sharded_backend_gives_each_shard_its_share(make_queue_manager):
+    queue_manager = make_queue_manager('redis-sharded', admission=policy(queue_depths={'default': 4}))
+    def on(node):
+        job = Job('clean_logs', {})
+        while queue_manager.backend.ring.get_node(job.id) != node:
+            job.id = str(uuid.uuid4())
+        return job
+    first, second = SHARD_NODES
+
+    for _ in range(2):
+        queue_manager.add_job(on(first), enforce_limits=True)
+    with pytest.raises(AdmissionRejected):
+        queue_manager.add_job(on(first), enforce_limits=True)
+
+    assert queue_manager.add_job(on(second), enforce_limits=True)
+
+
+def test_api_answers_429_with_retry_after(api, queue_manager):
+    queue_manager.admission = policy(queue_depths={'default': 1}, retry_after=7)
+    body = {'task_name': 'clean_logs', 'task_data': {}}
+
+    assert api.post('/api/jobs', json=body).status_code == 200
+    response = api.post('/api/jobs', json=body)
+
+    assert response.status_code == 429
+    assert response.headers['Retry-After'] == '7'
+    assert response.get_json()['reason'] == 'queue_full'
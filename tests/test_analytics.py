@@ -0,0 +1,107 @@
+"""Per-task hourly rollups and the quantile sketch behind them"""
+
+from datetime import datetime, timedelta
+
+import pytest
+
+from database import sketch
+from workers.job import Job
+
+HOUR = datetime(2026, 3, 1, 10)
+
+
+def finish(db, status='completed', seconds=1.0, at=HOUR, task_name='send_email'):
+    job = Job(task_name, {})
+    job.created_at = (at - timedelta(seconds=seconds)).isoformat()
+    db.save_job(job)
+    job.status = status
+    job.started_at = (at - timedelta(seconds=seconds)).isoformat()
+    job.completed_at = at.isoformat()
+    db.save_job(job)
+    return job
+
+
+def test_sketch_quantiles_stay_within_relative_accuracy():
+    values = [i / 100 for i in range(1, 10001)]
+    bins = {}
+    for value in values:
+        index = sketch.bin_index(value)
+        bins[index] = bins.get(index, 0) + 1
+
+    estimates = sketch.quantiles(bins, (0.5, 0.95, 0.99))
+
+    for q, estimate in estimates.items():
+        exact = values[int(q * (len(values) - 1))]
+        assert abs(estimate - exact) <= exact * sketch.RELATIVE_ACCURACY
+
+
+def test_empty_sketch_has_no_quantiles():
+    assert sketch.quantiles({}, (0.5,)) == {0.5: None}
+
+
+def test_rollup_counts_throughput_failures_and_timing(db):
+    for seconds in (1, 2, 3):
+        finish(db, seconds=seconds)
+    finish(db, status='failed', seconds=4)
+
+    [row] = db.get_task_analytics(task_name='send_email')
+
+    assert row['bucket_start'] == HOUR.isoformat()
+    assert (row['throughput'], row['completed'], row['failed']) == (4, 3, 1)
+    assert row['failure_rate'] == 0.25
+    assert row['avg_execution_time'] == 2.5
+    assert row['p50'] == pytest.approx(2, rel=sketch.RELATIVE_ACCURACY)
+
+
+def test_a_job_is_rolled_up_once(db):
+    job = finish(db)
+    db.save_job(job)
+
+    [row] = db.get_task_analytics()
+
+    assert row['throughput'] == 1
+
+
+def test_unfinished_and_cancelled_jobs_are_not_rolled_up(db):
+    db.save_job(Job('send_email', {}))
+    finish(db, status='cancelled')
+
+    assert db.get_task_analytics() == []
+
+
+def test_hours_merge_into_days_and_totals(db):
+    for hours in (0, 1, 2, 30):
+        finish(db, at=HOUR + timedelta(hours=hours), seconds=hours + 1)
+    finish(db, task_name='send_sms')
+
+    days = db.get_task_analytics(task_name='send_email', granularity='day')
+    [total] = db.get_task_analytics(task_name='send_email', granularity='total')
+
+    assert [(d['bucket_start'], d['throughput']) for d in days] == [
+        ('2026-03-01T00:00:00', 3), ('2026-03-02T00:00:00', 1)
+    ]
+    assert total['bucket_start'] is None and total['throughput'] == 4
+    assert total['avg_execution_time'] == 9.25
+    assert total['p50'] == pytest.approx(2, rel=sketch.RELATIVE_ACCURACY)
+
+
+def test_time_range_selects_hour_buckets(db):
+    for hours in range(5):
+        finish(db, at=HOUR + timedelta(hours=hours, minutes=30))
+
+    rows = db.get_task_analytics(start=HOUR + timedelta(hours=1), end=HOUR + timedelta(hours=3))
+
+    assert [row['bucket_start'] for row in rows] == [
+        (HOUR + timedelta(hours=1)).isoformat(), (HOUR + timedelta(hours=2)).isoformat()
+    ]
+
+
+def test_analytics_endpoint(api, db):
+    finish(db)
+
+    response = api.get('/api/analytics?task=send_email&granularity=total')
+
+    assert response.status_code == 200
+    assert response.get_json()['analytics'][0]['throughput'] == 1
+    assert api.get('/api/analytics?granularity=week').status_code == 400
+    assert api.get('/api/analytics?start=yesterday').status_code == 400
@@ -0,0 +1,89 @@
+"""Archiving old jobs: path confinement, cutoff and compaction"""
+
+import gzip
+import json
+import os
+import sqlite3
+import time
+from datetime import datetime, timedelta
+
+import pytest
+
+from database.db_manager import DatabaseManager
+from workers import tasks
+from workers.job import Job
+
+
+@pytest.fixture
+def local_time_ahead_of_utc(monkeypatch):
+    """Run in a time zone 14 hours ahead of UTC"""
+    monkeypatch.setenv('TZ', 'XXX-14')
+    time.tzset()
+    yield
+    monkeypatch.undo()
+    time.tzset()
+
+
+def finished_job(db, age, status='completed'):
+    job = Job('clean_logs', {})
+    job.created_at = (datetime.now() - age).isoformat()
+    job.status = status
+    db.save_job(job)
+    return job
+
+
+@pytest.mark.parametrize('archive_dir', ['../outside', '/tmp', 'nightly/../../outside'])
+def test_archive_dir_outside_archive_root_is_refused(archive_dir):
+    with pytest.raises(ValueError):
+        tasks.archive_old_jobs({'archive_dir': archive_dir})
+
+    assert not os.path.exists('outside')
+
+
+def test_archive_dir_may_name_a_subdirectory(workdir):
+    root = os.path.realpath(workdir / 'archive')
+
+    assert tasks._archive_dir() == root
+    assert tasks._archive_dir('nightly') == os.path.join(root, 'nightly')
+
+
+def test_old_finished_jobs_are_archived_and_deleted(db, workdir):
+    old = finished_job(db, timedelta(days=3))
+    recent = finished_job(db, timedelta(hours=1))
+    running = finished_job(db, timedelta(days=3), status='processing')
+
+    archived = db.archive_old_jobs(days=2, archive_dir=str(workdir / 'archive'), pause=0)
+
+    assert archived == 1
+    assert db.get_job(old.id) is None
+    assert db.get_job(recent.id) and db.get_job(running.id)
+    [path] = (workdir / 'archive').iterdir()
+    with gzip.open(path, 'rt') as archive:
+        assert [json.loads(line)['id'] for line in archive] == [old.id]
+
+
+def test_cutoff_is_in_local_time(db, local_time_ahead_of_utc):
+    # Under a UTC cutoff both would look younger than 12 hours
+    old = finished_job(db, timedelta(hours=13))
+    recent = finished_job(db, timedelta(hours=11))
+
+    db.archive_old_jobs(days=0.5, archive_dir=None, pause=0)
+
+    assert db.get_job(old.id) is None
+    assert db.get_job(recent.id) is not None
+
+
+def test_database_without_incremental_vacuum_is_compacted_once(tmp_path):
+    path = tmp_path / 'legacy.db'
+    sqlite3.connect(path).execute('CREATE TABLE legacy (id INTEGER)').connection.close()
+    db = DatabaseManager(f"sqlite:///{path}")
+
+    assert db.needs_compaction()
+    db.compact_database()
+    assert not db.needs_compaction()
+
+
+def test_new_databases_need_no_compaction(db):
+    db.get_job('missing')
+
+    assert not db.needs_compaction()
@@ -0,0 +1,101 @@
+"""The QueueBackend contract, on every backend"""
+
+import json
+
+import pytest
+
+from conftest import build_backend
+from workers.job import Job
+
+QUEUE_KEYS = ['queue:high_priority', 'queue:default', 'queue:low_priority']
+
+
+@pytest.fixture(params=['memory', 'sqlite', 'redis', 'redis-streams', 'redis-sharded'])
+def backend(request, tmp_path):
+    if request.param == 'sqlite':
+        from workers.backends.sqlite_backend import SQLiteBackend
+        return SQLiteBackend(str(tmp_path / 'queue.db'))
+    if request.param != 'memory':
+        request.getfixturevalue('fake_redis')
+    return build_backend(request.param)
+
+
+def enqueue(backend, queue_key='queue:default', **task_data):
+    job = Job('clean_logs', task_data)
+    backend.enqueue(job.id, job.to_json(), queue_key)
+    return job
+
+
+def test_dequeue_returns_queue_and_payload(backend):
+    job = enqueue(backend)
+
+    queue_key, job_json = backend.dequeue(QUEUE_KEYS)
+
+    assert queue_key == 'queue:default'
+    assert json.loads(job_json)['id'] == job.id
+    assert backend.dequeue(QUEUE_KEYS) is None
+
+
+def test_dequeue_batch_takes_higher_priority_queues_first(backend):
+    low = enqueue(backend, 'queue:low_priority')
+    default = enqueue(backend, 'queue:default')
+    high = enqueue(backend, 'queue:high_priority')
+
+    batch = backend.dequeue_batch(QUEUE_KEYS, 10)
+
+    assert [json.loads(p)['id'] for _, p in batch] == [high.id, default.id, low.id]
+
+
+def test_queue_size_counts_waiting_jobs(backend):
+    for i in range(3):
+        enqueue(backend, i=i)
+    backend.dequeue(QUEUE_KEYS)
+
+    assert backend.queue_size('queue:default') == 2
+
+
+def test_get_jobs_keeps_order_and_reports_missing_as_none(backend):
+    a, b = enqueue(backend), enqueue(backend)
+
+    payloads = backend.get_jobs([b.id, 'missing', a.id])
+
+    assert [json.loads(p)['id'] if p else None for p in payloads] == [b.id, None, a.id]
+
+
+def test_save_jobs_updates_payloads(backend):
+    job = enqueue(backend)
+    job.status = 'completed'
+
+    backend.save_jobs([(job.id, job.to_json())])
+
+    assert json.loads(backend.get_job(job.id))['status'] == 'completed'
+
+
+def test_find_jobs_filters_by_status_and_task(backend):
+    jobs = [enqueue(backend, i=i) for i in range(3)]
+    jobs[1].status = 'completed'
+    backend.save_job(jobs[1].id, jobs[1].to_json())
+
+    rows, total = backend.find_jobs(status='completed', task_name='clean_logs')
+
+    assert total == 1
+    assert json.loads(rows[0][1])['id'] == jobs[1].id
+
+
+def test_iter_jobs_and_delete_jobs(backend):
+    jobs = [enqueue(backend, i=i) for i in range(5)]
+    backend.delete_jobs([jobs[0].id])
+
+    ids = {json.loads(p)['id'] for p in backend.iter_jobs(batch_size=2)}
+
+    assert ids == {job.id for job in jobs[1:]}
+
+
+def test_clear_all_removes_queues_and_payloads(backend):
+    enqueue(backend)
+    enqueue(backend, 'queue:high_priority')
+
+    backend.clear_all(QUEUE_KEYS)
+
+    assert backend.dequeue(QUEUE_KEYS) is None
+    assert list(backend.iter_jobs()) == []
@@ -0,0 +1,102 @@
+"""Batch tasks: collecting a batch and recording every job in it"""
+
+import pytest
+
+from config import Config
+from workers.job import Job
+from workers.routing import TaskRouter
+from workers.task_registry import task_registry
+
+BATCH_TASK = 'test_batch'
+
+
+@pytest.fixture
+def calls(monkeypatch):
+    """Register a fast batch task; returns the batches it was called with"""
+    calls = []
+    monkeypatch.setitem(task_registry.tasks, BATCH_TASK, lambda batch: calls.append(batch) or [
+        {'success': True} for _ in batch
+    ])
+    monkeypatch.setitem(task_registry.options, BATCH_TASK, {'batch_size': 10, 'linger': 0.05})
+    return calls
+
+
+def queue(queue_manager, task_name=BATCH_TASK, queue_name='default', count=1):
+    jobs = [Job(task_name, {'i': i}) for i in range(count)]
+    for job in jobs:
+        queue_manager.add_job(job, queue_name)
+    return jobs
+
+
+def test_start_once_processes_a_whole_batch(make_worker, queue_manager, calls):
+    jobs = queue(queue_manager, count=3)
+    worker = make_worker()
+
+    assert worker.start_once()
+
+    assert calls == [[{'i': 0}, {'i': 1}, {'i': 2}]]
+    assert all(queue_manager.get_job(job.id).status == 'completed' for job in jobs)
+
+
+def test_every_job_in_a_batch_is_reported(make_worker, queue_manager, calls):
+    jobs = queue(queue_manager, count=3)
+    worker = make_worker()
+
+    worker.start_once()
+
+    for status in ('processing', 'completed'):
+        assert [job_id for job_id, s in worker.notified if s == status] == [job.id for job in jobs]
+
+
+def test_collecting_stops_at_another_task(make_worker, queue_manager, calls):
+    first, = queue(queue_manager)
+    other, = queue(queue_manager, 'clean_logs')
+    queue(queue_manager, count=2)
+    worker = make_worker()
+
+    batch = worker.collect_batch(worker.get_next_job())
+
+    assert [job.id for job in batch] == [first.id]
+    assert [job.id for job in worker.prefetched] == [other.id]
+    assert queue_manager.get_queue_size('default') == 2
+
+
+def test_high_priority_job_is_next_not_hoarded(make_worker, queue_manager, calls):
+    queue(queue_manager, count=3)
+    worker = make_worker()
+    job = worker.get_next_job()
+    urgent, = queue(queue_manager, 'clean_logs', 'high')
+
+    batch = worker.collect_batch(job)
+
+    assert len(batch) == 1
+    assert worker.get_next_job().id == urgent.id
+
+
+def test_dedicated_queue_is_read_in_bulk(make_worker, make_queue_manager, calls, monkeypatch):
+    monkeypatch.setattr(Config, 'TASK_ROUTES', f'{BATCH_TASK}=batches')
+    queue_manager = make_queue_manager(router=TaskRouter())
+    worker = make_worker(queue_manager, tasks=[BATCH_TASK])
+    jobs = queue(queue_manager, count=12)
+
+    worker.start_once()
+
+    assert [len(batch) for batch in calls] == [10]
+    assert queue_manager.get_queue_size('batches') == 2
+    assert all(queue_manager.get_job(job.id).status == 'completed' for job in jobs[:10])
+
+
+def test_draining_worker_stops_collecting(make_worker, queue_manager, calls):
+    queue(queue_manager, count=3)
+    worker = make_worker()
+    worker.draining = True
+
+    assert len(worker.collect_batch(worker.get_next_job())) == 1
+
+
+def test_api_takes_a_batch_of_updates(api):
+    updates = [{'job_id': 'a', 'status': 'completed'}, {'job_id': 'b', 'status': 'completed'}]
+
+    assert api.post('/api/job-update', json={'updates': updates}).status_code == 200
+    assert api.post('/api/job-update', json={'job_id': 'a', 'status': 'failed'}).status_code == 200
+    assert api.post('/api/job-update', json={'updates': []}).status_code == 400
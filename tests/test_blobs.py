@@ -0,0 +1,77 @@
+"""Large task_data and results kept out of job payloads"""
+
+import json
+
+import pytest
+
+from workers import blobs
+from workers.blobs import BlobStore
+from workers.job import Job
+
+BIG = {'dataset': list(range(2000))}
+
+
+@pytest.fixture
+def store():
+    # Same directory the process-wide store reads from (relative to the test dir)
+    return BlobStore(root='blobs', threshold=1024)
+
+
+@pytest.fixture
+def blob_queue_manager(make_queue_manager, store):
+    return make_queue_manager(blobs=store)
+
+
+def test_same_content_is_stored_once(store, workdir):
+    first = store.put(b'payload')
+    second = store.put(b'payload')
+
+    assert first == second and first['size'] == 7
+    assert len(list((workdir / 'blobs').rglob('*'))) == 2  # one prefix dir, one file
+    assert store.load(store.offload(BIG)) == BIG
+
+
+def test_only_large_values_are_offloaded(store):
+    assert store.offload({'small': 1}) == {'small': 1}
+    assert blobs.is_ref(store.offload(BIG))
+    assert BlobStore(threshold=0).offload(BIG) == BIG
+
+
+def test_digests_cannot_name_other_paths(store):
+    with pytest.raises(ValueError):
+        store.path('../../etc/passwd')
+
+
+def test_payload_and_row_carry_only_a_reference(blob_queue_manager, db):
+    job = Job('analyze_data', BIG)
+    blob_queue_manager.add_job(job)
+
+    payload = json.loads(blob_queue_manager.backend.get_job(job.id))
+    row = db.get_job(job.id)
+
+    assert blobs.is_ref(payload['task_data'])
+    assert blobs.is_ref(row['task_data'])
+    assert len(blob_queue_manager.backend.get_job(job.id)) < 1024
+
+
+def test_workers_read_the_payload_lazily(blob_queue_manager):
+    job = Job('analyze_data', BIG)
+    blob_queue_manager.add_job(job)
+
+    dequeued = blob_queue_manager.get_next_job('default')
+
+    assert blobs.is_ref(dequeued.stored('task_data'))
+    assert dequeued.task_data == BIG
+
+
+def test_large_results_are_offloaded_on_update(blob_queue_manager):
+    job = Job('analyze_data', {})
+    blob_queue_manager.add_job(job)
+    job.status = 'completed'
+    job.result = BIG
+
+    blob_queue_manager.update_job(job)
+
+    stored = blob_queue_manager.get_job(job.id)
+    assert blobs.is_ref(stored.stored('result'))
+    assert stored.result == BIG
@@ -0,0 +1,160 @@
+"""Response cache for read endpoints: ETags, invalidation and minimum age"""
+
+import time
+
+import pytest
+from flask import Flask, jsonify
+
+from api.cache import ResponseCache
+from workers.job import Job
+
+
+@pytest.fixture
+def make_client():
+    """make_client(**ResponseCache kwargs) -> (test client, view call counts)"""
+    def make(**kwargs):
+        cache = ResponseCache(**kwargs)
+        app = Flask(__name__)
+        calls = {'data': 0, 'tasks': 0, 'missing': 0}
+
+        @app.route('/data')
+        @cache.cached()
+        def data():
+            calls['data'] += 1
+            return jsonify({'calls': calls['data']})
+
+        @app.route('/tasks')
+        @cache.cached(permanent=True)
+        def tasks():
+            calls['tasks'] += 1
+            return jsonify({'tasks': []})
+
+        @app.route('/missing')
+        @cache.cached()
+        def missing():
+            calls['missing'] += 1
+            return jsonify({'error': 'not found'}), 404
+
+        client = app.test_client()
+        client.cache = cache
+        return client, calls
+    return make
+
+
+def test_repeated_reads_are_served_from_the_cache(make_client):
+    client, calls = make_client(ttl=60, min_age=0)
+
+    first = client.get('/data')
+    second = client.get('/data')
+
+    assert calls['data'] == 1
+    assert first.get_json() == second.get_json() == {'calls': 1}
+    assert first.headers['ETag'] and first.headers['ETag'] == second.headers['ETag']
+    assert first.headers['Cache-Control'] == 'no-cache'
+
+
+def test_matching_etag_gets_an_empty_304(make_client):
+    client, _ = make_client(ttl=60, min_age=0)
+    etag = client.get('/data').headers['ETag']
+
+    response = client.get('/data', headers={'If-None-Match': etag})
+
+    assert response.status_code == 304
+    assert response.get_data() == b''
+
+
+def test_invalidation_recomputes_and_changes_the_etag(make_client):
+    client, calls = make_client(ttl=60, min_age=0)
+    etag = client.get('/data').headers['ETag']
+
+    client.cache.invalidate('job-1', 'completed')
+    response = client.get('/data', headers={'If-None-Match': etag})
+
+    assert response.status_code == 200
+    assert calls['data'] == 2
+    assert response.headers['ETag'] != etag
+
+
+def test_entries_younger_than_min_age_survive_invalidation(make_client):
+    client, calls = make_client(ttl=60, min_age=0.2)
+    client.get('/data')
+
+    client.cache.invalidate()
+    client.get('/data')
+    assert calls['data'] == 1
+
+    time.sleep(0.25)
+    client.get('/data')
+    assert calls['data'] == 2
+
+
+def test_entries_expire_after_the_ttl(make_client):
+    client, calls = make_client(ttl=0.1, min_age=0)
+    client.get('/data')
+
+    time.sleep(0.15)
+    client.get('/data')
+
+    assert calls['data'] == 2
+
+
+def test_permanent_views_ignore_invalidation(make_client):
+    client, calls = make_client(ttl=0.01, min_age=0)
+    client.get('/tasks')
+
+    client.cache.invalidate()
+    time.sleep(0.02)
+    client.get('/tasks')
+
+    assert calls['tasks'] == 1
+
+
+def test_errors_and_query_strings(make_client):
+    client, calls = make_client(ttl=60, min_age=0)
+
+    client.get('/missing')
+    client.get('/missing')
+    client.get('/data?page=1')
+    client.get('/data?page=2')
+
+    assert calls['missing'] == 2
+    assert calls['data'] == 2
+
+
+def test_zero_ttl_turns_caching_off(make_client):
+    client, calls = make_client(ttl=0, min_age=0)
+
+    client.get('/data')
+    response = client.get('/data')
+
+    assert calls['data'] == 2
+    assert 'ETag' not in response.headers
+
+
+def test_creating_a_job_invalidates_the_stats(api, monkeypatch):
+    from api import app as app_module
+    monkeypatch.setattr(app_module.response_cache, 'min_age', 0)
+    monkeypatch.setattr(app_module.response_cache, 'ttl', 60)
+    etag = api.get('/api/stats').headers['ETag']
+    assert api.get('/api/stats', headers={'If-None-Match': etag}).status_code == 304
+
+    api.post('/api/jobs', json={'task_name': 'clean_logs', 'task_data': {}})
+
+    assert api.get('/api/stats', headers={'If-None-Match': etag}).status_code == 200
+
+
+def test_job_updates_from_other_processes_invalidate(queue_manager):
+    cache = ResponseCache(ttl=60, min_age=0)
+    queue_manager.events.add_listener(cache.invalidate)
+    queue_manager.events.start()
+    generation = cache.generation
+    job = Job('clean_logs', {})
+    queue_manager.add_job(job)
+
+    job.status = 'completed'
+    queue_manager.update_job(job)
+
+    deadline = time.monotonic() + 2
+    while cache.generation == generation and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert cache.generation > generation
@@ -0,0 +1,44 @@
+"""Shared connection pools and lazy database initialization"""
+
+import pytest
+
+from database.db_manager import DatabaseManager
+from workers import connections
+from workers.backends.redis_backend import RedisBackend
+
+
+@pytest.fixture(autouse=True)
+def fresh_pools(monkeypatch):
+    monkeypatch.setattr(connections, '_redis_pools', {})
+
+
+def test_clients_share_one_pool_per_server():
+    a = connections.get_redis_client('redis-a', 6379)
+    b = connections.get_redis_client('redis-a', 6379)
+    other = connections.get_redis_client('redis-b', 6379)
+
+    assert a.connection_pool is b.connection_pool
+    assert other.connection_pool is not a.connection_pool
+
+
+def test_backends_reuse_the_process_pool():
+    # Building a backend opens no connection, so no server is needed
+    first = RedisBackend(host='redis-a', port=6379)
+    second = RedisBackend(host='redis-a', port=6379)
+
+    assert first.redis_client.connection_pool is second.redis_client.connection_pool
+
+
+def test_database_is_created_on_first_use(tmp_path):
+    path = tmp_path / 'lazy.db'
+    db = DatabaseManager(f"sqlite:///{path}")
+    assert not path.exists()
+
+    assert db.get_job('missing') is None
+    assert path.exists()
+
+
+def test_managers_share_an_engine_per_url(tmp_path):
+    url = f"sqlite:///{tmp_path / 'shared.db'}"
+
+    assert DatabaseManager(url).engine is DatabaseManager(url).engine
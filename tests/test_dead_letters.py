@@ -0,0 +1,94 @@
+"""Dead-letter queue: original queue preserved, counts kept exact"""
+
+import pytest
+
+from workers.job import Job
+
+QUEUES = ['high', 'default', 'low']
+
+
+@pytest.fixture
+def worker(make_worker, any_queue_manager):
+    return make_worker(any_queue_manager)
+
+
+def dequeued(queue_manager, job, queue_name):
+    queue_manager.add_job(job, queue_name)
+    running = queue_manager.get_next_job_from_queues(QUEUES)
+    assert running.id == job.id
+    return running
+
+
+def test_failed_job_is_dead_lettered_with_its_queue(worker):
+    queue_manager = worker.queue_manager
+    job = dequeued(queue_manager, Job('clean_logs', {}, max_retries=1), 'high')
+
+    worker.handle_failure(job, 'boom')
+
+    [entry] = queue_manager.get_dead_letters()
+    assert entry['queue'] == 'high' and entry['error'] == 'boom'
+    assert (job.id, 'failed') in worker.notified
+
+    assert queue_manager.requeue_dead_letters() == 1
+    assert queue_manager.get_queue_size('high') == 1
+    assert queue_manager.get_queue_size('default') == 0
+
+
+def test_retry_goes_back_to_the_same_queue(worker):
+    queue_manager = worker.queue_manager
+    job = dequeued(queue_manager, Job('clean_logs', {}, max_retries=3), 'low')
+
+    worker.handle_failure(job, 'flaky')
+
+    assert queue_manager.get_queue_size('low') == 1
+    assert queue_manager.get_next_job_from_queues(QUEUES).retry_count == 1
+
+
+def test_dead_lettering_again_does_not_double_count(any_queue_manager):
+    job = Job('clean_logs', {})
+    any_queue_manager.add_job(job)
+
+    any_queue_manager.dead_letter(job, 'default')
+    any_queue_manager.dead_letter(job, 'default')
+
+    assert any_queue_manager.get_dead_letter_counts() == {'clean_logs': 1}
+    assert len(any_queue_manager.get_dead_letters()) == 1
+
+
+def test_removing_entries_twice_keeps_counts_at_zero(any_queue_manager):
+    jobs = [Job('clean_logs', {}) for _ in range(2)]
+    for job in jobs:
+        any_queue_manager.add_job(job)
+        any_queue_manager.dead_letter(job, 'default')
+    entry = [(jobs[0].id, 'clean_logs')]
+
+    any_queue_manager.backend.dlq_remove(entry)
+    any_queue_manager.backend.dlq_remove(entry)
+
+    assert any_queue_manager.get_dead_letter_counts() == {'clean_logs': 1}
+
+
+def test_job_of_a_dead_worker_is_recovered_onto_its_queue(queue_manager):
+    job = dequeued(queue_manager, Job('clean_logs', {}, max_retries=1), 'low')
+    job.status = 'processing'
+    queue_manager.update_job(job)
+
+    assert queue_manager._recover_job(job.id, 'gone-worker')
+
+    [entry] = queue_manager.get_dead_letters()
+    assert entry['queue'] == 'low'
+
+
+def test_evicted_payloads_are_requeued_from_their_rows(any_queue_manager):
+    evicted, unknown = Job('clean_logs', {'keep': 1}), Job('clean_logs', {})
+    any_queue_manager.add_job(evicted, 'low')
+    any_queue_manager.dead_letter(evicted, 'low')
+    any_queue_manager.backend.delete_jobs([evicted.id])
+    any_queue_manager.dead_letter(unknown, 'low')
+
+    assert any_queue_manager.requeue_dead_letters() == 1
+
+    requeued = any_queue_manager.get_next_job('low')
+    assert (requeued.id, requeued.task_data) == (evicted.id, {'keep': 1})
+    # With neither payload nor row the entry is reported, not dropped
+    assert [entry['job_id'] for entry in any_queue_manager.get_dead_letters()] == [unknown.id]
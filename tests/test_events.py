@@ -0,0 +1,72 @@
+"""Job update fan-out: long-poll waits and the lazy listener thread"""
+
+import threading
+
+from workers.events import JobEventHub
+from workers.job import Job
+
+
+def finish_later(queue_manager, job, delay=0.2):
+    def finish():
+        job.status = 'completed'
+        queue_manager.update_job(job)
+    timer = threading.Timer(delay, finish)
+    timer.start()
+    return timer
+
+
+def test_importing_the_api_starts_no_listener():
+    from api import app as app_module
+
+    assert app_module.queue_manager.events._thread is None
+
+
+def test_add_listener_does_not_start_the_thread(queue_manager):
+    hub = JobEventHub(queue_manager.backend)
+    hub.add_listener(lambda job_id, status: None)
+
+    assert hub._thread is None
+
+
+def test_first_request_starts_the_listener(api, queue_manager):
+    api.get('/api/tasks')
+
+    assert queue_manager.events._thread.is_alive()
+
+
+def test_listeners_and_waiters_see_updates(queue_manager):
+    seen, done = [], threading.Event()
+    def listener(job_id, status):
+        seen.append((job_id, status))
+        if status == 'completed':
+            done.set()
+    queue_manager.events.add_listener(listener)
+    job = Job('clean_logs', {})
+    waiter = queue_manager.events.subscribe(job.id)
+
+    queue_manager.add_job(job)
+    finish_later(queue_manager, job)
+
+    assert waiter.get(timeout=5) == 'completed'
+    assert done.wait(5) and (job.id, 'completed') in seen
+
+
+def test_wait_returns_when_the_job_finishes(api, queue_manager):
+    job = Job('clean_logs', {})
+    queue_manager.add_job(job)
+    finish_later(queue_manager, job)
+
+    body = api.get(f'/api/jobs/{job.id}/wait?timeout=5').get_json()
+
+    assert body['job']['status'] == 'completed'
+    assert not body['timed_out']
+
+
+def test_wait_times_out_on_an_unfinished_job(api, queue_manager):
+    job = Job('clean_logs', {})
+    queue_manager.add_job(job)
+
+    body = api.get(f'/api/jobs/{job.id}/wait?timeout=0.1').get_json()
+
+    assert body['timed_out'] and body['job']['status'] == 'pending'
+    assert api.get('/api/jobs/missing/wait?timeout=0.1').status_code == 404
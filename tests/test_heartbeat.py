@@ -0,0 +1,88 @@
+"""Worker heartbeats, the live worker registry and reaping dead workers"""
+
+import time
+
+import pytest
+
+from workers.heartbeat import Heartbeat
+from workers.job import Job
+
+
+@pytest.fixture(params=['memory', 'redis'])
+def worker(request, make_queue_manager, make_worker):
+    return make_worker(make_queue_manager(request.param), worker_id='w1')
+
+
+def take_job(worker, queue_name='default'):
+    queue_manager = worker.queue_manager
+    queue_manager.add_job(Job('clean_logs', {}), queue_name)
+    job = queue_manager.get_next_job(queue_name)
+    job.status = 'processing'
+    queue_manager.update_job(job, worker_id=worker.worker_id)
+    worker.current_jobs = [job]
+    return job
+
+
+def test_heartbeat_reports_what_the_worker_holds(worker):
+    job = take_job(worker)
+    prefetched = Job('clean_logs', {})
+    worker.prefetched = [prefetched]
+
+    snapshot = Heartbeat(worker).snapshot()
+
+    assert snapshot['worker_id'] == 'w1'
+    assert snapshot['current_jobs'][0]['id'] == job.id
+    assert snapshot['in_flight'] == [job.id, prefetched.id]
+
+
+def test_live_worker_is_listed_and_kept(worker):
+    take_job(worker)
+    Heartbeat(worker, ttl=30).beat()
+
+    [info] = worker.queue_manager.get_workers()
+
+    assert info['worker_id'] == 'w1' and info['alive']
+    assert worker.queue_manager.reap_dead_workers() == 0
+
+
+def test_jobs_of_a_silent_worker_are_recovered_once(worker):
+    queue_manager = worker.queue_manager
+    job = take_job(worker, 'high')
+    Heartbeat(worker, ttl=1).beat()
+    time.sleep(1.1)
+
+    assert not queue_manager.get_workers()[0]['alive']
+    assert queue_manager.reap_dead_workers() == 1
+    assert queue_manager.reap_dead_workers() == 0
+
+    recovered = queue_manager.get_next_job('high')
+    assert recovered.id == job.id and recovered.retry_count == 1
+    assert queue_manager.get_workers() == []
+
+
+def test_clean_stop_leaves_the_registry(worker):
+    heartbeat = Heartbeat(worker, ttl=30)
+    heartbeat.beat()
+
+    heartbeat.stop()
+
+    assert worker.queue_manager.get_workers() == []
+
+
+def test_stop_mid_job_stays_registered_for_recovery(worker):
+    take_job(worker)
+    heartbeat = Heartbeat(worker, ttl=30)
+    heartbeat.beat()
+
+    heartbeat.stop()
+
+    assert len(worker.queue_manager.get_workers()) == 1
+
+
+def test_workers_endpoint(api, make_worker):
+    worker = make_worker(worker_id='w1')
+    Heartbeat(worker, ttl=30).beat()
+
+    body = api.get('/api/workers?alive=1').get_json()
+
+    assert body['alive'] == 1 and body['workers'][0]['worker_id'] == 'w1'
@@ -0,0 +1,71 @@
+"""Secondary indexes by status and task behind find_jobs"""
+
+from workers.job import Job
+
+
+def add(queue_manager, task_name='clean_logs', count=1):
+    jobs = [Job(task_name, {'i': i}) for i in range(count)]
+    for job in jobs:
+        queue_manager.add_job(job)
+    return jobs
+
+
+def move(queue_manager, job, status):
+    job.status = status
+    queue_manager.update_job(job)
+
+
+def ids(found):
+    jobs, total = found
+    return {job.id for job in jobs}, total
+
+
+def test_status_index_follows_transitions(any_queue_manager):
+    a, b, c = add(any_queue_manager, count=3)
+    move(any_queue_manager, a, 'processing')
+    move(any_queue_manager, b, 'processing')
+    move(any_queue_manager, b, 'completed')
+
+    assert ids(any_queue_manager.find_jobs(status='processing')) == ({a.id}, 1)
+    assert ids(any_queue_manager.find_jobs(status='completed')) == ({b.id}, 1)
+    assert ids(any_queue_manager.find_jobs(status='pending')) == ({c.id}, 1)
+
+
+def test_task_and_status_filters_combine(any_queue_manager):
+    [email] = add(any_queue_manager, 'send_email')
+    [sms] = add(any_queue_manager, 'send_sms')
+    move(any_queue_manager, email, 'failed')
+    move(any_queue_manager, sms, 'failed')
+
+    assert ids(any_queue_manager.find_jobs(status='failed', task_name='send_email')) == ({email.id}, 1)
+    assert ids(any_queue_manager.find_jobs(task_name='send_sms')) == ({sms.id}, 1)
+
+
+def test_pages_cover_every_job_once(any_queue_manager):
+    jobs = add(any_queue_manager, count=5)
+
+    seen = []
+    for offset in (0, 2, 4):
+        page, total = any_queue_manager.find_jobs(task_name='clean_logs', offset=offset, limit=2)
+        assert total == 5
+        seen.extend(job.id for job in page)
+
+    assert sorted(seen) == sorted(job.id for job in jobs)
+
+
+def test_deleted_jobs_leave_the_indexes(any_queue_manager):
+    a, b = add(any_queue_manager, count=2)
+
+    any_queue_manager.backend.delete_jobs([a.id])
+
+    assert ids(any_queue_manager.find_jobs(status='pending')) == ({b.id}, 1)
+    assert ids(any_queue_manager.find_jobs(task_name='clean_logs')) == ({b.id}, 1)
+
+
+def test_filtered_api_listing(api, queue_manager):
+    [job] = add(queue_manager, 'send_email')
+    add(queue_manager, 'send_sms')
+
+    body = api.get('/api/jobs?task=send_email&status=pending').get_json()
+
+    assert body['total'] == 1 and body['jobs'][0]['id'] == job.id
@@ -0,0 +1,89 @@
+"""Task time limits and job cancellation"""
+
+import time
+
+import pytest
+
+from workers.job import Job
+from workers.limits import JobCancelled, SoftTimeLimitExceeded, TaskGuard, TimeLimitExceeded
+
+
+def spin(seconds):
+    deadline = time.monotonic() + seconds
+    while time.monotonic() < deadline:
+        pass
+
+
+def test_hard_limit_interrupts_the_task():
+    with pytest.raises(TimeLimitExceeded):
+        with TaskGuard(time_limit=0.1, tick=0.02):
+            spin(2)
+
+
+def test_hard_limit_is_not_caught_by_except_exception():
+    with pytest.raises(TimeLimitExceeded):
+        with TaskGuard(time_limit=0.1, tick=0.02):
+            try:
+                spin(2)
+            except Exception:
+                pass
+
+
+def test_soft_limit_is_raised_once_and_can_be_handled():
+    raised = 0
+    with TaskGuard(soft_time_limit=0.05, tick=0.02):
+        try:
+            spin(2)
+        except SoftTimeLimitExceeded:
+            raised += 1
+        # Cleanup runs past the soft limit without being interrupted again
+        spin(0.1)
+
+    assert raised == 1
+
+
+def test_cancellation_interrupts_the_task():
+    requested = {'cancel': False}
+
+    with pytest.raises(JobCancelled):
+        with TaskGuard(is_cancelled=lambda: requested['cancel'], tick=0.02, cancel_poll_interval=0.02):
+            spin(0.05)
+            requested['cancel'] = True
+            spin(2)
+
+
+def test_guard_without_limits_does_nothing():
+    with TaskGuard() as guard:
+        spin(0.01)
+
+    assert not guard.enabled
+
+
+def test_cancelling_a_queued_job_drops_it_at_dequeue(any_queue_manager):
+    job = Job('clean_logs', {})
+    any_queue_manager.add_job(job)
+
+    assert any_queue_manager.cancel_job(job.id) == 'cancelled'
+    assert any_queue_manager.get_job(job.id).status == 'cancelled'
+    assert any_queue_manager.get_next_job('default') is None
+
+
+def test_cancelling_a_running_job_flags_it(queue_manager):
+    job = Job('clean_logs', {})
+    queue_manager.add_job(job)
+    running = queue_manager.get_next_job('default')
+    running.status = 'processing'
+    queue_manager.update_job(running)
+
+    assert queue_manager.cancel_job(job.id) == 'cancelling'
+    assert queue_manager.is_cancel_requested(job.id)
+
+
+def test_finished_or_missing_jobs_cannot_be_cancelled(queue_manager):
+    job = Job('clean_logs', {})
+    queue_manager.add_job(job)
+    job.status = 'completed'
+    queue_manager.update_job(job)
+
+    assert queue_manager.cancel_job(job.id) is None
+    assert queue_manager.cancel_job('missing') is None
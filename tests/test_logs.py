@@ -0,0 +1,113 @@
+"""Structured logging: fields, truncation, per-job sampling and dropping"""
+
+import json
+import logging
+import queue
+
+import pytest
+
+from config import Config
+from workers import logs
+from workers.job import Job
+
+
+class Records(logging.Handler):
+    def __init__(self):
+        super().__init__()
+        self.records = []
+
+    def emit(self, record):
+        self.records.append(record)
+
+
+@pytest.fixture
+def capture():
+    """capture(name) -> (structured logger 'jobqueue.<name>', its records)"""
+    attached = []
+    def capture(name):
+        handler = Records()
+        logger = logs.get_logger(name)
+        logger.logger.addHandler(handler)
+        logger.logger.setLevel(logging.DEBUG)
+        attached.append((logger.logger, handler))
+        return logger, handler.records
+    yield capture
+    for logger, handler in attached:
+        logger.removeHandler(handler)
+        logger.setLevel(logging.NOTSET)
+
+
+def test_truncate_cuts_long_values_only():
+    assert logs.truncate('short', 10) == 'short'
+    assert logs.truncate('x' * 30, 10) == 'x' * 10 + '... (30 chars)'
+    assert logs.truncate(12345678901234, 5) == 12345678901234
+    assert logs.truncate({'values': list(range(1000))}, 20) == '{"values": [0, 1, 2,... (truncated)'
+    assert logs.truncate([1, 2], 20) == [1, 2]
+
+
+def test_job_sampling_is_stable_per_job():
+    ids = [f'job-{i}' for i in range(2000)]
+
+    sampled = [job_id for job_id in ids if logs.job_sampled(job_id, 0.25)]
+
+    assert 0.2 < len(sampled) / len(ids) < 0.3
+    assert sampled == [job_id for job_id in ids if logs.job_sampled(job_id, 0.25)]
+    assert logs.job_sampled('any', 1) and not logs.job_sampled('any', 0)
+
+
+def test_json_lines_carry_fields_and_job(capture):
+    log, records = capture('test-json')
+    job = Job('send_email', {})
+
+    log.warning('job failed', job=job, error='x' * 100, attempt=2)
+
+    entry = json.loads(logs.JsonFormatter(max_field=40).format(records[-1]))
+    assert entry['level'] == 'warning'
+    assert entry['logger'] == 'jobqueue.test-json'
+    assert entry['msg'] == 'job failed'
+    assert (entry['job_id'], entry['task'], entry['attempt']) == (job.id, 'send_email', 2)
+    assert entry['error'] == 'x' * 40 + '... (100 chars)'
+
+
+def test_unsampled_jobs_log_only_their_problems(capture, monkeypatch):
+    monkeypatch.setattr(Config, 'LOG_JOB_SAMPLE_RATE', 0)
+    log, records = capture('test-sampling')
+    job = Job('send_email', {})
+
+    log.info('job started', job=job)
+    log.warning('job failed', job=job)
+    log.info('not about a job')
+
+    assert [record.getMessage() for record in records] == ['job failed', 'not about a job']
+
+
+def test_handler_drops_records_past_its_queue_size():
+    handler = logs.DroppingQueueHandler(queue.SimpleQueue(), max_size=2)
+    record = logging.LogRecord('jobqueue.test', logging.INFO, __file__, 1, 'msg', None, None)
+
+    for _ in range(5):
+        handler.handle(record)
+
+    assert handler.queue.qsize() == 2
+    assert handler.dropped == 3
+
+
+def test_text_format():
+    record = logging.LogRecord('jobqueue.test', logging.INFO, __file__, 1, 'job done', None, None)
+    record.fields = {'job_id': 'abc', 'attempt': 1}
+
+    line = logs.TextFormatter().format(record)
+
+    assert line.endswith('INFO    jobqueue.test: job done job_id="abc" attempt=1')
+
+
+def test_database_errors_are_logged(capture, db):
+    _, records = capture('database')
+    job = Job('send_email', {})
+    job.task_data = {'unserializable': object()}
+
+    assert db.save_job(job) is False
+
+    [record] = [r for r in records if r.levelno == logging.ERROR]
+    assert record.getMessage() == 'could not save job'
+    assert record.fields['job_id'] == job.id
@@ -0,0 +1,90 @@
+"""Bulk job lookup: backend first, database for the rest"""
+
+import pytest
+
+from config import Config
+from workers.job import Job
+
+
+def queue(queue_manager, count, queue_name='default'):
+    jobs = [Job('clean_logs', {'i': i}) for i in range(count)]
+    for job in jobs:
+        queue_manager.add_job(job, queue_name)
+    return jobs
+
+
+def test_lookup_reports_found_and_missing_jobs(any_queue_manager):
+    jobs = queue(any_queue_manager, 3)
+    ids = [job.id for job in jobs]
+
+    found, missing = any_queue_manager.lookup_jobs(ids + ['missing', ids[0]], fields=['status'])
+
+    assert found == {job_id: {'id': job_id, 'status': 'pending'} for job_id in ids}
+    assert missing == ['missing']
+
+
+def test_whole_jobs_without_fields(queue_manager):
+    [job] = queue(queue_manager, 1)
+
+    found, _ = queue_manager.lookup_jobs([job.id])
+
+    assert found[job.id]['task_data'] == {'i': 0}
+    assert found[job.id]['task_name'] == 'clean_logs'
+
+
+def test_database_only_fields_and_dropped_payloads_come_from_the_database(queue_manager):
+    kept, dropped = queue(queue_manager, 2, queue_name='low')
+    queue_manager.backend.delete_jobs([dropped.id])
+
+    found, missing = queue_manager.lookup_jobs([kept.id, dropped.id], fields=['status', 'queue_name'])
+
+    assert missing == []
+    assert found == {
+        kept.id: {'id': kept.id, 'status': 'pending', 'queue_name': 'low'},
+        dropped.id: {'id': dropped.id, 'status': 'pending', 'queue_name': 'low'}
+    }
+
+
+def test_redis_reads_payloads_in_bounded_chunks(make_queue_manager):
+    queue_manager = make_queue_manager('redis')
+    queue_manager.backend.hmget_chunk = 2
+    ids = [job.id for job in queue(queue_manager, 5)]
+
+    found, missing = queue_manager.lookup_jobs(ids)
+
+    assert sorted(found) == sorted(ids) and missing == []
+
+
+def test_database_reads_ids_in_batches(db):
+    jobs = [Job('clean_logs', {}) for _ in range(7)]
+    db.save_jobs(jobs)
+
+    rows = db.get_jobs([job.id for job in jobs] + ['missing'], batch_size=3)
+
+    assert sorted(row['id'] for row in rows) == sorted(job.id for job in jobs)
+
+
+def test_lookup_endpoint(api, queue_manager):
+    [job] = queue(queue_manager, 1)
+
+    response = api.post('/api/jobs/lookup', json={'job_ids': [job.id, 'missing'], 'fields': ['status']})
+
+    assert response.status_code == 200
+    assert response.get_json()['jobs'] == {job.id: {'id': job.id, 'status': 'pending'}}
+    assert response.get_json()['missing'] == ['missing']
+
+
+@pytest.mark.parametrize('body', [
+    {},
+    {'job_ids': 'abc'},
+    {'job_ids': [1, 2]},
+    {'job_ids': ['a'], 'fields': 'status'},
+])
+def test_lookup_endpoint_rejects_bad_requests(api, body):
+    assert api.post('/api/jobs/lookup', json=body).status_code == 400
+
+
+def test_lookup_endpoint_limits_the_number_of_ids(api, monkeypatch):
+    monkeypatch.setattr(Config, 'LOOKUP_MAX_IDS', 2)
+
+    assert api.post('/api/jobs/lookup', json={'job_ids': ['a', 'b', 'c']}).status_code == 400
@@ -0,0 +1,153 @@
+"""Split analyze_data runs: partial jobs, the reducer and its barrier"""
+
+import pytest
+
+from config import Config
+from conftest import BACKENDS
+from workers.admission import AdmissionPolicy, AdmissionRejected
+from workers.job import Job
+
+DATASET = [float(i) for i in range(1, 13)]
+
+
+def analyze(**task_data):
+    return Job('analyze_data', dict({'dataset': DATASET, 'analyses': ['mean']}, **task_data))
+
+
+def finish(queue_manager, job_id, status='completed', result=None):
+    job = queue_manager.get_job(job_id)
+    job.status = status
+    job.result = result
+    queue_manager.update_job(job)
+
+
+def queued_ids(queue_manager, queue_name='default'):
+    ids = []
+    while True:
+        job = queue_manager.get_next_job(queue_name)
+        if job is None:
+            return ids
+        ids.append(job.id)
+
+
+@pytest.mark.parametrize('backend', BACKENDS)
+def test_barrier_releases_once_on_the_last_job(make_queue_manager, backend):
+    barriers = make_queue_manager(backend).backend
+    barriers.barrier_create('r1', ['a', 'b'])
+
+    assert barriers.barrier_release('r1', 'a') is False
+    # Releasing a job twice does not count it twice
+    assert barriers.barrier_release('r1', 'a') is False
+    assert barriers.barrier_release('r1', 'b') is True
+    assert barriers.barrier_release('r1', 'b') is False
+
+
+@pytest.mark.parametrize('backend', BACKENDS)
+def test_reducer_is_queued_when_the_last_partial_finishes(make_queue_manager, backend):
+    queue_manager = make_queue_manager(backend)
+
+    reducer_id, partial_ids = queue_manager.add_map_reduce(analyze(), 3)
+
+    assert queue_manager.get_job(reducer_id).status == 'waiting'
+    assert sorted(queued_ids(queue_manager)) == sorted(partial_ids)
+    for partial_id in partial_ids[:-1]:
+        finish(queue_manager, partial_id)
+    assert queue_manager.get_next_job('default') is None
+
+    finish(queue_manager, partial_ids[-1])
+
+    assert queued_ids(queue_manager) == [reducer_id]
+    assert queue_manager.get_job(reducer_id).status == 'pending'
+
+
+def test_failed_partial_still_releases_the_reducer(queue_manager):
+    reducer_id, partial_ids = queue_manager.add_map_reduce(analyze(), 2)
+    queued_ids(queue_manager)
+
+    finish(queue_manager, partial_ids[0], status='failed')
+    finish(queue_manager, partial_ids[1])
+
+    assert queued_ids(queue_manager) == [reducer_id]
+
+
+@pytest.fixture
+def task_db(monkeypatch, db):
+    """Tasks that open DatabaseManager() get the test database"""
+    from database import db_manager
+    monkeypatch.setattr(db_manager, 'DatabaseManager', lambda: db)
+    return db
+
+
+def test_reducer_fails_when_a_partial_failed(queue_manager, task_db):
+    from workers import tasks
+
+    reducer_id, partial_ids = queue_manager.add_map_reduce(analyze(), 2)
+    finish(queue_manager, partial_ids[0], status='failed')
+    finish(queue_manager, partial_ids[1])
+
+    with pytest.raises(Exception, match='failed'):
+        tasks.analyze_data_reduce({'partials': partial_ids})
+
+
+def test_split_run_through_a_worker(queue_manager, make_worker, task_db):
+    worker = make_worker()
+    reducer_id, partial_ids = queue_manager.add_map_reduce(analyze(), 4)
+
+    while (job := worker.get_next_job()) is not None:
+        worker.process_job(job)
+
+    reducer = task_db.get_job(reducer_id)
+    assert reducer['status'] == 'completed'
+    assert reducer['result']['partitions'] == 4
+    assert reducer['result']['dataset_size'] == len(DATASET)
+    assert reducer['result']['results']['mean'] == pytest.approx(6.5)
+
+
+def test_whole_fan_out_is_admitted_or_rejected(make_queue_manager):
+    admission = AdmissionPolicy(queue_depths={'default': 4}, task_depths={}, rate=0, shed_depth=0)
+    queue_manager = make_queue_manager(admission=admission)
+
+    # Four partial jobs and the reducer do not fit
+    with pytest.raises(AdmissionRejected):
+        queue_manager.add_map_reduce(analyze(), 4, enforce_limits=True)
+    assert queue_manager.get_next_job('default') is None
+
+    reducer_id, partial_ids = queue_manager.add_map_reduce(analyze(), 3, enforce_limits=True)
+    assert len(queued_ids(queue_manager)) == 3
+
+
+@pytest.mark.parametrize('partitions', [0, Config.MAP_REDUCE_MAX_PARTITIONS + 1])
+def test_partitions_are_bounded(queue_manager, partitions):
+    with pytest.raises(ValueError):
+        queue_manager.add_map_reduce(analyze(), partitions)
+
+
+def test_failed_fan_out_cancels_what_it_queued(queue_manager, monkeypatch):
+    add_job, calls = queue_manager.add_job, []
+    def failing_add_job(job, *args, **kwargs):
+        calls.append(job.id)
+        if len(calls) == 2:
+            raise RuntimeError('backend down')
+        return add_job(job, *args, **kwargs)
+    monkeypatch.setattr(queue_manager, 'add_job', failing_add_job)
+
+    with pytest.raises(RuntimeError):
+        queue_manager.add_map_reduce(analyze(), 3)
+
+    assert queue_manager.get_next_job('default') is None
+    statuses = {job['task_name']: job['status'] for job in queue_manager.db.get_all_jobs()}
+    assert statuses == {'analyze_data_partial': 'cancelled', 'analyze_data_reduce': 'cancelled'}
+
+
+def test_api_splits_and_validates_partitions(api):
+    def create(task_data):
+        return api.post('/api/jobs', json={'task_name': 'analyze_data', 'task_data': task_data})
+
+    response = create({'dataset': DATASET, 'partitions': 3})
+    assert response.status_code == 200
+    assert len(response.get_json()['partial_job_ids']) == 3
+
+    assert create({'dataset': DATASET, 'partitions': Config.MAP_REDUCE_MAX_PARTITIONS + 1}).status_code == 400
+    assert create({'dataset': DATASET, 'partitions': 'many'}).status_code == 400
+    assert create({'dataset': [], 'partitions': 2}).status_code == 400
+    assert create([1, 2, 3]).status_code == 400
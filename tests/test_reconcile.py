@@ -0,0 +1,134 @@
+"""Reconciling the queue backend with the jobs table"""
+
+import pytest
+
+from workers.job import Job
+from workers.reconcile import Reconciler, format_report
+
+
+def reconcile(queue_manager, dry_run=False):
+    report = Reconciler(queue_manager, batch_size=2, dry_run=dry_run).run()
+    return {name: d['count'] for name, d in report['differences'].items() if d['count']}
+
+
+def queue(queue_manager, count=1, queue_name='default'):
+    jobs = [Job('clean_logs', {'i': i}) for i in range(count)]
+    for job in jobs:
+        queue_manager.add_job(job, queue_name)
+    return jobs
+
+
+def test_agreeing_sides_have_no_differences(any_queue_manager):
+    queue(any_queue_manager, 3)
+
+    report = Reconciler(any_queue_manager, batch_size=2).run()
+
+    assert reconcile(any_queue_manager) == {}
+    assert report['scanned'] == {'backend_jobs': 3, 'queue_entries': 3, 'db_jobs': 3}
+    assert 'Backend and database agree' in format_report(report)
+
+
+def test_lost_queue_entries_are_re_enqueued(any_queue_manager):
+    jobs = queue(any_queue_manager, 3, queue_name='low')
+    any_queue_manager.backend.clear_queue(any_queue_manager.queues['low'])
+
+    assert reconcile(any_queue_manager) == {'not_queued': 3}
+
+    assert reconcile(any_queue_manager) == {}
+    drained = [any_queue_manager.get_next_job('low') for _ in jobs]
+    assert sorted(job.id for job in drained) == sorted(job.id for job in jobs)
+
+
+def test_dry_run_changes_nothing(queue_manager):
+    queue(queue_manager)
+    queue_manager.backend.clear_queue(queue_manager.queues['default'])
+
+    assert reconcile(queue_manager, dry_run=True) == {'not_queued': 1}
+    assert reconcile(queue_manager, dry_run=True) == {'not_queued': 1}
+    assert queue_manager.get_next_job('default') is None
+
+
+def test_stale_processing_jobs_count_an_attempt(queue_manager):
+    job, spent = queue(queue_manager, 2)
+    for running in (queue_manager.get_next_job('default'), queue_manager.get_next_job('default')):
+        running.status = 'processing'
+        if running.id == spent.id:
+            running.retry_count = running.max_retries - 1
+        queue_manager.update_job(running)
+
+    assert reconcile(queue_manager) == {'stale_processing': 2, 'dead_lettered': 1}
+
+    again = queue_manager.get_next_job('default')
+    assert (again.id, again.retry_count, again.status) == (job.id, 1, 'pending')
+    assert queue_manager.db.get_job(spent.id)['status'] == 'failed'
+    assert [entry['job_id'] for entry in queue_manager.get_dead_letters()] == [spent.id]
+
+
+def test_finished_state_wins_on_either_side(any_queue_manager):
+    ahead_in_backend, ahead_in_db = queue(any_queue_manager, 2)
+    for job, side in ((ahead_in_backend, 'backend'), (ahead_in_db, 'db')):
+        job.status = 'completed'
+        if side == 'backend':
+            any_queue_manager.backend.save_job(job.id, job.to_json())
+        else:
+            any_queue_manager.db.save_job(job)
+
+    assert reconcile(any_queue_manager) == {'db_behind': 1, 'backend_behind': 1}
+
+    assert any_queue_manager.db.get_job(ahead_in_backend.id)['status'] == 'completed'
+    assert any_queue_manager.get_job(ahead_in_db.id).status == 'completed'
+
+
+def test_missing_rows_and_payloads_are_rebuilt(any_queue_manager):
+    unrecorded = Job('clean_logs', {})
+    any_queue_manager.backend.enqueue(unrecorded.id, unrecorded.to_json(), any_queue_manager.queues['high'])
+    [dropped] = queue(any_queue_manager)
+    any_queue_manager.backend.delete_jobs([dropped.id])
+
+    assert reconcile(any_queue_manager) == {'db_row_missing': 1, 'payload_missing': 1}
+
+    assert any_queue_manager.db.get_job(unrecorded.id)['queue_name'] == 'high'
+    assert any_queue_manager.get_job(dropped.id).task_data == {'i': 0}
+
+
+def test_entries_of_unknown_jobs_are_reported(queue_manager):
+    stray = Job('clean_logs', {})
+    queue_manager.backend.enqueue(stray.id, stray.to_json(), queue_manager.queues['default'])
+    queue_manager.backend.delete_jobs([stray.id])
+
+    assert reconcile(queue_manager) == {'orphaned_entries': 1}
+
+
+def test_waiting_reducers_are_left_for_their_partial_jobs(queue_manager):
+    split = Job('analyze_data', {'dataset': [1.0, 2.0, 3.0, 4.0]})
+    queue_manager.add_map_reduce(split, 2)
+
+    assert reconcile(queue_manager) == {}
+
+
+def test_queue_scan_pages_a_snapshot(make_queue_manager):
+    queue_manager = make_queue_manager('redis')
+    ids = [job.id for job in queue(queue_manager, 5)]
+    client, queue_key = queue_manager.backend.redis_client, queue_manager.queues['default']
+
+    scan = queue_manager.backend.queued_job_ids([queue_key], batch_size=2)
+    first = [next(scan)[1], next(scan)[1]]
+    # The live list changes between two pages; the scan goes on over its copy
+    client.delete(queue_key)
+    rest = [job_id for _, job_id in scan]
+
+    assert first + rest == ids
+    assert client.keys('reconcile:snapshot:*') == []
+
+
+@pytest.mark.parametrize('backend', ['redis', 'redis-sharded'])
+def test_queue_scan_covers_every_list_and_cleans_up(make_queue_manager, backend):
+    queue_manager = make_queue_manager(backend)
+    jobs = queue(queue_manager, 5) + [Job('clean_logs', {}, tenant='acme')]
+    queue_manager.add_job(jobs[-1])
+
+    scanned = list(queue_manager.backend.queued_job_ids([queue_manager.queues['default']], batch_size=2))
+
+    assert sorted(job_id for _, job_id in scanned) == sorted(job.id for job in jobs)
+    shards = getattr(queue_manager.backend, 'shards', {'': queue_manager.backend}).values()
+    assert not any(shard.redis_client.keys('reconcile:snapshot:*') for shard in shards)
@@ -0,0 +1,57 @@
+"""Atomic enqueue/dequeue through the Redis Lua scripts"""
+
+import pytest
+
+from workers.job import Job
+
+
+@pytest.fixture
+def redis_queue(make_queue_manager):
+    return make_queue_manager('redis')
+
+
+def test_enqueue_stores_payload_and_queue_entry_together(redis_queue):
+    job = Job('send_email', {'to': 'a@example.com'})
+    redis_queue.add_job(job, 'default')
+
+    client = redis_queue.backend.redis_client
+    assert client.hexists('jobs', job.id)
+    assert client.lrange('queue:default', 0, -1) == [job.id]
+    assert client.hget('queue:task_depth', 'send_email') == '1'
+
+
+def test_dequeue_is_fifo_and_serves_queues_in_priority_order(redis_queue):
+    low = Job('clean_logs', {})
+    first, second = Job('clean_logs', {}), Job('clean_logs', {})
+    high = Job('clean_logs', {})
+    redis_queue.add_job(low, 'low')
+    redis_queue.add_job(first, 'default')
+    redis_queue.add_job(second, 'default')
+    redis_queue.add_job(high, 'high')
+
+    order = [redis_queue.get_next_job_from_queues(['high', 'default', 'low']).id for _ in range(4)]
+
+    assert order == [high.id, first.id, second.id, low.id]
+    assert redis_queue.get_next_job_from_queues(['high', 'default', 'low']) is None
+    assert redis_queue.backend.redis_client.hget('queue:task_depth', 'clean_logs') == '0'
+
+
+def test_dequeue_skips_ids_whose_payload_is_gone(redis_queue):
+    orphan, job = Job('clean_logs', {}), Job('clean_logs', {})
+    redis_queue.add_job(orphan)
+    redis_queue.add_job(job)
+    redis_queue.backend.delete_jobs([orphan.id])
+
+    assert redis_queue.get_next_job().id == job.id
+    assert redis_queue.get_queue_size('default') == 0
+
+
+def test_batch_dequeue_pops_each_job_once(redis_queue):
+    jobs = [Job('clean_logs', {'i': i}) for i in range(5)]
+    for job in jobs:
+        redis_queue.add_job(job)
+
+    batch = redis_queue.get_next_jobs_from_queues(['default'], 3)
+    rest = redis_queue.get_next_jobs_from_queues(['default'], 10)
+
+    assert [j.id for j in batch + rest] == [j.id for j in jobs]
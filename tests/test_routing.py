@@ -0,0 +1,66 @@
+"""Task routing to dedicated queues and specialized workers"""
+
+import pytest
+
+from config import Config
+from conftest import BACKENDS
+from workers.job import Job
+from workers.routing import TaskRouter, parse_routes
+
+ROUTES = 'process_image=images,send_*=notifications'
+KNOWN = ['process_image', 'send_email', 'send_sms', 'clean_logs']
+
+
+@pytest.fixture
+def router():
+    return TaskRouter(parse_routes(ROUTES))
+
+
+def test_first_matching_rule_wins():
+    router = TaskRouter(parse_routes('send_sms=sms, send_*=notifications'))
+
+    assert router.route('send_sms') == 'sms'
+    assert router.route('send_email') == 'notifications'
+    assert router.route('clean_logs') is None
+    assert router.queues == ['sms', 'notifications']
+
+
+def test_worker_queues_for_a_task_set(router):
+    assert router.queues_for(['send_email', 'send_sms'], KNOWN) == ['notifications']
+    assert router.queues_for(['process_image'], KNOWN) == ['images']
+
+
+def test_unrouted_task_cannot_have_a_specialized_worker(router):
+    with pytest.raises(ValueError, match='no dedicated queue'):
+        router.queues_for(['clean_logs'], KNOWN)
+
+
+def test_worker_must_cover_every_task_of_its_queues(router):
+    # It would pull send_sms jobs it cannot run
+    with pytest.raises(ValueError, match='send_sms'):
+        router.queues_for(['send_email'], KNOWN)
+
+
+@pytest.mark.parametrize('backend', BACKENDS)
+def test_routed_tasks_ignore_the_requested_queue(make_queue_manager, router, backend):
+    queue_manager = make_queue_manager(backend, router=router)
+    image = Job('process_image', {})
+    email = Job('send_email', {})
+    other = Job('clean_logs', {})
+
+    queue_manager.add_job(image, 'high')
+    queue_manager.add_job(email)
+    queue_manager.add_job(other, 'low')
+
+    assert queue_manager.get_next_job_from_queues(['images']).id == image.id
+    assert queue_manager.get_next_job_from_queues(['notifications']).id == email.id
+    assert queue_manager.get_next_job_from_queues(['high', 'default']) is None
+    assert queue_manager.get_next_job('low').id == other.id
+
+
+def test_specialized_worker_listens_only_on_its_queues(make_worker, monkeypatch):
+    monkeypatch.setattr(Config, 'TASK_ROUTES', ROUTES)
+
+    worker = make_worker(tasks=['send_email', 'send_sms'])
+
+    assert worker.queues == ['notifications']
@@ -0,0 +1,101 @@
+"""Sharded Redis backend: global priority order and resharding"""
+
+import uuid
+
+import pytest
+
+from conftest import SHARD_NODES
+from workers.backends.sharded_backend import ShardedRedisBackend
+from workers.job import Job
+
+
+@pytest.fixture
+def sharded(make_queue_manager):
+    return make_queue_manager('redis-sharded')
+
+
+def job_on(queue_manager, node, **task_data):
+    """A job whose id hashes to `node`"""
+    job = Job('clean_logs', task_data)
+    while queue_manager.backend.ring.get_node(job.id) != node:
+        job.id = str(uuid.uuid4())
+    return job
+
+
+@pytest.mark.parametrize('first_shard', [0, 1])
+def test_priority_holds_across_shards(sharded, first_shard):
+    low = job_on(sharded, SHARD_NODES[0])
+    high = job_on(sharded, SHARD_NODES[1])
+    sharded.add_job(low, 'low')
+    sharded.add_job(high, 'high')
+    sharded.backend._next_shard = first_shard
+
+    order = [sharded.get_next_job_from_queues(['high', 'default', 'low']).id for _ in range(2)]
+
+    assert order == [high.id, low.id]
+
+
+def test_batch_dequeue_fills_from_the_highest_queue_on_every_shard(sharded):
+    highs = [job_on(sharded, node) for node in SHARD_NODES for _ in range(2)]
+    lows = [job_on(sharded, node) for node in SHARD_NODES]
+    for job in lows:
+        sharded.add_job(job, 'low')
+    for job in highs:
+        sharded.add_job(job, 'high')
+
+    batch = sharded.get_next_jobs_from_queues(['high', 'default', 'low'], 4)
+
+    assert {job.id for job in batch} == {job.id for job in highs}
+
+
+def test_add_node_moves_its_share_and_keeps_queue_order(sharded):
+    jobs = [Job('clean_logs', {'i': i}) for i in range(60)]
+    for job in jobs:
+        sharded.add_job(job)
+
+    origin = {job.id: sharded.backend.ring.get_node(job.id) for job in jobs}
+
+    moved = sharded.backend.add_node('shard-c:6379', list(sharded.queues.values()), batch_size=7)
+
+    new_shard = sharded.backend.shards['shard-c:6379']
+    on_new = [j.id for j in jobs if sharded.backend.ring.get_node(j.id) == 'shard-c:6379']
+    queued = new_shard.redis_client.lrange('queue:default', 0, -1)
+    assert moved == len(on_new) > 0
+    assert sorted(queued) == sorted(on_new)
+    # Entries from each old shard keep their order
+    for node in SHARD_NODES:
+        assert [i for i in queued if origin[i] == node] == [i for i in on_new if origin[i] == node]
+    assert new_shard.redis_client.hget('queue:task_depth', 'clean_logs') == str(len(on_new))
+
+    drained = []
+    while True:
+        batch = sharded.get_next_jobs_from_queues(['default'], 25)
+        if not batch:
+            break
+        drained.extend(job.id for job in batch)
+    assert sorted(drained) == sorted(job.id for job in jobs)
+
+
+def test_move_entries_catches_entries_a_concurrent_pop_stepped_over(fake_redis):
+    backend = ShardedRedisBackend(['old:1', 'new:1'])
+    old = backend.shards['old:1'].redis_client
+    new = backend.shards['new:1'].redis_client
+    old.rpush('q', 'x1', 'm1', 'm2', 'm3', 'x2', 'm4')
+
+    # A worker pops the head right after the first page is read
+    lrange, calls = old.lrange, []
+    def racing_lrange(*args):
+        page = lrange(*args)
+        calls.append(args)
+        if len(calls) == 1:
+            old.lpop('q')
+        return page
+    old.lrange = racing_lrange
+
+    moved = ShardedRedisBackend._move_entries(
+        old, new, 'q', {'m1', 'm2', 'm3', 'm4'}, batch_size=2
+    )
+
+    assert sorted(moved) == ['m1', 'm2', 'm3', 'm4']
+    assert old.lrange('q', 0, -1) == ['x2']
+    assert sorted(new.lrange('q', 0, -1)) == ['m1', 'm2', 'm3', 'm4']
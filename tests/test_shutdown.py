@@ -0,0 +1,99 @@
+"""Worker shutdown: draining, forced stops and requeueing unfinished jobs"""
+
+import os
+import signal
+
+import pytest
+
+from workers.job import Job
+from workers.task_registry import task_registry
+
+TASK = 'test_shutdown'
+
+
+@pytest.fixture
+def signals(monkeypatch):
+    """Register a task that signals its worker `count` times while it runs"""
+    state = {'worker': None, 'count': 1, 'ran': []}
+    def task(data):
+        state['ran'].append(data['i'])
+        for _ in range(state['count']):
+            state['worker'].shutdown()
+        return {'success': True}
+    monkeypatch.setitem(task_registry.tasks, TASK, task)
+    monkeypatch.setitem(task_registry.options, TASK, {})
+    return state
+
+
+def queue(queue_manager, count=1, queue_name='default'):
+    jobs = [Job(TASK, {'i': i}) for i in range(count)]
+    for job in jobs:
+        queue_manager.add_job(job, queue_name)
+    return jobs
+
+
+def test_requeued_jobs_go_back_without_an_attempt(any_queue_manager):
+    job = queue(any_queue_manager, queue_name='low')[0]
+    running = any_queue_manager.get_next_job('low')
+    running.status = 'processing'
+    any_queue_manager.update_job(running)
+
+    assert any_queue_manager.requeue_jobs([running]) == 1
+
+    again = any_queue_manager.get_next_job('low')
+    assert again.id == job.id
+    assert (again.status, again.retry_count) == ('pending', 0)
+    assert any_queue_manager.get_job(job.id).started_at is None
+
+
+def test_cancelled_jobs_are_not_requeued(any_queue_manager):
+    job = queue(any_queue_manager)[0]
+    running = any_queue_manager.get_next_job('default')
+    running.status = 'processing'
+    any_queue_manager.update_job(running)
+    any_queue_manager.cancel_job(job.id)
+
+    assert any_queue_manager.requeue_jobs([running]) == 0
+    assert any_queue_manager.get_next_job('default') is None
+
+
+def test_first_signal_lets_the_running_job_finish(make_worker, queue_manager, signals):
+    jobs = queue(queue_manager, count=3)
+    worker = signals['worker'] = make_worker(prefetch=3)
+
+    worker.start(poll_interval=0)
+
+    assert signals['ran'] == [0]
+    assert queue_manager.get_job(jobs[0].id).status == 'completed'
+    # The prefetched jobs it had not started go back to the queue
+    assert worker.prefetched == []
+    assert sorted(j.id for j in [queue_manager.get_next_job('default') for _ in range(2)]) == sorted(
+        job.id for job in jobs[1:]
+    )
+    assert not worker._grace_timer.is_alive()
+
+
+def test_second_signal_requeues_the_running_job(make_worker, queue_manager, signals):
+    job = queue(queue_manager)[0]
+    worker = signals['worker'] = make_worker()
+    signals['count'] = 2
+
+    worker.start(poll_interval=0)
+
+    assert worker.forced
+    requeued = queue_manager.get_next_job('default')
+    assert requeued.id == job.id
+    assert requeued.retry_count == 0
+
+
+def test_grace_period_sends_the_second_signal(make_worker, monkeypatch):
+    sent = []
+    monkeypatch.setattr(os, 'kill', lambda pid, signum: sent.append((pid, signum)))
+    worker = make_worker()
+    worker.shutdown_grace = 0.01
+
+    worker.shutdown()
+    worker._grace_timer.join(1)
+
+    assert worker.draining and not worker.is_running
+    assert sent == [(os.getpid(), signal.SIGTERM)]
@@ -0,0 +1,130 @@
+"""Capacity simulator: scheduling rules, retries and recorded workloads"""
+
+from datetime import datetime, timedelta
+
+import pytest
+
+from workers.job import Job
+from workers.routing import TaskRouter, parse_routes
+from workers.simulator import (Simulator, TaskProfile, Workload, parse_fleet, parse_profile,
+                               percentiles, profiles_from_history)
+from workers.task_registry import TaskRegistry
+
+
+def simulate(arrivals, fleet='1', poll_interval=0, registry=None, router=None, seed=1, **profiles):
+    profiles = {task: profile if isinstance(profile, TaskProfile) else TaskProfile(durations=[profile])
+                for task, profile in profiles.items()}
+    return Simulator(Workload(arrivals, profiles), fleet, poll_interval=poll_interval,
+                     registry=registry or TaskRegistry(), router=router or TaskRouter(routes=[]),
+                     seed=seed).run()
+
+
+def test_percentiles_use_nearest_rank():
+    assert percentiles([4, 1, 3, 2], points=[50, 99]) == {'p50': 2, 'p99': 4, 'max': 4, 'mean': 2.5}
+    assert percentiles([]) == {}
+
+
+def test_parse_profile_and_fleet():
+    assert parse_profile('send_email:5, process_image:0.5:12') == (
+        {'send_email': 5.0, 'process_image': 0.5}, {'process_image': 12.0}
+    )
+    assert parse_fleet('6,process_image=2,send_email+send_sms=1') == [
+        (6, None), (2, ['process_image']), (1, ['send_email', 'send_sms'])
+    ]
+    with pytest.raises(ValueError):
+        parse_profile('send_email')
+    with pytest.raises(ValueError):
+        parse_fleet('0')
+
+
+def test_one_worker_runs_jobs_in_arrival_order():
+    report = simulate([(0, 'work', 'default')] * 3, work=1.0)
+
+    assert (report['completed'], report['attempts'], report['simulated_seconds']) == (3, 3, 3.0)
+    assert report['queue_wait']['max'] == 2.0
+    assert report['utilization'] == 1.0
+
+
+def test_idle_worker_finds_a_job_at_its_next_poll():
+    report = simulate([(0.5, 'work', 'default')], poll_interval=2, work=1.0)
+
+    assert report['queue_wait']['max'] == 1.5
+
+
+def test_higher_priority_queue_is_served_first():
+    arrivals = [(0, 'work', 'default'), (0.1, 'work', 'low'), (0.2, 'work', 'high')]
+
+    report = simulate(arrivals, work=1.0)
+
+    # The first job runs at once; the high one overtakes the low one
+    assert report['queue_wait_by_queue']['high']['max'] == pytest.approx(0.8)
+    assert report['queue_wait_by_queue']['low']['max'] == pytest.approx(1.9)
+
+
+def test_batch_tasks_take_several_jobs_per_call():
+    registry = TaskRegistry()
+    registry.register('bulk', batch_size=3)(lambda batch: batch)
+
+    report = simulate([(0, 'bulk', 'default')] * 4, registry=registry, bulk=1.0)
+
+    # One call for the first job, then one for the other three
+    assert (report['completed'], report['simulated_seconds']) == (4, 2.0)
+
+
+def test_failed_attempts_retry_on_their_own_queue():
+    report = simulate([(0, 'flaky', 'low')], flaky=TaskProfile(durations=[1.0], failure_rate=1.0, max_retries=3))
+
+    assert (report['failed'], report['attempts']) == (1, 3)
+    assert list(report['queue_wait_by_queue']) == ['low']
+
+
+def test_routed_tasks_need_a_worker_for_their_queue():
+    router = TaskRouter(parse_routes('process_image=images'))
+    arrivals = [(0, 'process_image', 'default'), (0, 'send_email', 'default')]
+
+    general = simulate(arrivals, fleet='1', router=router, process_image=1.0, send_email=1.0)
+    dedicated = simulate(arrivals, fleet='1,process_image=1', router=router,
+                         process_image=1.0, send_email=1.0)
+
+    assert (general['completed'], general['unserved']) == (1, 1)
+    assert (dedicated['completed'], dedicated['unserved']) == (2, 0)
+    assert dedicated['simulated_seconds'] == 1.0
+
+
+def test_workload_from_history(db):
+    start = datetime(2026, 3, 1, 10)
+    for seconds, status, retries in ((0, 'completed', 0), (10, 'completed', 1), (20, 'failed', 3)):
+        created = start + timedelta(seconds=seconds)
+        job = Job('send_email', {}, max_retries=3)
+        job.created_at = created.isoformat()
+        db.save_job(job, queue_name='high')
+        job.status, job.retry_count = status, retries
+        job.started_at = created.isoformat()
+        job.completed_at = (created + timedelta(seconds=2)).isoformat()
+        db.save_job(job, queue_name='high')
+
+    workload = Workload.from_history(db, load=2)
+
+    assert workload.arrivals == [(0.0, 'send_email', 'high'), (5.0, 'send_email', 'high'),
+                                 (10.0, 'send_email', 'high')]
+    profile = workload.profiles['send_email']
+    assert profile.durations == [2.0, 2.0, 2.0]
+    # 4 failed attempts out of 4 + 2 completed ones
+    assert profile.failure_rate == pytest.approx(4 / 6)
+    with pytest.raises(ValueError):
+        Workload.from_history(db, start=start + timedelta(days=1))
+
+
+def test_profiles_skip_unfinished_jobs():
+    rows = [{'task_name': 't', 'status': 'pending', 'execution_time': None, 'retry_count': 0, 'max_retries': 3}]
+
+    assert profiles_from_history(rows) == {}
+
+
+def test_synthetic_workload_is_reproducible():
+    first = Workload.synthetic({'send_email': 2.0}, duration=100, seed=7)
+    second = Workload.synthetic({'send_email': 2.0}, duration=100, seed=7)
+
+    assert first.arrivals == second.arrivals
+    assert 150 < len(first.arrivals) < 250
+    assert all(at < 100 for at, _, _ in first.arrivals)
@@ -0,0 +1,97 @@
+"""Redis Streams backend: consumer groups, acks and redelivery"""
+
+import time
+
+import pytest
+
+from workers.job import Job
+
+STREAM = 'queue:default'
+
+
+@pytest.fixture
+def streams(fake_redis):
+    from workers.backends.streams_backend import StreamsBackend
+
+    def consumer(name, claim_idle_ms=60000):
+        return StreamsBackend(consumer=name, claim_idle_ms=claim_idle_ms)
+    return consumer
+
+
+def enqueue(backend):
+    job = Job('clean_logs', {})
+    backend.enqueue(job.id, job.to_json(), STREAM)
+    return job
+
+
+def test_each_entry_goes_to_one_consumer(streams):
+    a, b = streams('a'), streams('b')
+    jobs = [enqueue(a) for _ in range(4)]
+
+    got_a = a.dequeue_batch([STREAM], 2)
+    got_b = b.dequeue_batch([STREAM], 10)
+
+    assert len(got_a) == 2 and len(got_b) == 2
+    assert a.queue_size(STREAM) == 0
+    assert a.pending_summary([STREAM]) == {STREAM: {'a': 2, 'b': 2}}
+    assert {Job.from_json(p).id for _, p in got_a + got_b} == {job.id for job in jobs}
+
+
+def test_ack_removes_the_entry(streams):
+    backend = streams('a')
+    job = enqueue(backend)
+    backend.dequeue([STREAM])
+
+    backend.ack(job.id)
+
+    assert backend.redis_client.xlen(STREAM) == 0
+    assert backend.pending_summary([STREAM]) == {}
+
+
+def test_idle_entries_of_a_dead_consumer_are_reclaimed(streams):
+    dead, alive = streams('dead'), streams('alive', claim_idle_ms=10)
+    job = enqueue(dead)
+    dead.dequeue([STREAM])
+    time.sleep(0.05)
+
+    queue_key, job_json = alive.dequeue([STREAM])
+
+    assert Job.from_json(job_json).id == job.id
+    assert alive.pending_summary([STREAM]) == {STREAM: {'alive': 1}}
+
+
+def test_live_slow_consumer_keeps_its_entry(streams):
+    slow, other = streams('slow', claim_idle_ms=10), streams('other', claim_idle_ms=10)
+    job = enqueue(slow)
+    slow.dequeue([STREAM])
+    slow.heartbeat('slow', '{}', 60)
+    time.sleep(0.05)
+
+    assert other.dequeue([STREAM]) is None
+    assert slow.dequeue([STREAM]) is None
+    assert other.pending_summary([STREAM]) == {STREAM: {'slow': 1}}
+
+    slow.ack(job.id)
+    assert other.pending_summary([STREAM]) == {}
+
+
+def test_release_consumer_hands_back_its_job_ids(streams):
+    dead, reaper = streams('dead'), streams('reaper')
+    jobs = [enqueue(dead) for _ in range(3)]
+    dead.dequeue_batch([STREAM], 3)
+
+    released = reaper.release_consumer('dead', [STREAM])
+
+    assert sorted(released) == sorted(job.id for job in jobs)
+    assert reaper.redis_client.xlen(STREAM) == 0
+
+
+def test_requeue_swaps_the_delivery_for_a_new_entry(streams):
+    backend = streams('a')
+    job = enqueue(backend)
+    backend.dequeue([STREAM])
+
+    backend.requeue([(job.id, job.to_json(), STREAM)])
+
+    assert backend.pending_summary([STREAM]) == {}
+    assert backend.queue_size(STREAM) == 1
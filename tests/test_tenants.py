@@ -0,0 +1,73 @@
+"""Fair scheduling across tenants within a queue"""
+
+import pytest
+
+from config import Config
+from workers.job import Job
+
+# Streams stay FIFO per stream; the sharded backend is fair per shard
+FAIR_BACKENDS = ['memory', 'redis']
+
+
+@pytest.fixture(params=FAIR_BACKENDS)
+def make_fair(request, make_queue_manager, monkeypatch):
+    def make(weights=''):
+        monkeypatch.setattr(Config, 'TENANT_WEIGHTS', weights)
+        return make_queue_manager(request.param)
+    return make
+
+
+def submit(queue_manager, tenant, count):
+    for _ in range(count):
+        queue_manager.add_job(Job('clean_logs', {}, tenant=tenant))
+
+
+def served(queue_manager, count):
+    return [queue_manager.get_next_job('default').tenant for _ in range(count)]
+
+
+def test_a_burst_does_not_starve_other_tenants(make_fair):
+    queue_manager = make_fair()
+    submit(queue_manager, 'burst', 10)
+    submit(queue_manager, 'small', 2)
+
+    assert served(queue_manager, 5) == ['burst', 'small', 'burst', 'small', 'burst']
+
+
+def test_weights_set_each_tenant_share(make_fair):
+    queue_manager = make_fair('search=3')
+    submit(queue_manager, 'search', 6)
+    submit(queue_manager, 'billing', 6)
+
+    assert served(queue_manager, 8) == ['search'] * 3 + ['billing'] + ['search'] * 3 + ['billing']
+
+
+def test_jobs_without_a_tenant_take_turns(make_fair):
+    queue_manager = make_fair()
+    submit(queue_manager, None, 3)
+    submit(queue_manager, 'team', 3)
+
+    assert sorted(served(queue_manager, 2), key=str) == [None, 'team']
+
+
+def test_batch_dequeue_is_fair_too(make_fair):
+    queue_manager = make_fair()
+    submit(queue_manager, 'burst', 10)
+    submit(queue_manager, 'small', 2)
+
+    batch = queue_manager.get_next_jobs_from_queues(['default'], 4)
+
+    assert [job.tenant for job in batch] == ['burst', 'small', 'burst', 'small']
+
+
+@pytest.mark.parametrize('backend', FAIR_BACKENDS + ['redis-sharded'])
+def test_backlog_per_tenant(make_queue_manager, backend):
+    queue_manager = make_queue_manager(backend)
+    submit(queue_manager, 'a', 3)
+    submit(queue_manager, 'b', 1)
+    submit(queue_manager, None, 1)
+
+    backlog = queue_manager.get_tenant_backlog()
+
+    assert backlog['default'] == {'a': 3, 'b': 1, '': 1}
+    assert queue_manager.get_queue_size('default') == 5
@@ -0,0 +1,135 @@
+"""Job tracing: span propagation, exporters and the job timeline"""
+
+import json
+
+import pytest
+
+from workers import tracing
+from workers.job import Job
+from workers.task_registry import task_registry
+from workers.tracing import DatabaseExporter, FileExporter, Tracer
+
+UPSTREAM = '00-4bf92f3577b34da6a3ce929d0e0e4736-00f067aa0ba902b7-01'
+
+
+class Collector:
+    def __init__(self):
+        self.spans = []
+
+    def export(self, spans):
+        self.spans.extend(spans)
+
+
+@pytest.fixture
+def collector():
+    return Collector()
+
+
+@pytest.fixture
+def traced(make_queue_manager, collector):
+    return make_queue_manager(tracer=Tracer(service='test', exporters=[collector], flush_interval=0.01))
+
+
+def test_parse_traceparent():
+    assert tracing.parse_traceparent(UPSTREAM) == {
+        'trace_id': '4bf92f3577b34da6a3ce929d0e0e4736', 'span_id': '00f067aa0ba902b7'
+    }
+    for header in (None, '', 'garbage', '00-' + '0' * 32 + '-00f067aa0ba902b7-01',
+                   '00-4bf92f3577b34da6a3ce929d0e0e4736-nothexnothexnoth-01'):
+        assert tracing.parse_traceparent(header) is None
+
+
+def test_every_step_of_a_job_joins_one_trace(traced, make_worker, collector, monkeypatch):
+    monkeypatch.setitem(task_registry.tasks, 'test_traced', lambda data: {'success': True})
+    job = Job('test_traced', {})
+    traced.add_job(job)
+    worker = make_worker(traced)
+
+    worker.process_job(worker.get_next_job())
+    traced.tracer.flush()
+
+    names = [span.name for span in collector.spans]
+    for name in ('enqueue', 'queue_wait', 'dequeue', 'execute', 'persist'):
+        assert name in names
+    assert {span.trace_id for span in collector.spans} == {job.trace['trace_id']}
+    assert {span.job_id for span in collector.spans} == {job.id}
+
+
+def test_failing_block_marks_its_span(traced, collector):
+    with pytest.raises(ValueError):
+        with traced.tracer.span('execute', Job('clean_logs', {})):
+            raise ValueError('boom')
+    traced.tracer.flush()
+
+    [span] = collector.spans
+    assert span.error == 'ValueError: boom'
+
+
+def test_disabled_tracer_records_nothing(make_queue_manager):
+    queue_manager = make_queue_manager(tracer=Tracer(exporters=[]))
+    job = Job('clean_logs', {})
+
+    queue_manager.add_job(job)
+
+    assert job.trace is None
+    assert queue_manager.tracer._thread is None
+
+
+def test_api_continues_an_upstream_trace(api, collector, monkeypatch):
+    from api import app as app_module
+    tracer = Tracer(service='api', exporters=[collector], flush_interval=0.01)
+    monkeypatch.setattr(app_module.queue_manager, 'tracer', tracer)
+
+    response = api.post('/api/jobs', json={'task_name': 'clean_logs', 'task_data': {}},
+                        headers={'traceparent': UPSTREAM})
+    tracer.flush()
+
+    job_id = response.get_json()['job_id']
+    root = next(span for span in collector.spans if span.name == 'create_job')
+    assert (root.trace_id, root.parent_id, root.job_id) == (
+        '4bf92f3577b34da6a3ce929d0e0e4736', '00f067aa0ba902b7', job_id
+    )
+    enqueue = next(span for span in collector.spans if span.name == 'enqueue')
+    assert enqueue.parent_id == root.span_id
+
+
+def test_job_timeline_comes_from_the_database_exporter(api, db, monkeypatch):
+    from api import app as app_module
+    tracer = Tracer(exporters=[DatabaseExporter(db)], flush_interval=0.01)
+    monkeypatch.setattr(app_module.queue_manager, 'tracer', tracer)
+
+    job_id = api.post('/api/jobs', json={'task_name': 'clean_logs', 'task_data': {}}).get_json()['job_id']
+    tracer.flush()
+
+    timeline = api.get(f'/api/jobs/{job_id}').get_json()['timeline']
+    assert [span['name'] for span in timeline][0] == 'create_job'
+    assert timeline[0]['offset_ms'] == 0
+    assert {'enqueue', 'persist'} <= {span['name'] for span in timeline}
+
+
+def test_file_exporter_writes_otlp_json(tmp_path):
+    path = tmp_path / 'traces.jsonl'
+    tracer = Tracer(service='worker-1', exporters=[FileExporter(str(path))], flush_interval=0.01)
+    job = Job('clean_logs', {})
+    with pytest.raises(RuntimeError):
+        with tracer.span('execute', job, attempt=1):
+            raise RuntimeError('failed')
+    tracer.flush()
+
+    [request] = [json.loads(line) for line in path.read_text().splitlines()]
+    [resource] = request['resourceSpans']
+    [span] = resource['scopeSpans'][0]['spans']
+    assert resource['resource']['attributes'][0]['value'] == {'stringValue': 'worker-1'}
+    assert span['traceId'] == job.trace['trace_id']
+    assert span['status'] == {'code': 2, 'message': 'RuntimeError: failed'}
+    assert {'key': 'attempt', 'value': {'intValue': '1'}} in span['attributes']
+    assert {'key': 'job.id', 'value': {'stringValue': job.id}} in span['attributes']
+
+
+def test_load_exporters():
+    exporters = tracing.load_exporters('database, file, tests.test_tracing:Collector')
+
+    assert [type(e).__name__ for e in exporters] == ['DatabaseExporter', 'FileExporter', 'Collector']
+    assert tracing.load_exporters('none') == []
+    with pytest.raises(ValueError):
+        tracing.load_exporters('zipkin')
@@ -0,0 +1,51 @@
+"""
+Admission control - limits checked before a submission is queued
+"""
+
+from config import Config
+
+class AdmissionRejected(Exception):
+    """Submission refused; the client should retry after `retry_after` seconds"""
+    def __init__(self, reason, retry_after):
+        super().__init__(f"Job rejected ({reason}), retry after {retry_after}s")
+        self.reason = reason
+        self.retry_after = retry_after
+
+def parse_limits(value):
+    """'high=1000,low=500' -> {'high': 1000, 'low': 500}"""
+    limits = {}
+    for item in (value or '').split(','):
+        if '=' in item:
+            name, limit = item.split('=', 1)
+            limits[name.strip()] = int(limit)
+    return limits
+
+class AdmissionPolicy:
+    def __init__(self, queue_depths=None, task_depths=None, rate=None, burst=None,
+                 shed_depth=None, shed_queues=None, retry_after=None):
+        self.queue_depths = parse_limits(Config.MAX_QUEUE_DEPTH) if queue_depths is None else queue_depths
+        self.task_depths = parse_limits(Config.MAX_TASK_DEPTH) if task_depths is None else task_depths
+        self.rate = Config.SUBMIT_RATE_LIMIT if rate is None else rate
+        self.burst = max(burst or Config.SUBMIT_BURST or self.rate, 1)
+        self.shed_depth = Config.SHED_TOTAL_DEPTH if shed_depth is None else shed_depth
+        self.shed_queues = (
+            [q.strip() for q in Config.SHED_QUEUES.split(',') if q.strip()]
+            if shed_queues is None else shed_queues
+        )
+        self.retry_after = Config.ADMISSION_RETRY_AFTER if retry_after is None else retry_after
+
+    @property
+    def enabled(self):
+        return bool(self.queue_depths or self.task_depths or self.rate or self.shed_depth)
+
+    def limits_for(self, queue_name, task_name):
+        """Arguments for QueueBackend.admit() - 0 means no limit"""
+        return {
+            'max_queue_depth': self.queue_depths.get(queue_name, 0),
+            'max_task_depth': self.task_depths.get(task_name, 0),
+            'rate': self.rate or 0,
+            'burst': self.burst or 0,
+            'shed_depth': self.shed_depth or 0,
+            'sheddable': queue_name in self.shed_queues,
+            'retry_after': self.retry_after
+        }
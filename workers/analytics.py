@@ -0,0 +1,302 @@
+"""
+NumPy statistics for analyze_data
+
+A dataset given inline is summarized exactly. A dataset read from a
+file or blob streams through an Aggregate chunk by chunk, and a huge
+one can be split across partial jobs whose Aggregates a reducer job
+merges. Count, mean, std_dev, min and max stay exact either way;
+median, percentiles and the histogram then come from a log-bucket
+sketch (database.sketch), within RELATIVE_ACCURACY of the true value.
+"""
+
+import mmap
+import os
+import numpy as np
+from config import Config
+from database import sketch
+from workers import blobs
+
+ANALYSES = ['mean', 'median', 'std_dev', 'min', 'max', 'percentiles', 'histogram']
+DEFAULT_PERCENTILES = [25, 50, 75, 90, 95, 99]
+DEFAULT_BINS = 10
+
+# Bytes of text (or of array data) read per chunk when streaming
+CHUNK_BYTES = 1 << 20
+
+# Magnitudes below this share the sketch's zero bucket
+ZERO = 1e-9
+
+_LOG_GAMMA = np.log(sketch.GAMMA)
+_SEPARATORS = b' \t\r\n,[]'
+_TO_SPACES = bytes.maketrans(b'\t\r\n,[]', b'      ')
+
+def summarize(values, analyses, percentiles=None, bins=DEFAULT_BINS):
+    """Exact statistics of an in-memory dataset"""
+    values = np.asarray(values, dtype=np.float64).ravel()
+    if not values.size:
+        raise ValueError("Dataset is empty")
+
+    results = {}
+    if 'mean' in analyses:
+        results['mean'] = float(values.mean())
+    if 'median' in analyses:
+        results['median'] = float(np.median(values))
+    if 'std_dev' in analyses:
+        results['std_dev'] = float(values.std())
+    if 'min' in analyses:
+        results['min'] = float(values.min())
+    if 'max' in analyses:
+        results['max'] = float(values.max())
+    if 'percentiles' in analyses:
+        percentiles = percentiles or DEFAULT_PERCENTILES
+        results['percentiles'] = _percentile_dict(percentiles, np.percentile(values, percentiles))
+    if 'histogram' in analyses:
+        counts, edges = np.histogram(values, bins=bins)
+        results['histogram'] = {'counts': counts.tolist(), 'edges': edges.tolist()}
+    return results
+
+class Aggregate:
+    """Mergeable summary of a stream of values
+
+    Partial results combine with merge() in any order, so chunks of a
+    file or the partial jobs of a map-reduce can be summarized apart.
+    """
+    def __init__(self):
+        self.count = 0
+        self.mean = 0.0
+        self.m2 = 0.0  # sum of squared deviations from the mean
+        self.min = float('inf')
+        self.max = float('-inf')
+        # Sketch bin counts of positive values and of |negative values|
+        self.positive = {}
+        self.negative = {}
+        self.zeros = 0
+
+    def add(self, values):
+        """Fold a chunk of values in"""
+        values = np.asarray(values, dtype=np.float64).ravel()
+        if not values.size:
+            return
+        mean = values.mean()
+        self._combine(values.size, float(mean), float(((values - mean) ** 2).sum()),
+                      float(values.min()), float(values.max()))
+
+        magnitudes = np.abs(values)
+        self.zeros += int((magnitudes < ZERO).sum())
+        for counts, mask in ((self.positive, values >= ZERO), (self.negative, values <= -ZERO)):
+            indexes = np.ceil(np.log(magnitudes[mask]) / _LOG_GAMMA).astype(np.int64)
+            for index, n in zip(*(a.tolist() for a in np.unique(indexes, return_counts=True))):
+                counts[index] = counts.get(index, 0) + n
+
+    def merge(self, other):
+        """Fold another Aggregate in"""
+        if not other.count:
+            return
+        self._combine(other.count, other.mean, other.m2, other.min, other.max)
+        for counts, other_counts in ((self.positive, other.positive), (self.negative, other.negative)):
+            for index, n in other_counts.items():
+                counts[index] = counts.get(index, 0) + n
+        self.zeros += other.zeros
+
+    def _combine(self, count, mean, m2, low, high):
+        # Parallel variance (Chan et al.): exact, and stable for large counts
+        total = self.count + count
+        delta = mean - self.mean
+        self.m2 += m2 + delta * delta * self.count * count / total
+        self.mean += delta * count / total
+        self.count = total
+        self.min = min(self.min, low)
+        self.max = max(self.max, high)
+
+    def _distribution(self):
+        """Sketch buckets as ascending (values, counts) arrays"""
+        negative = sorted(self.negative.items(), reverse=True)
+        positive = sorted(self.positive.items())
+        indexes = np.array([i for i, _ in negative] + [i for i, _ in positive], dtype=np.float64)
+        values = sketch.bin_value(indexes)
+        values[:len(negative)] *= -1
+        counts = [n for _, n in negative] + [n for _, n in positive]
+        if self.zeros:
+            values = np.insert(values, len(negative), 0.0)
+            counts.insert(len(negative), self.zeros)
+        # A bucket's representative value can fall just outside the data
+        return np.clip(values, self.min, self.max), np.array(counts, dtype=np.int64)
+
+    def quantiles(self, qs):
+        """Approximate quantiles (0-1) of everything added"""
+        values, counts = self._distribution()
+        ranks = np.asarray(qs, dtype=np.float64) * (self.count - 1)
+        positions = np.searchsorted(np.cumsum(counts), ranks, side='right')
+        return values[np.minimum(positions, len(values) - 1)].tolist()
+
+    def histogram(self, bins):
+        values, counts = self._distribution()
+        counts, edges = np.histogram(values, bins=bins, range=(self.min, self.max), weights=counts)
+        return counts.astype(np.int64), edges
+
+    def summary(self, analyses, percentiles=None, bins=DEFAULT_BINS):
+        """Same keys as summarize()"""
+        if not self.count:
+            raise ValueError("Dataset is empty")
+
+        results = {}
+        if 'mean' in analyses:
+            results['mean'] = self.mean
+        if 'median' in analyses:
+            results['median'] = self.quantiles([0.5])[0]
+        if 'std_dev' in analyses:
+            results['std_dev'] = float(np.sqrt(self.m2 / self.count))
+        if 'min' in analyses:
+            results['min'] = self.min
+        if 'max' in analyses:
+            results['max'] = self.max
+        if 'percentiles' in analyses:
+            percentiles = percentiles or DEFAULT_PERCENTILES
+            results['percentiles'] = _percentile_dict(
+                percentiles, self.quantiles([p / 100 for p in percentiles])
+            )
+        if 'histogram' in analyses:
+            counts, edges = self.histogram(bins)
+            results['histogram'] = {'counts': counts.tolist(), 'edges': edges.tolist()}
+        return results
+
+    def to_dict(self):
+        return {
+            'count': self.count,
+            'mean': self.mean,
+            'm2': self.m2,
+            'min': self.min if self.count else None,
+            'max': self.max if self.count else None,
+            # JSON object keys are strings
+            'positive': {str(i): n for i, n in self.positive.items()},
+            'negative': {str(i): n for i, n in self.negative.items()},
+            'zeros': self.zeros
+        }
+
+    @staticmethod
+    def from_dict(data):
+        aggregate = Aggregate()
+        if not data['count']:
+            return aggregate
+        aggregate.count = data['count']
+        aggregate.mean = data['mean']
+        aggregate.m2 = data['m2']
+        aggregate.min = data['min']
+        aggregate.max = data['max']
+        aggregate.positive = {int(i): n for i, n in data['positive'].items()}
+        aggregate.negative = {int(i): n for i, n in data['negative'].items()}
+        aggregate.zeros = data['zeros']
+        return aggregate
+
+def _percentile_dict(percentiles, values):
+    return {f"p{p:g}": float(v) for p, v in zip(percentiles, values)}
+
+# ============================================================
+# Streaming sources
+# ============================================================
+
+def source_path(source):
+    """Absolute path of a DATA_DIR-relative source; refuses paths outside it"""
+    root = os.path.realpath(Config.DATA_DIR)
+    path = os.path.realpath(os.path.join(root, source))
+    if not path.startswith(root + os.sep):
+        raise ValueError(f"Source must be a file under DATA_DIR: {source!r}")
+    return path
+
+def source_length(source):
+    """Size that start/stop offsets of a source index into
+
+    Array elements for a .npy file, bytes for a text file or a blob
+    (a JSON array of numbers).
+    """
+    if blobs.is_ref(source):
+        return source['size']
+    path = source_path(source)
+    if path.endswith('.npy'):
+        return len(np.load(path, mmap_mode='r'))
+    return os.path.getsize(path)
+
+def iter_chunks(source, start=0, stop=None, chunk_bytes=CHUNK_BYTES):
+    """Yield float64 arrays from a source, one bounded chunk at a time
+
+    With start/stop (see source_length), yields only the values that
+    begin in [start, stop): consecutive ranges cover every value once.
+    """
+    if blobs.is_ref(source):
+        with blobs.get_blob_store().open(source) as view:
+            yield from _iter_text(view, start, stop, chunk_bytes)
+        return
+
+    path = source_path(source)
+    if path.endswith('.npy'):
+        array = np.load(path, mmap_mode='r')
+        stop = len(array) if stop is None else min(stop, len(array))
+        step = max(1, chunk_bytes // max(array.itemsize, 1))
+        for offset in range(start, stop, step):
+            yield np.asarray(array[offset:min(offset + step, stop)], dtype=np.float64)
+        return
+
+    with open(path, 'rb') as f:
+        if not os.fstat(f.fileno()).st_size:
+            return
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as view:
+            yield from _iter_text(view, start, stop, chunk_bytes)
+
+def _iter_text(view, start, stop, chunk_bytes):
+    """Numbers separated by whitespace/commas (a JSON array works too)"""
+    size = len(view)
+    stop = size if stop is None else min(stop, size)
+
+    # A number straddling `start` belongs to the previous range, and
+    # one straddling `stop` to this one
+    position = _skip_token(view, start) if start else 0
+    stop = _skip_token(view, stop)
+
+    while position < stop:
+        end = min(position + chunk_bytes, stop)
+        if end < stop:
+            cut = max(view.rfind(bytes([c]), position, end) for c in _SEPARATORS)
+            end = cut if cut > position else _skip_token(view, end)
+        tokens = view[position:end].translate(_TO_SPACES).split()
+        if tokens:
+            yield np.array(tokens, dtype=np.float64)
+        position = end
+
+def _skip_token(view, offset):
+    """Offset moved past the number it falls inside of, if any"""
+    size = len(view)
+    if offset >= size or offset == 0 or view[offset - 1] in _SEPARATORS:
+        return offset
+    while offset < size and view[offset] not in _SEPARATORS:
+        offset += 1
+    return offset
+
+def aggregate_source(source, start=0, stop=None, chunk_bytes=CHUNK_BYTES):
+    aggregate = Aggregate()
+    for chunk in iter_chunks(source, start, stop, chunk_bytes):
+        aggregate.add(chunk)
+    return aggregate
+
+# ============================================================
+# Map-reduce
+# ============================================================
+
+def split_task_data(task_data, partitions):
+    """task_data for each partial job of an analyze_data run
+
+    An inline dataset is sliced; a source is split into start/stop
+    ranges read by each partial job.
+    """
+    partitions = max(1, int(partitions))
+    options = {key: task_data[key] for key in ('chunk_bytes',) if key in task_data}
+
+    if task_data.get('source') is not None:
+        source = task_data['source']
+        bounds = np.linspace(0, source_length(source), partitions + 1).astype(np.int64).tolist()
+        return [
+            dict(options, source=source, start=start, stop=stop)
+            for start, stop in zip(bounds, bounds[1:]) if stop > start
+        ]
+
+    dataset = np.asarray(task_data.get('dataset') or [], dtype=np.float64)
+    return [{'dataset': part.tolist()} for part in np.array_split(dataset, partitions) if part.size]
@@ -0,0 +1,32 @@
+"""
+Queue backends - pick one with Config.QUEUE_BACKEND
+"""
+
+from config import Config
+from workers.backends.base import QueueBackend
+
+def create_backend(name=None, consumer=None):
+    """Build the configured backend (imports only what it needs)
+
+    `consumer` names this process for backends that track in-flight
+    jobs per consumer (redis-streams)
+    """
+    name = name or Config.QUEUE_BACKEND
+    
+    if name == 'redis':
+        from workers.backends.redis_backend import RedisBackend
+        return RedisBackend()
+    if name == 'redis-streams':
+        from workers.backends.streams_backend import StreamsBackend
+        return StreamsBackend(consumer=consumer)
+    if name == 'redis-sharded':
+        from workers.backends.sharded_backend import ShardedRedisBackend
+        return ShardedRedisBackend()
+    if name == 'sqlite':
+        from workers.backends.sqlite_backend import SQLiteBackend
+        return SQLiteBackend(Config.SQLITE_QUEUE_PATH)
+    if name == 'memory':
+        from workers.backends.sqlite_backend import MemoryBackend
+        return MemoryBackend()
+    
+    raise ValueError(f"Unknown queue backend: {name}")
@@ -0,0 +1,214 @@
+"""
+Queue backend interface
+QueueManager talks to one of these instead of a specific broker
+"""
+
+def tenant_queue_key(queue_key, tenant):
+    """Sub-queue holding one tenant's jobs (no tenant = the queue itself)"""
+    return f"{queue_key}:tenant:{tenant}" if tenant else queue_key
+
+class QueueBackend:
+    """Storage for job payloads and priority queues of job IDs
+
+    Queues are FIFO. dequeue() takes queue keys in priority order and
+    pops from the first one that is not empty. Backends that support
+    tenants split each queue into per-tenant sub-queues (see
+    tenant_queue_key) and serve them weighted round-robin, so one
+    tenant's burst does not hold up the others.
+    """
+
+    name = 'base'
+
+    def enqueue(self, job_id, job_json, queue_key):
+        """Store a job payload and append its ID to a queue"""
+        raise NotImplementedError
+
+    def admit(self, job_id, task_name, queue_key, queue_keys, limits, count=1):
+        """Check admission limits atomically (see AdmissionPolicy.limits_for)
+
+        `count` jobs of task_name are admitted together or not at all.
+        Returns (admitted, reason, retry_after_seconds)
+        """
+        return True, 'ok', 0
+
+    def dequeue(self, queue_keys):
+        """Pop the next job from the first non-empty queue
+
+        Returns (queue_key, job_json) or None when every queue is empty
+        """
+        raise NotImplementedError
+
+    def dequeue_batch(self, queue_keys, count):
+        """Pop up to `count` jobs, highest priority first
+
+        Returns a list of (queue_key, job_json)
+        """
+        batch = []
+        while len(batch) < count:
+            item = self.dequeue(queue_keys)
+            if not item:
+                break
+            batch.append(item)
+        return batch
+
+    def ack(self, job_id):
+        """Mark a dequeued job as done (only needed by acknowledging backends)"""
+        pass
+
+    def pending_summary(self, queue_keys):
+        """Delivered but unacknowledged jobs per queue and consumer"""
+        return {}
+
+    def tenant_backlog(self, queue_keys):
+        """{queue_key: {tenant: waiting jobs}}; '' is jobs without a tenant"""
+        return {}
+
+    def enqueue_many(self, items):
+        """Enqueue [(job_id, job_json, queue_key), ...] in one batch"""
+        for job_id, job_json, queue_key in items:
+            self.enqueue(job_id, job_json, queue_key)
+
+    def requeue(self, items):
+        """Put dequeued jobs back, [(job_id, job_json, queue_key), ...]
+
+        Backends do this atomically where they can, so a crash leaves each
+        job either still delivered to this worker or queued again, not both
+        """
+        self.enqueue_many(items)
+        for job_id, _, _ in items:
+            self.ack(job_id)
+
+    def get_job(self, job_id):
+        """Return the stored job JSON or None"""
+        raise NotImplementedError
+
+    def get_jobs(self, job_ids):
+        """Job JSON (or None) for each id, in order"""
+        return [self.get_job(job_id) for job_id in job_ids]
+
+    def find_jobs(self, status=None, task_name=None, offset=0, limit=50):
+        """Most recently changed jobs matching status and/or task
+
+        Returns ([(score, job_json), ...], total matches). Scores are ms
+        timestamps, so results from several backends can be merged.
+        """
+        raise NotImplementedError
+
+    def iter_jobs(self, batch_size=1000):
+        """Yield every stored job JSON, fetched in batches"""
+        for job_json in self.get_jobs(self.job_ids()):
+            if job_json:
+                yield job_json
+
+    def queued_job_ids(self, queue_keys, batch_size=1000):
+        """Yield (queue_key, job_id) for every entry the queues still hold
+
+        Read in batches of batch_size; entries delivered but not yet
+        acknowledged are included where the backend still keeps them.
+        """
+        raise NotImplementedError
+
+    def delete_jobs(self, job_ids):
+        """Drop stored payloads (queue entries left behind are skipped)"""
+        raise NotImplementedError
+
+    def save_job(self, job_id, job_json):
+        """Overwrite the stored job JSON"""
+        raise NotImplementedError
+
+    def save_jobs(self, items):
+        """Overwrite [(job_id, job_json), ...] in one batch"""
+        for job_id, job_json in items:
+            self.save_job(job_id, job_json)
+
+    def request_cancel(self, job_id):
+        """Flag a job as cancelled so a worker running it stops"""
+        raise NotImplementedError
+
+    def is_cancel_requested(self, job_id):
+        """True if request_cancel() was called for this job"""
+        raise NotImplementedError
+
+    def publish_update(self, job_id, status):
+        """Announce a job status change to listeners in other processes"""
+        raise NotImplementedError
+
+    def publish_updates(self, updates):
+        """publish_update() for [(job_id, status), ...] in one batch"""
+        for job_id, status in updates:
+            self.publish_update(job_id, status)
+
+    def listen_updates(self):
+        """Blocking generator of (job_id, status) for every published update"""
+        raise NotImplementedError
+
+    def heartbeat(self, worker_id, info_json, ttl):
+        """Record a worker's latest state; it counts as alive for `ttl` seconds"""
+        raise NotImplementedError
+
+    def list_workers(self):
+        """[(worker_id, info_json, alive), ...] for every registered worker"""
+        return []
+
+    def forget_worker(self, worker_id):
+        """Drop a worker from the registry; True only for the caller that removed it"""
+        return False
+
+    def release_consumer(self, worker_id, queue_keys):
+        """Take back jobs delivered to a worker but not acknowledged
+
+        Returns their job ids (only acknowledging backends track this)
+        """
+        return []
+
+    def barrier_create(self, barrier_id, job_ids):
+        """Start a barrier that opens once every one of job_ids is released"""
+        raise NotImplementedError
+
+    def barrier_release(self, barrier_id, job_id):
+        """Release one job of a barrier
+
+        Returns True for exactly one call: the one releasing the last job.
+        Releasing a job twice, or after barrier_delete, returns False.
+        """
+        raise NotImplementedError
+
+    def barrier_delete(self, barrier_id):
+        """Drop a barrier without opening it"""
+        raise NotImplementedError
+
+    def dlq_add(self, job_id, task_name, failed_at, entry_json):
+        """Record a permanently failed job in the dead-letter queue
+
+        failed_at is a Unix timestamp; entry_json describes the failure
+        """
+        raise NotImplementedError
+
+    def dlq_range(self, task_name=None, min_time=None, max_time=None,
+                  offset=0, count=100, newest_first=False):
+        """Dead-letter entry JSONs ordered by failure time"""
+        raise NotImplementedError
+
+    def dlq_remove(self, entries):
+        """Remove [(job_id, task_name), ...] from the dead-letter queue"""
+        raise NotImplementedError
+
+    def dlq_counts(self):
+        """{task_name: dead-lettered jobs}"""
+        raise NotImplementedError
+
+    def queue_size(self, queue_key):
+        """Number of job IDs waiting in a queue"""
+        raise NotImplementedError
+
+    def job_ids(self):
+        """IDs of all stored jobs"""
+        raise NotImplementedError
+
+    def clear_queue(self, queue_key):
+        """Remove every job ID from a queue"""
+        raise NotImplementedError
+
+    def clear_all(self, queue_keys):
+        """Remove the given queues and all stored jobs"""
+        raise NotImplementedError
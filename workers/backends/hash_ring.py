@@ -0,0 +1,43 @@
+"""
+Consistent hash ring - maps keys to nodes so adding a node only moves
+about 1/N of the keys
+"""
+
+import bisect
+import hashlib
+
+class HashRing:
+    def __init__(self, nodes=None, replicas=100):
+        self.replicas = replicas
+        self._points = []   # sorted hash positions
+        self._owners = {}   # hash position -> node
+        for node in nodes or []:
+            self.add_node(node)
+
+    @staticmethod
+    def _hash(value):
+        return int(hashlib.md5(value.encode('utf-8')).hexdigest()[:16], 16)
+
+    @property
+    def nodes(self):
+        return sorted(set(self._owners.values()))
+
+    def add_node(self, node):
+        for i in range(self.replicas):
+            point = self._hash(f"{node}#{i}")
+            if point not in self._owners:
+                bisect.insort(self._points, point)
+            self._owners[point] = node
+
+    def remove_node(self, node):
+        for i in range(self.replicas):
+            point = self._hash(f"{node}#{i}")
+            if self._owners.get(point) == node:
+                del self._owners[point]
+                self._points.remove(point)
+
+    def get_node(self, key):
+        if not self._points:
+            raise ValueError("Hash ring has no nodes")
+        index = bisect.bisect(self._points, self._hash(key)) % len(self._points)
+        return self._owners[self._points[index]]
@@ -0,0 +1,294 @@
+"""
+Lua scripts executed server-side by Redis
+Each script replaces several client round trips with one atomic call
+"""
+
+# Shared by every script that writes a job payload. Keeps the secondary
+# indexes in step with the payload (all sorted sets, scored in ms):
+#   <prefix>all, <prefix>task:<task>         - by first write
+#   <prefix>status:<status>,
+#   <prefix>task_status:<task>:<status>      - by last status change
+# and a hash of job id -> current status so the old entry can be removed.
+INDEX_FUNCTIONS = """
+local function now_ms()
+    local t = redis.call('TIME')
+    return tonumber(t[1]) * 1000 + math.floor(tonumber(t[2]) / 1000)
+end
+
+local function index_job(prefix, status_hash, job_id, job_json)
+    local job = cjson.decode(job_json)
+    local status = job['status']
+    local task = job['task_name']
+    local old = redis.call('HGET', status_hash, job_id)
+    if old == status then
+        return job
+    end
+    local now = now_ms()
+    if old then
+        redis.call('ZREM', prefix .. 'status:' .. old, job_id)
+        redis.call('ZREM', prefix .. 'task_status:' .. task .. ':' .. old, job_id)
+    else
+        redis.call('ZADD', prefix .. 'all', now, job_id)
+        redis.call('ZADD', prefix .. 'task:' .. task, now, job_id)
+    end
+    redis.call('ZADD', prefix .. 'status:' .. status, now, job_id)
+    redis.call('ZADD', prefix .. 'task_status:' .. task .. ':' .. status, now, job_id)
+    redis.call('HSET', status_hash, job_id, status)
+    return job
+end
+"""
+
+# Fair scheduling within a queue. Each tenant's jobs wait in their own
+# list, <queue>:tenant:<tenant> (jobs without a tenant use <queue>
+# itself). Tenants with work are kept in a ring, <queue>:tenants, and
+# <queue>:credits holds how many more jobs the tenant at the head may
+# take before it goes to the back (0 = start a fresh turn).
+TENANT_FUNCTIONS = """
+local function tenant_of(job)
+    local tenant = job['tenant']
+    if type(tenant) ~= 'string' then
+        return ''
+    end
+    return tenant
+end
+
+local function tenant_queue(queue, tenant)
+    if tenant == '' then
+        return queue
+    end
+    return queue .. ':tenant:' .. tenant
+end
+
+local function push_fair(queue, tenant, job_id)
+    redis.call('RPUSH', tenant_queue(queue, tenant), job_id)
+    if redis.call('HSETNX', queue .. ':credits', tenant, 0) == 1 then
+        redis.call('RPUSH', queue .. ':tenants', tenant)
+    end
+end
+"""
+
+# KEYS[1] = jobs hash, KEYS[2] = queue list, KEYS[3] = per-task depth hash,
+# KEYS[4] = job status hash
+# ARGV[1] = job id, ARGV[2] = job JSON, ARGV[3] = index key prefix
+ENQUEUE_JOB = INDEX_FUNCTIONS + TENANT_FUNCTIONS + """
+redis.call('HSET', KEYS[1], ARGV[1], ARGV[2])
+local job = index_job(ARGV[3], KEYS[4], ARGV[1], ARGV[2])
+redis.call('HINCRBY', KEYS[3], job['task_name'], 1)
+push_fair(KEYS[2], tenant_of(job), ARGV[1])
+return 1
+"""
+
+# KEYS[1] = jobs hash, KEYS[2] = job status hash
+# ARGV[1] = job id, ARGV[2] = job JSON, ARGV[3] = index key prefix
+SAVE_JOB = INDEX_FUNCTIONS + """
+redis.call('HSET', KEYS[1], ARGV[1], ARGV[2])
+index_job(ARGV[3], KEYS[2], ARGV[1], ARGV[2])
+return 1
+"""
+
+# KEYS[1] = jobs hash, KEYS[2] = job status hash
+# ARGV[1] = index key prefix, ARGV[2..n] = job ids
+DELETE_JOBS = """
+local prefix = ARGV[1]
+for i = 2, #ARGV do
+    local job_id = ARGV[i]
+    local job_json = redis.call('HGET', KEYS[1], job_id)
+    local status = redis.call('HGET', KEYS[2], job_id)
+    if job_json then
+        local task = cjson.decode(job_json)['task_name']
+        redis.call('ZREM', prefix .. 'all', job_id)
+        redis.call('ZREM', prefix .. 'task:' .. task, job_id)
+        if status then
+            redis.call('ZREM', prefix .. 'status:' .. status, job_id)
+            redis.call('ZREM', prefix .. 'task_status:' .. task .. ':' .. status, job_id)
+        end
+    end
+    redis.call('HDEL', KEYS[1], job_id)
+    redis.call('HDEL', KEYS[2], job_id)
+end
+return #ARGV - 1
+"""
+
+# KEYS[1] = jobs hash, KEYS[2] = per-task depth hash,
+# KEYS[3..n] = queue lists in priority order
+# ARGV[1] = JSON {tenant: weight}, ARGV[2] = weight of unlisted tenants,
+# ARGV[3] = max jobs to pop
+# Within a queue, the tenant at the head of the ring takes up to its
+# weight in jobs, then moves to the back (weighted round-robin, O(1)).
+# Returns {queue_key, job_json, queue_key, job_json, ...}, empty when idle
+DEQUEUE_JOB = TENANT_FUNCTIONS + """
+local weights = cjson.decode(ARGV[1])
+local default_weight = tonumber(ARGV[2])
+
+local function pop_payload(queue)
+    local job_id = redis.call('LPOP', queue)
+    while job_id do
+        local job_json = redis.call('HGET', KEYS[1], job_id)
+        if job_json then
+            return job_json
+        end
+        -- Orphaned id without a payload, skip it
+        job_id = redis.call('LPOP', queue)
+    end
+    return nil
+end
+
+local function pop_fair(queue)
+    local ring = queue .. ':tenants'
+    local credits = queue .. ':credits'
+    while true do
+        local tenant = redis.call('LINDEX', ring, 0)
+        if not tenant then
+            -- Ids queued before tenants were tracked
+            return pop_payload(queue)
+        end
+        local sub_queue = tenant_queue(queue, tenant)
+        local job_json = pop_payload(sub_queue)
+        local credit = tonumber(redis.call('HGET', credits, tenant) or '0')
+        if credit <= 0 then
+            credit = tonumber(weights[tenant]) or default_weight
+        end
+        credit = credit - 1
+        if not job_json or redis.call('LLEN', sub_queue) == 0 then
+            -- Nothing left: leave the ring until the tenant's next job
+            redis.call('LPOP', ring)
+            redis.call('HDEL', credits, tenant)
+        elseif credit <= 0 then
+            redis.call('RPUSH', ring, redis.call('LPOP', ring))
+            redis.call('HSET', credits, tenant, 0)
+        else
+            redis.call('HSET', credits, tenant, credit)
+        end
+        if job_json then
+            return job_json
+        end
+    end
+end
+
+local popped = {}
+local i = 3
+while i <= #KEYS and #popped < tonumber(ARGV[3]) * 2 do
+    local job_json = pop_fair(KEYS[i])
+    if job_json then
+        redis.call('HINCRBY', KEYS[2], cjson.decode(job_json)['task_name'], -1)
+        table.insert(popped, KEYS[i])
+        table.insert(popped, job_json)
+    else
+        i = i + 1
+    end
+end
+return popped
+"""
+
+# KEYS[1] = jobs hash, KEYS[2] = queue stream, KEYS[3] = per-task depth hash,
+# KEYS[4] = job status hash
+# ARGV[1] = job id, ARGV[2] = job JSON, ARGV[3] = index key prefix,
+# ARGV[4] = approximate MAXLEN
+ENQUEUE_STREAM_JOB = INDEX_FUNCTIONS + """
+redis.call('HSET', KEYS[1], ARGV[1], ARGV[2])
+local job = index_job(ARGV[3], KEYS[4], ARGV[1], ARGV[2])
+redis.call('HINCRBY', KEYS[3], job['task_name'], 1)
+return redis.call('XADD', KEYS[2], 'MAXLEN', '~', ARGV[4], '*', 'job_id', ARGV[1])
+"""
+
+# Admission control for one submission, checked atomically
+# KEYS[1] = per-task depth hash, KEYS[2] = rate limiter hash,
+# KEYS[3] = target queue, KEYS[4..n] = every queue (for load shedding)
+# ARGV[1] = task name, ARGV[2] = max queue depth, ARGV[3] = max task depth,
+# ARGV[4] = rate (jobs/s), ARGV[5] = burst, ARGV[6] = shed depth,
+# ARGV[7] = 1 if the target queue may be shed, ARGV[8] = retry-after (ms),
+# ARGV[9] = number of jobs admitted together (all or none)
+# Returns {1, 'ok', 0} or {0, reason, retry_after_ms}; limits of 0 are off
+ADMIT_JOB = """
+local function depth(key)
+    if redis.call('TYPE', key)['ok'] == 'stream' then
+        return redis.call('XLEN', key)
+    end
+    -- A list queue plus its tenants' sub-queues
+    local total = redis.call('LLEN', key)
+    for _, tenant in ipairs(redis.call('HKEYS', key .. ':credits')) do
+        if tenant ~= '' then
+            total = total + redis.call('LLEN', key .. ':tenant:' .. tenant)
+        end
+    end
+    return total
+end
+
+local max_queue = tonumber(ARGV[2])
+local max_task = tonumber(ARGV[3])
+local rate = tonumber(ARGV[4])
+local burst = tonumber(ARGV[5])
+local shed_depth = tonumber(ARGV[6])
+local retry_after = tonumber(ARGV[8])
+local count = tonumber(ARGV[9] or '1')
+
+if shed_depth > 0 and ARGV[7] == '1' then
+    local total = 0
+    for i = 4, #KEYS do
+        total = total + depth(KEYS[i])
+    end
+    if total + count > shed_depth then
+        return {0, 'shed', retry_after}
+    end
+end
+
+if max_queue > 0 and depth(KEYS[3]) + count > max_queue then
+    return {0, 'queue_full', retry_after}
+end
+
+if max_task > 0 and tonumber(redis.call('HGET', KEYS[1], ARGV[1]) or '0') + count > max_task then
+    return {0, 'task_full', retry_after}
+end
+
+if rate > 0 then
+    local now_parts = redis.call('TIME')
+    local now = tonumber(now_parts[1]) * 1000 + math.floor(tonumber(now_parts[2]) / 1000)
+    local bucket = redis.call('HMGET', KEYS[2], 'tokens', 'ts')
+    local tokens = tonumber(bucket[1]) or burst
+    local last = tonumber(bucket[2]) or now
+    tokens = math.min(burst, tokens + math.max(now - last, 0) * rate / 1000)
+    -- A fan-out larger than the burst waits for a full bucket and
+    -- leaves it in debt, which later submissions wait out
+    local needed = math.min(count, burst)
+    if tokens < needed then
+        return {0, 'rate_limited', math.ceil((needed - tokens) * 1000 / rate)}
+    end
+    tokens = tokens - count
+    redis.call('HSET', KEYS[2], 'tokens', tostring(tokens), 'ts', now)
+    -- Kept until the bucket would be full again
+    redis.call('PEXPIRE', KEYS[2], math.ceil((burst - tokens) * 1000 / rate) + 1000)
+end
+
+return {1, 'ok', 0}
+"""
+
+# KEYS[1] = DLQ entries hash, KEYS[2] = DLQ time index,
+# KEYS[3] = the task's DLQ index, KEYS[4] = per-task DLQ counts hash
+# ARGV[1] = job id, ARGV[2] = failed_at, ARGV[3] = entry JSON, ARGV[4] = task name
+# A job dead-lettered again replaces its entry without being counted twice
+DLQ_ADD = """
+redis.call('ZADD', KEYS[2], ARGV[2], ARGV[1])
+redis.call('ZADD', KEYS[3], ARGV[2], ARGV[1])
+if redis.call('HSET', KEYS[1], ARGV[1], ARGV[3]) == 1 then
+    redis.call('HINCRBY', KEYS[4], ARGV[4], 1)
+end
+return 1
+"""
+
+# KEYS[1] = DLQ entries hash, KEYS[2] = DLQ time index,
+# KEYS[3] = per-task DLQ counts hash
+# ARGV[1] = per-task DLQ index prefix, ARGV[2..n] = job id, task name pairs
+# Only entries that were still there are uncounted
+DLQ_REMOVE = """
+local removed = 0
+for i = 2, #ARGV, 2 do
+    local job_id, task = ARGV[i], ARGV[i + 1]
+    redis.call('ZREM', KEYS[2], job_id)
+    redis.call('ZREM', ARGV[1] .. task, job_id)
+    if redis.call('HDEL', KEYS[1], job_id) == 1 then
+        redis.call('HINCRBY', KEYS[3], task, -1)
+        removed = removed + 1
+    end
+end
+return removed
+"""
@@ -0,0 +1,348 @@
+"""
+Redis queue backend - lists for queues, one hash for job payloads
+"""
+
+import json
+import math
+from config import Config
+from workers.admission import parse_limits
+from workers.backends.base import QueueBackend, tenant_queue_key
+from workers.backends import lua_scripts
+from workers.connections import get_redis_client
+
+class RedisBackend(QueueBackend):
+    name = 'redis'
+
+    def __init__(self, host=None, port=None, db=None, password=None):
+        # Shares one connection pool per Redis server across the process
+        self.redis_client = get_redis_client(
+            host=host or Config.REDIS_HOST,
+            port=port or Config.REDIS_PORT,
+            db=Config.REDIS_DB if db is None else db,
+            password=password or Config.REDIS_PASSWORD
+        )
+        
+        # Job storage (hash map in Redis)
+        self.jobs_key = 'jobs'
+        self.hmget_chunk = 1000
+        self.task_depth_key = 'queue:task_depth'
+        self.rate_limit_key = 'admission:rate'
+        self.cancel_prefix = 'job:cancel:'
+        self.cancel_ttl = 86400
+        self.updates_channel = 'job_updates'
+        
+        # Secondary indexes by status and task (see lua_scripts.INDEX_FUNCTIONS)
+        self.index_prefix = 'idx:'
+        self.status_key = 'jobs:status'
+        
+        # Worker registry: last reported state, plus a key that expires
+        # when heartbeats stop
+        self.workers_key = 'workers:info'
+        self.worker_alive_prefix = 'worker:alive:'
+        
+        # Dead-letter queue: entries hash, time index overall and per task
+        self.dlq_entries_key = 'dlq:entries'
+        self.dlq_index_key = 'dlq:index'
+        self.dlq_task_prefix = 'dlq:task:'
+        self.dlq_counts_key = 'dlq:counts'
+        
+        # Map-reduce barriers: a set of the partial jobs still running
+        self.barrier_prefix = 'barrier:'
+        
+        # Reconciliation pages a copy of each queue list, kept at most an hour
+        self.snapshot_prefix = 'reconcile:snapshot:'
+        self.snapshot_ttl = 3600
+        
+        # Per-tenant weights for fair dequeue (see lua_scripts.TENANT_FUNCTIONS)
+        self.tenant_weights = json.dumps(parse_limits(Config.TENANT_WEIGHTS))
+        self.default_tenant_weight = Config.TENANT_DEFAULT_WEIGHT
+        
+        # Server-side scripts (one round trip per enqueue/dequeue)
+        self._enqueue_script = self.redis_client.register_script(lua_scripts.ENQUEUE_JOB)
+        self._dequeue_script = self.redis_client.register_script(lua_scripts.DEQUEUE_JOB)
+        self._admit_script = self.redis_client.register_script(lua_scripts.ADMIT_JOB)
+        self._save_script = self.redis_client.register_script(lua_scripts.SAVE_JOB)
+        self._delete_script = self.redis_client.register_script(lua_scripts.DELETE_JOBS)
+        self._dlq_add_script = self.redis_client.register_script(lua_scripts.DLQ_ADD)
+        self._dlq_remove_script = self.redis_client.register_script(lua_scripts.DLQ_REMOVE)
+
+    def enqueue(self, job_id, job_json, queue_key):
+        self._enqueue_script(
+            keys=[self.jobs_key, queue_key, self.task_depth_key, self.status_key],
+            args=[job_id, job_json, self.index_prefix]
+        )
+
+    def admit(self, job_id, task_name, queue_key, queue_keys, limits, count=1):
+        admitted, reason, retry_after_ms = self._admit_script(
+            keys=[self.task_depth_key, self.rate_limit_key, queue_key] + list(queue_keys),
+            args=[
+                task_name,
+                limits['max_queue_depth'],
+                limits['max_task_depth'],
+                limits['rate'],
+                limits['burst'],
+                limits['shed_depth'],
+                1 if limits['sheddable'] else 0,
+                int(limits['retry_after'] * 1000),
+                count
+            ]
+        )
+        return bool(admitted), reason, math.ceil(int(retry_after_ms) / 1000)
+
+    def dequeue(self, queue_keys):
+        batch = self.dequeue_batch(queue_keys, 1)
+        return batch[0] if batch else None
+
+    def dequeue_batch(self, queue_keys, count):
+        popped = self._dequeue_script(
+            keys=[self.jobs_key, self.task_depth_key] + list(queue_keys),
+            args=[self.tenant_weights, self.default_tenant_weight, count]
+        )
+        return list(zip(popped[::2], popped[1::2]))
+
+    def enqueue_many(self, items):
+        pipe = self.redis_client.pipeline(transaction=False)
+        for job_id, job_json, queue_key in items:
+            self._enqueue_script(
+                keys=[self.jobs_key, queue_key, self.task_depth_key, self.status_key],
+                args=[job_id, job_json, self.index_prefix],
+                client=pipe
+            )
+        pipe.execute()
+
+    def requeue(self, items):
+        # MULTI/EXEC: all of the jobs go back or none do
+        pipe = self.redis_client.pipeline(transaction=True)
+        for job_id, job_json, queue_key in items:
+            self._enqueue_script(
+                keys=[self.jobs_key, queue_key, self.task_depth_key, self.status_key],
+                args=[job_id, job_json, self.index_prefix],
+                client=pipe
+            )
+        pipe.execute()
+
+    def tenant_backlog(self, queue_keys):
+        pipe = self.redis_client.pipeline(transaction=False)
+        for queue_key in queue_keys:
+            pipe.hkeys(f"{queue_key}:credits")
+        queue_tenants = [
+            (queue_key, [''] + [tenant for tenant in tenants if tenant])
+            for queue_key, tenants in zip(queue_keys, pipe.execute())
+        ]
+        
+        pipe = self.redis_client.pipeline(transaction=False)
+        for queue_key, tenants in queue_tenants:
+            for tenant in tenants:
+                pipe.llen(tenant_queue_key(queue_key, tenant))
+        depths = iter(pipe.execute())
+        
+        backlog = {}
+        for queue_key, tenants in queue_tenants:
+            counts = {tenant: next(depths) for tenant in tenants}
+            backlog[queue_key] = {tenant: n for tenant, n in counts.items() if n}
+        return backlog
+
+    def queue_tenants(self, queue_key):
+        """Tenants with jobs waiting in a queue ('' = jobs without one)"""
+        return [''] + [t for t in self.redis_client.hkeys(f"{queue_key}:credits") if t]
+
+    def join_tenant_ring(self, queue_key, tenant):
+        """Put a tenant in the queue's round-robin ring if it is not there yet"""
+        if self.redis_client.hsetnx(f"{queue_key}:credits", tenant, 0):
+            self.redis_client.rpush(f"{queue_key}:tenants", tenant)
+
+    def _tenant_keys(self, queue_key):
+        """Every key making up one queue: ring, credits and sub-queues"""
+        sub_queues = self.redis_client.scan_iter(match=f"{queue_key}:tenant:*", count=1000)
+        return [queue_key, f"{queue_key}:tenants", f"{queue_key}:credits", *sub_queues]
+
+    def get_job(self, job_id):
+        return self.redis_client.hget(self.jobs_key, job_id)
+
+    def get_jobs(self, job_ids):
+        if not job_ids:
+            return []
+        # Several bounded HMGETs in one round trip: one huge HMGET would
+        # hold up every other client while Redis builds the reply
+        pipe = self.redis_client.pipeline(transaction=False)
+        for start in range(0, len(job_ids), self.hmget_chunk):
+            pipe.hmget(self.jobs_key, job_ids[start:start + self.hmget_chunk])
+        return [payload for chunk in pipe.execute() for payload in chunk]
+
+    def delete_jobs(self, job_ids):
+        if job_ids:
+            self._delete_script(keys=[self.jobs_key, self.status_key], args=[self.index_prefix] + list(job_ids))
+
+    def save_job(self, job_id, job_json):
+        self._save_script(keys=[self.jobs_key, self.status_key], args=[job_id, job_json, self.index_prefix])
+
+    def save_jobs(self, items):
+        pipe = self.redis_client.pipeline(transaction=False)
+        for job_id, job_json in items:
+            self._save_script(
+                keys=[self.jobs_key, self.status_key],
+                args=[job_id, job_json, self.index_prefix],
+                client=pipe
+            )
+        pipe.execute()
+
+    def _index_key(self, status, task_name):
+        if status and task_name:
+            return f"{self.index_prefix}task_status:{task_name}:{status}"
+        if status:
+            return f"{self.index_prefix}status:{status}"
+        if task_name:
+            return f"{self.index_prefix}task:{task_name}"
+        return f"{self.index_prefix}all"
+
+    def find_jobs(self, status=None, task_name=None, offset=0, limit=50):
+        key = self._index_key(status, task_name)
+        pipe = self.redis_client.pipeline(transaction=False)
+        pipe.zrevrange(key, offset, offset + limit - 1, withscores=True)
+        pipe.zcard(key)
+        entries, total = pipe.execute()
+        if not entries:
+            return [], total
+        payloads = self.redis_client.hmget(self.jobs_key, [job_id for job_id, _ in entries])
+        return [(score, p) for (_, score), p in zip(entries, payloads) if p], total
+
+    def iter_jobs(self, batch_size=1000):
+        # HSCAN returns payloads in bounded steps instead of one huge reply
+        for _, job_json in self.redis_client.hscan_iter(self.jobs_key, count=batch_size):
+            yield job_json
+
+    def queued_job_ids(self, queue_keys, batch_size=1000):
+        for queue_key in queue_keys:
+            sub_queues = self.redis_client.scan_iter(match=f"{queue_key}:tenant:*", count=1000)
+            for key in [queue_key, *sub_queues]:
+                # Page a copy: offsets into the live list would skip entries
+                # whenever a worker pops from its head between two pages
+                snapshot = f"{self.snapshot_prefix}{key}"
+                pipe = self.redis_client.pipeline()
+                pipe.copy(key, snapshot, replace=True)
+                pipe.expire(snapshot, self.snapshot_ttl)
+                copied, _ = pipe.execute()
+                if not copied:
+                    continue
+                try:
+                    # LRANGE pages rather than one reply holding the whole list
+                    start = 0
+                    while True:
+                        job_ids = self.redis_client.lrange(snapshot, start, start + batch_size - 1)
+                        for job_id in job_ids:
+                            yield queue_key, job_id
+                        if len(job_ids) < batch_size:
+                            break
+                        start += batch_size
+                finally:
+                    self.redis_client.unlink(snapshot)
+
+    def request_cancel(self, job_id):
+        self.redis_client.set(f"{self.cancel_prefix}{job_id}", 1, ex=self.cancel_ttl)
+
+    def is_cancel_requested(self, job_id):
+        return bool(self.redis_client.exists(f"{self.cancel_prefix}{job_id}"))
+
+    def publish_update(self, job_id, status):
+        message = json.dumps({'job_id': job_id, 'status': status})
+        self.redis_client.publish(self.updates_channel, message)
+
+    def publish_updates(self, updates):
+        pipe = self.redis_client.pipeline(transaction=False)
+        for job_id, status in updates:
+            pipe.publish(self.updates_channel, json.dumps({'job_id': job_id, 'status': status}))
+        pipe.execute()
+
+    def listen_updates(self):
+        pubsub = self.redis_client.pubsub(ignore_subscribe_messages=True)
+        pubsub.subscribe(self.updates_channel)
+        try:
+            for message in pubsub.listen():
+                data = json.loads(message['data'])
+                yield data['job_id'], data['status']
+        finally:
+            pubsub.close()
+
+    def heartbeat(self, worker_id, info_json, ttl):
+        pipe = self.redis_client.pipeline(transaction=False)
+        pipe.hset(self.workers_key, worker_id, info_json)
+        pipe.set(f"{self.worker_alive_prefix}{worker_id}", 1, ex=ttl)
+        pipe.execute()
+
+    def list_workers(self):
+        workers = self.redis_client.hgetall(self.workers_key)
+        pipe = self.redis_client.pipeline(transaction=False)
+        for worker_id in workers:
+            pipe.exists(f"{self.worker_alive_prefix}{worker_id}")
+        alive = pipe.execute()
+        return [(worker_id, info, bool(a)) for (worker_id, info), a in zip(workers.items(), alive)]
+
+    def forget_worker(self, worker_id):
+        pipe = self.redis_client.pipeline(transaction=True)
+        pipe.hdel(self.workers_key, worker_id)
+        pipe.delete(f"{self.worker_alive_prefix}{worker_id}")
+        removed, _ = pipe.execute()
+        return bool(removed)
+
+    def barrier_create(self, barrier_id, job_ids):
+        self.redis_client.sadd(f"{self.barrier_prefix}{barrier_id}", *job_ids)
+
+    def barrier_release(self, barrier_id, job_id):
+        # The emptied set disappears, so a later release finds nothing to remove
+        pipe = self.redis_client.pipeline(transaction=True)
+        pipe.srem(f"{self.barrier_prefix}{barrier_id}", job_id)
+        pipe.scard(f"{self.barrier_prefix}{barrier_id}")
+        removed, remaining = pipe.execute()
+        return bool(removed) and remaining == 0
+
+    def barrier_delete(self, barrier_id):
+        self.redis_client.delete(f"{self.barrier_prefix}{barrier_id}")
+
+    def dlq_add(self, job_id, task_name, failed_at, entry_json):
+        self._dlq_add_script(
+            keys=[self.dlq_entries_key, self.dlq_index_key,
+                  f"{self.dlq_task_prefix}{task_name}", self.dlq_counts_key],
+            args=[job_id, failed_at, entry_json, task_name]
+        )
+
+    def dlq_range(self, task_name=None, min_time=None, max_time=None,
+                  offset=0, count=100, newest_first=False):
+        key = f"{self.dlq_task_prefix}{task_name}" if task_name else self.dlq_index_key
+        low = '-inf' if min_time is None else min_time
+        high = '+inf' if max_time is None else max_time
+        if newest_first:
+            job_ids = self.redis_client.zrevrangebyscore(key, high, low, start=offset, num=count)
+        else:
+            job_ids = self.redis_client.zrangebyscore(key, low, high, start=offset, num=count)
+        if not job_ids:
+            return []
+        return [e for e in self.redis_client.hmget(self.dlq_entries_key, job_ids) if e]
+
+    def dlq_remove(self, entries):
+        if not entries:
+            return
+        self._dlq_remove_script(
+            keys=[self.dlq_entries_key, self.dlq_index_key, self.dlq_counts_key],
+            args=[self.dlq_task_prefix] + [part for entry in entries for part in entry]
+        )
+
+    def dlq_counts(self):
+        counts = self.redis_client.hgetall(self.dlq_counts_key)
+        return {task: int(n) for task, n in counts.items() if int(n) > 0}
+
+    def queue_size(self, queue_key):
+        return sum(self.tenant_backlog([queue_key])[queue_key].values())
+
+    def job_ids(self):
+        return self.redis_client.hkeys(self.jobs_key)
+
+    def clear_queue(self, queue_key):
+        self.redis_client.delete(*self._tenant_keys(queue_key))
+
+    def clear_all(self, queue_keys):
+        queue_parts = [key for queue_key in queue_keys for key in self._tenant_keys(queue_key)]
+        index_keys = list(self.redis_client.scan_iter(match=f"{self.index_prefix}*", count=1000))
+        barrier_keys = list(self.redis_client.scan_iter(match=f"{self.barrier_prefix}*", count=1000))
+        self.redis_client.delete(*queue_parts, *index_keys, *barrier_keys,
+                                 self.jobs_key, self.task_depth_key, self.status_key)
+
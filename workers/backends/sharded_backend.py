@@ -0,0 +1,338 @@
+"""
+Sharded Redis queue backend - spreads jobs over several Redis instances
+
+Each job (payload and queue entry) lives on the node picked by a
+consistent hash of its id. Workers take queues in priority order
+across all shards, visiting the shards round-robin within each queue.
+"""
+
+import json
+import math
+from config import Config
+from workers.backends.base import QueueBackend, tenant_queue_key
+from workers.backends.hash_ring import HashRing
+from workers.backends.redis_backend import RedisBackend
+from workers.logs import get_logger
+
+log = get_logger('backends')
+
+class ShardedRedisBackend(QueueBackend):
+    name = 'redis-sharded'
+
+    def __init__(self, nodes=None):
+        nodes = nodes or parse_nodes(Config.REDIS_NODES)
+        if not nodes:
+            raise ValueError("REDIS_NODES must list at least one host:port")
+        
+        self.nodes = list(nodes)
+        self.shards = {node: self._connect(node) for node in nodes}
+        self.ring = HashRing(nodes)
+        self._next_shard = 0
+
+    @staticmethod
+    def _connect(node):
+        host, port = node.rsplit(':', 1)
+        return RedisBackend(host=host, port=int(port))
+
+    @property
+    def control_shard(self):
+        """First node carries process-wide traffic such as update events"""
+        return self.shards[self.nodes[0]]
+
+    def shard_for(self, job_id):
+        return self.shards[self.ring.get_node(job_id)]
+
+    def _rotation(self):
+        """Shards starting one further along each call (fair dequeue)"""
+        shards = list(self.shards.values())
+        start = self._next_shard % len(shards)
+        self._next_shard = start + 1
+        return shards[start:] + shards[:start]
+
+    def enqueue(self, job_id, job_json, queue_key):
+        self.shard_for(job_id).enqueue(job_id, job_json, queue_key)
+
+    def admit(self, job_id, task_name, queue_key, queue_keys, limits, count=1):
+        """Each shard enforces its share of the limits for the jobs it owns
+
+        A fan-out of `count` jobs spreads over the shards too, so the
+        shard of job_id checks its share of them.
+        """
+        shares = len(self.shards)
+        shard_limits = dict(limits)
+        for name in ('max_queue_depth', 'max_task_depth', 'shed_depth'):
+            if limits[name]:
+                shard_limits[name] = max(limits[name] // shares, 1)
+        if limits['rate']:
+            shard_limits['rate'] = limits['rate'] / shares
+            shard_limits['burst'] = max(limits['burst'] / shares, 1)
+        return self.shard_for(job_id).admit(job_id, task_name, queue_key, queue_keys, shard_limits,
+                                            math.ceil(count / shares))
+
+    def dequeue(self, queue_keys):
+        batch = self.dequeue_batch(queue_keys, 1)
+        return batch[0] if batch else None
+
+    def dequeue_batch(self, queue_keys, count):
+        # Priority first, shards second: a 'low' job on one shard must not
+        # be served before a 'high' job on another
+        shards = self._rotation()
+        batch = []
+        for queue_key in queue_keys:
+            for shard in shards:
+                if len(batch) >= count:
+                    return batch
+                batch.extend(shard.dequeue_batch([queue_key], count - len(batch)))
+        return batch
+
+    def _group_by_shard(self, job_ids):
+        groups = {}
+        for index, job_id in enumerate(job_ids):
+            groups.setdefault(self.ring.get_node(job_id), []).append((index, job_id))
+        return groups
+
+    def tenant_backlog(self, queue_keys):
+        backlog = {queue_key: {} for queue_key in queue_keys}
+        for shard in self.shards.values():
+            for queue_key, tenants in shard.tenant_backlog(queue_keys).items():
+                for tenant, depth in tenants.items():
+                    backlog[queue_key][tenant] = backlog[queue_key].get(tenant, 0) + depth
+        return backlog
+
+    def enqueue_many(self, items):
+        groups = {}
+        for item in items:
+            groups.setdefault(self.ring.get_node(item[0]), []).append(item)
+        for node, shard_items in groups.items():
+            self.shards[node].enqueue_many(shard_items)
+
+    def requeue(self, items):
+        # Atomic per shard (a job's payload and queue entry share a shard)
+        groups = {}
+        for item in items:
+            groups.setdefault(self.ring.get_node(item[0]), []).append(item)
+        for node, shard_items in groups.items():
+            self.shards[node].requeue(shard_items)
+
+    def get_job(self, job_id):
+        return self.shard_for(job_id).get_job(job_id)
+
+    def get_jobs(self, job_ids):
+        results = [None] * len(job_ids)
+        for node, indexed in self._group_by_shard(job_ids).items():
+            payloads = self.shards[node].get_jobs([job_id for _, job_id in indexed])
+            for (index, _), payload in zip(indexed, payloads):
+                results[index] = payload
+        return results
+
+    def find_jobs(self, status=None, task_name=None, offset=0, limit=50):
+        # Each shard's top (offset + limit) is enough to page the merged order
+        entries, total = [], 0
+        for shard in self.shards.values():
+            shard_entries, shard_total = shard.find_jobs(status, task_name, 0, offset + limit)
+            entries.extend(shard_entries)
+            total += shard_total
+        entries.sort(key=lambda entry: entry[0], reverse=True)
+        return entries[offset:offset + limit], total
+
+    def iter_jobs(self, batch_size=1000):
+        for shard in self.shards.values():
+            yield from shard.iter_jobs(batch_size)
+
+    def queued_job_ids(self, queue_keys, batch_size=1000):
+        for shard in self.shards.values():
+            yield from shard.queued_job_ids(queue_keys, batch_size)
+
+    def delete_jobs(self, job_ids):
+        for node, indexed in self._group_by_shard(job_ids).items():
+            self.shards[node].delete_jobs([job_id for _, job_id in indexed])
+
+    def save_job(self, job_id, job_json):
+        self.shard_for(job_id).save_job(job_id, job_json)
+
+    def save_jobs(self, items):
+        groups = {}
+        for item in items:
+            groups.setdefault(self.ring.get_node(item[0]), []).append(item)
+        for node, shard_items in groups.items():
+            self.shards[node].save_jobs(shard_items)
+
+    def request_cancel(self, job_id):
+        self.shard_for(job_id).request_cancel(job_id)
+
+    def is_cancel_requested(self, job_id):
+        return self.shard_for(job_id).is_cancel_requested(job_id)
+
+    def publish_update(self, job_id, status):
+        self.control_shard.publish_update(job_id, status)
+
+    def publish_updates(self, updates):
+        self.control_shard.publish_updates(updates)
+
+    def listen_updates(self):
+        return self.control_shard.listen_updates()
+
+    # The worker registry lives on the control shard too
+    def heartbeat(self, worker_id, info_json, ttl):
+        self.control_shard.heartbeat(worker_id, info_json, ttl)
+
+    def list_workers(self):
+        return self.control_shard.list_workers()
+
+    def forget_worker(self, worker_id):
+        return self.control_shard.forget_worker(worker_id)
+
+    # The dead-letter queue lives on the control shard so it pages in one place
+    def barrier_create(self, barrier_id, job_ids):
+        self.control_shard.barrier_create(barrier_id, job_ids)
+
+    def barrier_release(self, barrier_id, job_id):
+        return self.control_shard.barrier_release(barrier_id, job_id)
+
+    def barrier_delete(self, barrier_id):
+        self.control_shard.barrier_delete(barrier_id)
+
+    def dlq_add(self, job_id, task_name, failed_at, entry_json):
+        self.control_shard.dlq_add(job_id, task_name, failed_at, entry_json)
+
+    def dlq_range(self, *args, **kwargs):
+        return self.control_shard.dlq_range(*args, **kwargs)
+
+    def dlq_remove(self, entries):
+        self.control_shard.dlq_remove(entries)
+
+    def dlq_counts(self):
+        return self.control_shard.dlq_counts()
+
+    def queue_size(self, queue_key):
+        return sum(shard.queue_size(queue_key) for shard in self.shards.values())
+
+    def job_ids(self):
+        job_ids = []
+        for shard in self.shards.values():
+            job_ids.extend(shard.job_ids())
+        return job_ids
+
+    def clear_queue(self, queue_key):
+        for shard in self.shards.values():
+            shard.clear_queue(queue_key)
+
+    def clear_all(self, queue_keys):
+        for shard in self.shards.values():
+            shard.clear_all(queue_keys)
+
+    def add_node(self, node, queue_keys, batch_size=1000):
+        """Add a shard and move only the jobs the ring now assigns to it
+
+        Other processes must be restarted with the new REDIS_NODES list
+        afterwards so they route to the same ring.
+        """
+        if node in self.shards:
+            return 0
+        
+        new_shard = self._connect(node)
+        self.shards[node] = new_shard
+        self.nodes.append(node)
+        self.ring.add_node(node)
+        
+        moved = 0
+        for old_node, old_shard in list(self.shards.items()):
+            if old_node == node:
+                continue
+            moved += self._move_jobs(old_shard, new_shard, node, queue_keys, batch_size)
+        
+        log.info('added shard', node=node, moved=moved)
+        return moved
+
+    def _move_jobs(self, old_shard, new_shard, node, queue_keys, batch_size):
+        old_client = old_shard.redis_client
+        new_client = new_shard.redis_client
+        moving = {}  # job_id -> task_name
+        
+        # Copy payloads (and index entries) first so a queue entry never points at nothing
+        for job_ids in _chunks(self._owned_by(old_shard, node), batch_size):
+            payloads = old_client.hmget(old_shard.jobs_key, job_ids)
+            mapping = {job_id: p for job_id, p in zip(job_ids, payloads) if p is not None}
+            if mapping:
+                pipe = new_client.pipeline(transaction=False)
+                for job_id, job_json in mapping.items():
+                    new_shard._save_script(
+                        keys=[new_shard.jobs_key, new_shard.status_key],
+                        args=[job_id, job_json, new_shard.index_prefix],
+                        client=pipe
+                    )
+                pipe.execute()
+                moving.update((job_id, json.loads(p)['task_name']) for job_id, p in mapping.items())
+        
+        # Move queue entries in their original order, with their task counts
+        depth_changes = {}
+        for queue_key in queue_keys:
+            for tenant in old_shard.queue_tenants(queue_key):
+                sub_queue = tenant_queue_key(queue_key, tenant)
+                moved = self._move_entries(old_client, new_client, sub_queue, moving, batch_size)
+                if moved:
+                    new_shard.join_tenant_ring(queue_key, tenant)
+                for job_id in moved:
+                    task_name = moving[job_id]
+                    depth_changes[task_name] = depth_changes.get(task_name, 0) + 1
+        
+        for task_name, count in depth_changes.items():
+            old_client.hincrby(old_shard.task_depth_key, task_name, -count)
+            new_client.hincrby(new_shard.task_depth_key, task_name, count)
+        
+        for job_ids in _chunks(sorted(moving), batch_size):
+            old_shard.delete_jobs(job_ids)
+        return len(moving)
+
+    @staticmethod
+    def _move_entries(old_client, new_client, sub_queue, moving, batch_size):
+        """Move the entries of `moving` jobs from one list to the other
+
+        Reads the list a page at a time. A worker popping meanwhile shifts
+        the list, so a page can step over an entry; sweeps repeat until
+        one finds nothing left to move.
+        """
+        moved = []
+        while True:
+            swept, start = 0, 0
+            while True:
+                page = old_client.lrange(sub_queue, start, start + batch_size - 1)
+                job_ids = [job_id for job_id in page if job_id in moving]
+                removed = []
+                if job_ids:
+                    pipe = old_client.pipeline(transaction=False)
+                    for job_id in job_ids:
+                        pipe.lrem(sub_queue, 1, job_id)
+                    # Skip entries a worker popped in the meantime
+                    removed = [job_id for job_id, n in zip(job_ids, pipe.execute()) if n]
+                    if removed:
+                        new_client.rpush(sub_queue, *removed)
+                moved.extend(removed)
+                swept += len(removed)
+                if len(page) < batch_size:
+                    break
+                # The entries just removed no longer take up room in the list
+                start += len(page) - len(removed)
+            if not swept:
+                return moved
+
+    def _owned_by(self, shard, node):
+        for job_id, _ in shard.redis_client.hscan_iter(shard.jobs_key, count=1000):
+            if self.ring.get_node(job_id) == node:
+                yield job_id
+
+
+def parse_nodes(value):
+    """'host1:6379,host2:6379' -> ['host1:6379', 'host2:6379']"""
+    return [node.strip() for node in (value or '').split(',') if node.strip()]
+
+
+def _chunks(items, size):
+    chunk = []
+    for item in items:
+        chunk.append(item)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
@@ -0,0 +1,561 @@
+"""
+Embedded queue backend on SQLite
+Use a file path for durable single-node deployments (WAL mode) or
+':memory:' for tests. No network hop, same priority/FIFO semantics
+as the Redis backend.
+"""
+
+import json
+import math
+import sqlite3
+import threading
+import time
+from config import Config
+from workers.admission import parse_limits
+from workers.backends.base import QueueBackend, tenant_queue_key
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS queue_jobs (
+    id TEXT PRIMARY KEY,
+    payload TEXT NOT NULL,
+    task_name TEXT,
+    status TEXT,
+    created_ms INTEGER,
+    updated_ms INTEGER
+);
+CREATE TABLE IF NOT EXISTS queue_items (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    queue TEXT NOT NULL,
+    job_id TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS ix_queue_items_queue_seq ON queue_items (queue, seq);
+CREATE TABLE IF NOT EXISTS queue_tenants (
+    queue TEXT NOT NULL,
+    tenant TEXT NOT NULL,
+    turn INTEGER NOT NULL,
+    credit INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (queue, tenant)
+);
+CREATE INDEX IF NOT EXISTS ix_queue_tenants_turn ON queue_tenants (queue, turn);
+CREATE TABLE IF NOT EXISTS task_depths (
+    task_name TEXT PRIMARY KEY,
+    depth INTEGER NOT NULL DEFAULT 0
+);
+CREATE TABLE IF NOT EXISTS admission_rate (
+    id INTEGER PRIMARY KEY CHECK (id = 1),
+    tokens REAL NOT NULL,
+    ts REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS queue_cancels (
+    job_id TEXT PRIMARY KEY
+);
+CREATE TABLE IF NOT EXISTS dead_letters (
+    job_id TEXT PRIMARY KEY,
+    task_name TEXT NOT NULL,
+    failed_at REAL NOT NULL,
+    entry TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS ix_dead_letters_failed_at ON dead_letters (failed_at);
+CREATE INDEX IF NOT EXISTS ix_dead_letters_task_failed_at ON dead_letters (task_name, failed_at);
+CREATE TABLE IF NOT EXISTS queue_workers (
+    worker_id TEXT PRIMARY KEY,
+    info TEXT NOT NULL,
+    expires_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS barriers (
+    barrier_id TEXT NOT NULL,
+    job_id TEXT NOT NULL,
+    PRIMARY KEY (barrier_id, job_id)
+);
+CREATE TABLE IF NOT EXISTS queue_events (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    job_id TEXT NOT NULL,
+    status TEXT NOT NULL
+);
+"""
+
+# Columns added to queue_jobs after its first release, with their indexes
+INDEXED_COLUMNS = {
+    'task_name': 'TEXT',
+    'status': 'TEXT',
+    'created_ms': 'INTEGER',
+    'updated_ms': 'INTEGER'
+}
+INDEX_SCHEMA = """
+CREATE INDEX IF NOT EXISTS ix_queue_jobs_created ON queue_jobs (created_ms);
+CREATE INDEX IF NOT EXISTS ix_queue_jobs_task_created ON queue_jobs (task_name, created_ms);
+CREATE INDEX IF NOT EXISTS ix_queue_jobs_status_updated ON queue_jobs (status, updated_ms);
+CREATE INDEX IF NOT EXISTS ix_queue_jobs_task_status_updated ON queue_jobs (task_name, status, updated_ms);
+"""
+
+class SQLiteBackend(QueueBackend):
+    name = 'sqlite'
+
+    # Update events kept for listeners in other processes
+    events_retained = 10000
+
+    def __init__(self, path='queue.db', poll_interval=0.2):
+        self.path = path
+        self.poll_interval = poll_interval
+        self.tenant_weights = parse_limits(Config.TENANT_WEIGHTS)
+        self.default_tenant_weight = Config.TENANT_DEFAULT_WEIGHT
+        # One shared connection: ':memory:' databases are per-connection.
+        # Autocommit mode so we control transactions with BEGIN IMMEDIATE.
+        self.conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self.lock = threading.RLock()
+        
+        if path != ':memory:':
+            self.conn.execute('PRAGMA journal_mode=WAL')
+            self.conn.execute('PRAGMA synchronous=NORMAL')
+        self.conn.execute('PRAGMA busy_timeout=5000')
+        self.conn.executescript(SCHEMA)
+        self._migrate()
+        self.conn.executescript(INDEX_SCHEMA)
+
+    def _migrate(self):
+        existing = {row[1] for row in self.conn.execute('PRAGMA table_info(queue_jobs)')}
+        for column, column_type in INDEXED_COLUMNS.items():
+            if column not in existing:
+                self.conn.execute(f'ALTER TABLE queue_jobs ADD COLUMN {column} {column_type}')
+
+    def _transaction(self):
+        """Serialize writers across threads and processes"""
+        return _Transaction(self.conn, self.lock)
+
+    def enqueue(self, job_id, job_json, queue_key):
+        with self._transaction() as cur:
+            job = _store_job(cur, job_id, job_json)
+            _push_fair(cur, queue_key, job.get('tenant') or '', job_id)
+            _change_task_depth(cur, job['task_name'], 1)
+
+    def admit(self, job_id, task_name, queue_key, queue_keys, limits, count=1):
+        retry_after = limits['retry_after']
+        with self._transaction() as cur:
+            if limits['shed_depth'] and limits['sheddable']:
+                total = sum(_queue_depth(cur, key) for key in queue_keys)
+                if total + count > limits['shed_depth']:
+                    return False, 'shed', retry_after
+            
+            if limits['max_queue_depth']:
+                if _queue_depth(cur, queue_key) + count > limits['max_queue_depth']:
+                    return False, 'queue_full', retry_after
+            
+            if limits['max_task_depth']:
+                row = cur.execute(
+                    'SELECT depth FROM task_depths WHERE task_name = ?', (task_name,)
+                ).fetchone()
+                if (row[0] if row else 0) + count > limits['max_task_depth']:
+                    return False, 'task_full', retry_after
+            
+            if limits['rate']:
+                rate, burst, now = limits['rate'], limits['burst'], time.time()
+                row = cur.execute('SELECT tokens, ts FROM admission_rate WHERE id = 1').fetchone()
+                tokens, last = row if row else (burst, now)
+                tokens = min(burst, tokens + max(now - last, 0) * rate)
+                # As in ADMIT_JOB: a fan-out larger than the burst leaves debt
+                needed = min(count, burst)
+                if tokens < needed:
+                    return False, 'rate_limited', math.ceil((needed - tokens) / rate)
+                cur.execute(
+                    'INSERT OR REPLACE INTO admission_rate (id, tokens, ts) VALUES (1, ?, ?)',
+                    (tokens - count, now)
+                )
+        return True, 'ok', 0
+
+    def dequeue(self, queue_keys):
+        batch = self.dequeue_batch(queue_keys, 1)
+        return batch[0] if batch else None
+
+    def dequeue_batch(self, queue_keys, count):
+        batch = []
+        with self._transaction() as cur:
+            for queue_key in queue_keys:
+                while len(batch) < count:
+                    payload = self._dequeue_fair(cur, queue_key)
+                    if not payload:
+                        break
+                    _change_task_depth(cur, json.loads(payload)['task_name'], -1)
+                    batch.append((queue_key, payload))
+        return batch
+
+    def _dequeue_fair(self, cur, queue_key):
+        """Weighted round-robin over the queue's tenants (as in DEQUEUE_JOB)"""
+        while True:
+            head = cur.execute(
+                'SELECT tenant, credit FROM queue_tenants WHERE queue = ? ORDER BY turn LIMIT 1',
+                (queue_key,)
+            ).fetchone()
+            if not head:
+                # Items queued before tenants were tracked
+                return _pop(cur, queue_key)
+            
+            tenant, credit = head
+            sub_queue = tenant_queue_key(queue_key, tenant)
+            payload = _pop(cur, sub_queue)
+            if credit <= 0:
+                credit = self.tenant_weights.get(tenant, self.default_tenant_weight)
+            credit -= 1
+            remaining = cur.execute(
+                'SELECT 1 FROM queue_items WHERE queue = ? LIMIT 1', (sub_queue,)
+            ).fetchone()
+            if not (payload and remaining):
+                cur.execute(
+                    'DELETE FROM queue_tenants WHERE queue = ? AND tenant = ?', (queue_key, tenant)
+                )
+            elif credit <= 0:
+                cur.execute(
+                    'UPDATE queue_tenants SET credit = 0, turn = '
+                    '(SELECT MAX(turn) + 1 FROM queue_tenants WHERE queue = ?) '
+                    'WHERE queue = ? AND tenant = ?',
+                    (queue_key, queue_key, tenant)
+                )
+            else:
+                cur.execute(
+                    'UPDATE queue_tenants SET credit = ? WHERE queue = ? AND tenant = ?',
+                    (credit, queue_key, tenant)
+                )
+            if payload:
+                return payload
+
+    def enqueue_many(self, items):
+        with self._transaction() as cur:
+            for job_id, job_json, queue_key in items:
+                job = _store_job(cur, job_id, job_json)
+                _push_fair(cur, queue_key, job.get('tenant') or '', job_id)
+                _change_task_depth(cur, job['task_name'], 1)
+
+    def get_job(self, job_id):
+        with self.lock:
+            row = self.conn.execute(
+                'SELECT payload FROM queue_jobs WHERE id = ?', (job_id,)
+            ).fetchone()
+        return row[0] if row else None
+
+    def get_jobs(self, job_ids):
+        payloads = {}
+        with self.lock:
+            for chunk in _chunks(list(job_ids), 500):
+                placeholders = ','.join('?' * len(chunk))
+                payloads.update(self.conn.execute(
+                    f'SELECT id, payload FROM queue_jobs WHERE id IN ({placeholders})', chunk
+                ).fetchall())
+        return [payloads.get(job_id) for job_id in job_ids]
+
+    def delete_jobs(self, job_ids):
+        with self._transaction() as cur:
+            cur.executemany('DELETE FROM queue_jobs WHERE id = ?', [(job_id,) for job_id in job_ids])
+
+    def find_jobs(self, status=None, task_name=None, offset=0, limit=50):
+        clauses, params = [], []
+        if status:
+            clauses.append('status = ?')
+            params.append(status)
+        if task_name:
+            clauses.append('task_name = ?')
+            params.append(task_name)
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ''
+        order = 'updated_ms' if status else 'created_ms'
+        with self.lock:
+            rows = self.conn.execute(
+                f'SELECT {order}, payload FROM queue_jobs {where} ORDER BY {order} DESC LIMIT ? OFFSET ?',
+                params + [limit, offset]
+            ).fetchall()
+            total = self.conn.execute(f'SELECT COUNT(*) FROM queue_jobs {where}', params).fetchone()[0]
+        return [(score, payload) for score, payload in rows], total
+
+    def iter_jobs(self, batch_size=1000):
+        last_id = ''
+        while True:
+            with self.lock:
+                rows = self.conn.execute(
+                    'SELECT id, payload FROM queue_jobs WHERE id > ? ORDER BY id LIMIT ?',
+                    (last_id, batch_size)
+                ).fetchall()
+            if not rows:
+                return
+            for job_id, payload in rows:
+                yield payload
+            last_id = rows[-1][0]
+
+    def queued_job_ids(self, queue_keys, batch_size=1000):
+        for queue_key in queue_keys:
+            last_seq = 0
+            while True:
+                with self.lock:
+                    rows = self.conn.execute(
+                        f'SELECT seq, job_id FROM queue_items WHERE ({_QUEUE_PARTS}) AND seq > ? '
+                        'ORDER BY seq LIMIT ?',
+                        (*_queue_parts(queue_key), last_seq, batch_size)
+                    ).fetchall()
+                if not rows:
+                    break
+                for _, job_id in rows:
+                    yield queue_key, job_id
+                last_seq = rows[-1][0]
+
+    def save_job(self, job_id, job_json):
+        self.save_jobs([(job_id, job_json)])
+
+    def save_jobs(self, items):
+        with self._transaction() as cur:
+            for job_id, job_json in items:
+                _store_job(cur, job_id, job_json)
+
+    def request_cancel(self, job_id):
+        with self._transaction() as cur:
+            cur.execute('INSERT OR IGNORE INTO queue_cancels (job_id) VALUES (?)', (job_id,))
+
+    def is_cancel_requested(self, job_id):
+        with self.lock:
+            return self.conn.execute(
+                'SELECT 1 FROM queue_cancels WHERE job_id = ?', (job_id,)
+            ).fetchone() is not None
+
+    def publish_update(self, job_id, status):
+        self.publish_updates([(job_id, status)])
+
+    def publish_updates(self, updates):
+        with self._transaction() as cur:
+            for job_id, status in updates:
+                cur.execute('INSERT INTO queue_events (job_id, status) VALUES (?, ?)', (job_id, status))
+                seq = cur.lastrowid
+                if seq % 1000 == 0:
+                    cur.execute('DELETE FROM queue_events WHERE seq <= ?', (seq - self.events_retained,))
+
+    def listen_updates(self):
+        # No server push in SQLite: one cheap indexed poll per process
+        with self.lock:
+            last_seq = self.conn.execute('SELECT COALESCE(MAX(seq), 0) FROM queue_events').fetchone()[0]
+        while True:
+            with self.lock:
+                rows = self.conn.execute(
+                    'SELECT seq, job_id, status FROM queue_events WHERE seq > ? ORDER BY seq',
+                    (last_seq,)
+                ).fetchall()
+            for seq, job_id, status in rows:
+                last_seq = seq
+                yield job_id, status
+            if not rows:
+                time.sleep(self.poll_interval)
+
+    def heartbeat(self, worker_id, info_json, ttl):
+        with self._transaction() as cur:
+            cur.execute(
+                'INSERT OR REPLACE INTO queue_workers (worker_id, info, expires_at) VALUES (?, ?, ?)',
+                (worker_id, info_json, time.time() + ttl)
+            )
+
+    def list_workers(self):
+        with self.lock:
+            rows = self.conn.execute('SELECT worker_id, info, expires_at FROM queue_workers').fetchall()
+        now = time.time()
+        return [(worker_id, info, expires_at > now) for worker_id, info, expires_at in rows]
+
+    def forget_worker(self, worker_id):
+        with self._transaction() as cur:
+            cur.execute('DELETE FROM queue_workers WHERE worker_id = ?', (worker_id,))
+            return cur.rowcount > 0
+
+    def barrier_create(self, barrier_id, job_ids):
+        with self._transaction() as cur:
+            cur.executemany(
+                'INSERT OR IGNORE INTO barriers (barrier_id, job_id) VALUES (?, ?)',
+                [(barrier_id, job_id) for job_id in job_ids]
+            )
+
+    def barrier_release(self, barrier_id, job_id):
+        with self._transaction() as cur:
+            cur.execute('DELETE FROM barriers WHERE barrier_id = ? AND job_id = ?', (barrier_id, job_id))
+            if not cur.rowcount:
+                return False
+            remaining = cur.execute(
+                'SELECT COUNT(*) FROM barriers WHERE barrier_id = ?', (barrier_id,)
+            ).fetchone()[0]
+            return remaining == 0
+
+    def barrier_delete(self, barrier_id):
+        with self._transaction() as cur:
+            cur.execute('DELETE FROM barriers WHERE barrier_id = ?', (barrier_id,))
+
+    def dlq_add(self, job_id, task_name, failed_at, entry_json):
+        with self._transaction() as cur:
+            cur.execute(
+                'INSERT OR REPLACE INTO dead_letters (job_id, task_name, failed_at, entry) VALUES (?, ?, ?, ?)',
+                (job_id, task_name, failed_at, entry_json)
+            )
+
+    def dlq_range(self, task_name=None, min_time=None, max_time=None,
+                  offset=0, count=100, newest_first=False):
+        clauses, params = [], []
+        if task_name:
+            clauses.append('task_name = ?')
+            params.append(task_name)
+        if min_time is not None:
+            clauses.append('failed_at >= ?')
+            params.append(min_time)
+        if max_time is not None:
+            clauses.append('failed_at <= ?')
+            params.append(max_time)
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ''
+        order = 'DESC' if newest_first else 'ASC'
+        with self.lock:
+            rows = self.conn.execute(
+                f'SELECT entry FROM dead_letters {where} ORDER BY failed_at {order} LIMIT ? OFFSET ?',
+                params + [count, offset]
+            ).fetchall()
+        return [row[0] for row in rows]
+
+    def dlq_remove(self, entries):
+        with self._transaction() as cur:
+            cur.executemany('DELETE FROM dead_letters WHERE job_id = ?', [(job_id,) for job_id, _ in entries])
+
+    def dlq_counts(self):
+        with self.lock:
+            return dict(self.conn.execute(
+                'SELECT task_name, COUNT(*) FROM dead_letters GROUP BY task_name'
+            ).fetchall())
+
+    def tenant_backlog(self, queue_keys):
+        backlog = {}
+        with self.lock:
+            for queue_key in queue_keys:
+                rows = self.conn.execute(
+                    f'SELECT queue, COUNT(*) FROM queue_items WHERE {_QUEUE_PARTS} GROUP BY queue',
+                    _queue_parts(queue_key)
+                ).fetchall()
+                prefix = _queue_parts(queue_key)[1]
+                backlog[queue_key] = {
+                    sub_queue[len(prefix):] if sub_queue != queue_key else '': n
+                    for sub_queue, n in rows
+                }
+        return backlog
+
+    def queue_size(self, queue_key):
+        with self.lock:
+            return _queue_depth(self.conn, queue_key)
+
+    def job_ids(self):
+        with self.lock:
+            return [row[0] for row in self.conn.execute('SELECT id FROM queue_jobs')]
+
+    def clear_queue(self, queue_key):
+        with self._transaction() as cur:
+            cur.execute(f'DELETE FROM queue_items WHERE {_QUEUE_PARTS}', _queue_parts(queue_key))
+            cur.execute('DELETE FROM queue_tenants WHERE queue = ?', (queue_key,))
+
+    def clear_all(self, queue_keys):
+        with self._transaction() as cur:
+            for queue_key in queue_keys:
+                cur.execute(f'DELETE FROM queue_items WHERE {_QUEUE_PARTS}', _queue_parts(queue_key))
+            cur.execute('DELETE FROM queue_tenants')
+            cur.execute('DELETE FROM queue_jobs')
+            cur.execute('DELETE FROM task_depths')
+            cur.execute('DELETE FROM queue_cancels')
+            cur.execute('DELETE FROM queue_events')
+            cur.execute('DELETE FROM barriers')
+
+
+class MemoryBackend(SQLiteBackend):
+    """Private in-process database, for tests and CI"""
+    name = 'memory'
+
+    def __init__(self):
+        super().__init__(':memory:')
+
+
+class _Transaction:
+    def __init__(self, conn, lock):
+        self.conn = conn
+        self.lock = lock
+
+    def __enter__(self):
+        self.lock.acquire()
+        try:
+            self.conn.execute('BEGIN IMMEDIATE')
+        except Exception:
+            self.lock.release()
+            raise
+        return self.conn.cursor()
+
+    def __exit__(self, exc_type, exc, tb):
+        try:
+            self.conn.execute('ROLLBACK' if exc_type else 'COMMIT')
+        finally:
+            self.lock.release()
+        return False
+
+
+def _store_job(cur, job_id, job_json):
+    """Upsert a payload and its index columns; returns the decoded job"""
+    job = json.loads(job_json)
+    now_ms = int(time.time() * 1000)
+    cur.execute(
+        'INSERT INTO queue_jobs (id, payload, task_name, status, created_ms, updated_ms) '
+        'VALUES (?, ?, ?, ?, ?, ?) '
+        'ON CONFLICT(id) DO UPDATE SET payload = excluded.payload, '
+        'task_name = excluded.task_name, status = excluded.status, '
+        'updated_ms = CASE WHEN queue_jobs.status = excluded.status '
+        'THEN queue_jobs.updated_ms ELSE excluded.updated_ms END',
+        (job_id, job_json, job['task_name'], job['status'], now_ms, now_ms)
+    )
+    return job
+
+
+def _push_fair(cur, queue_key, tenant, job_id):
+    """Append to the tenant's sub-queue, adding the tenant to the back of the ring"""
+    cur.execute(
+        'INSERT INTO queue_items (queue, job_id) VALUES (?, ?)',
+        (tenant_queue_key(queue_key, tenant), job_id)
+    )
+    cur.execute(
+        'INSERT OR IGNORE INTO queue_tenants (queue, tenant, turn) '
+        'SELECT ?, ?, COALESCE(MAX(turn), 0) + 1 FROM queue_tenants WHERE queue = ?',
+        (queue_key, tenant, queue_key)
+    )
+
+
+def _pop(cur, queue):
+    """Remove the first item of a queue and return its payload (None if empty)"""
+    while True:
+        row = cur.execute(
+            'SELECT seq, job_id FROM queue_items WHERE queue = ? ORDER BY seq LIMIT 1',
+            (queue,)
+        ).fetchone()
+        if not row:
+            return None
+        seq, job_id = row
+        cur.execute('DELETE FROM queue_items WHERE seq = ?', (seq,))
+        payload = cur.execute(
+            'SELECT payload FROM queue_jobs WHERE id = ?', (job_id,)
+        ).fetchone()
+        if payload:
+            return payload[0]
+        # Orphaned id without a payload, skip it
+
+
+# A queue and its tenant sub-queues: '<queue>:tenant:*' sorts between
+# '<queue>:tenant:' and '<queue>:tenant;', so the (queue, seq) index serves it
+_QUEUE_PARTS = 'queue = ? OR (queue >= ? AND queue < ?)'
+
+
+def _queue_parts(queue_key):
+    return (queue_key, f"{queue_key}:tenant:", f"{queue_key}:tenant;")
+
+
+def _queue_depth(cur, queue_key):
+    return cur.execute(
+        f'SELECT COUNT(*) FROM queue_items WHERE {_QUEUE_PARTS}', _queue_parts(queue_key)
+    ).fetchone()[0]
+
+
+def _change_task_depth(cur, task_name, delta):
+    cur.execute(
+        'INSERT INTO task_depths (task_name, depth) VALUES (?, ?) '
+        'ON CONFLICT(task_name) DO UPDATE SET depth = depth + excluded.depth',
+        (task_name, delta)
+    )
+
+
+def _chunks(items, size):
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
@@ -0,0 +1,254 @@
+"""
+Redis Streams queue backend - one stream per queue, read through a
+consumer group so jobs are acknowledged, redelivered and visible per
+consumer while in flight
+"""
+
+import json
+import os
+import socket
+import time
+import redis
+from config import Config
+from workers.backends.redis_backend import RedisBackend
+from workers.backends import lua_scripts
+from workers.logs import get_logger
+
+log = get_logger('backends')
+
+class StreamsBackend(RedisBackend):
+    name = 'redis-streams'
+
+    def __init__(self, consumer=None, group=None, maxlen=None, claim_idle_ms=None, **kwargs):
+        super().__init__(**kwargs)
+        self.consumer = consumer or f"{socket.gethostname()}-{os.getpid()}"
+        self.group = group or Config.STREAM_GROUP
+        self.maxlen = maxlen or Config.STREAM_MAXLEN
+        self.claim_idle_ms = claim_idle_ms or Config.STREAM_CLAIM_IDLE_MS
+        
+        self._enqueue_stream_script = self.redis_client.register_script(
+            lua_scripts.ENQUEUE_STREAM_JOB
+        )
+        self._groups_ready = set()
+        self._last_claim = 0
+        
+        # job_id -> (stream key, entry id) for jobs this consumer holds
+        self._in_flight = {}
+
+    def _ensure_group(self, stream_key):
+        if stream_key in self._groups_ready:
+            return
+        try:
+            self.redis_client.xgroup_create(stream_key, self.group, id='0', mkstream=True)
+        except redis.ResponseError as e:
+            if 'BUSYGROUP' not in str(e):
+                raise
+        self._groups_ready.add(stream_key)
+
+    def enqueue(self, job_id, job_json, queue_key):
+        self._ensure_group(queue_key)
+        self._enqueue_stream_script(
+            keys=[self.jobs_key, queue_key, self.task_depth_key, self.status_key],
+            args=[job_id, job_json, self.index_prefix, self.maxlen]
+        )
+
+    def enqueue_many(self, items):
+        pipe = self.redis_client.pipeline(transaction=False)
+        for job_id, job_json, queue_key in items:
+            self._ensure_group(queue_key)
+            self._enqueue_stream_script(
+                keys=[self.jobs_key, queue_key, self.task_depth_key, self.status_key],
+                args=[job_id, job_json, self.index_prefix, self.maxlen],
+                client=pipe
+            )
+        pipe.execute()
+
+    def requeue(self, items):
+        # New entries and the end of the old deliveries in one MULTI/EXEC
+        pipe = self.redis_client.pipeline(transaction=True)
+        for job_id, job_json, queue_key in items:
+            self._ensure_group(queue_key)
+            self._enqueue_stream_script(
+                keys=[self.jobs_key, queue_key, self.task_depth_key, self.status_key],
+                args=[job_id, job_json, self.index_prefix, self.maxlen],
+                client=pipe
+            )
+            if job_id in self._in_flight:
+                stream_key, entry_id = self._in_flight[job_id]
+                pipe.xack(stream_key, self.group, entry_id)
+                pipe.xdel(stream_key, entry_id)
+        pipe.execute()
+        for job_id, _, _ in items:
+            self._in_flight.pop(job_id, None)
+
+    def dequeue_batch(self, queue_keys, count):
+        entries = []
+        
+        # Jobs abandoned by dead consumers come first
+        if time.time() - self._last_claim >= self.claim_idle_ms / 1000:
+            self._last_claim = time.time()
+            entries.extend(self.reclaim(queue_keys, count))
+        
+        for stream_key in queue_keys:
+            if len(entries) >= count:
+                break
+            self._ensure_group(stream_key)
+            response = self.redis_client.xreadgroup(
+                self.group, self.consumer, {stream_key: '>'},
+                count=count - len(entries)
+            )
+            for _, messages in response or []:
+                entries.extend((stream_key, entry_id, fields, True) for entry_id, fields in messages)
+        
+        return self._load_payloads(entries)
+
+    def reclaim(self, queue_keys, count):
+        """Take over entries of dead consumers idle longer than claim_idle_ms
+
+        A consumer is dead once its worker heartbeat has expired. Entries a
+        live worker is running or holds prefetched stay with it however
+        long they take, so no job runs twice.
+        """
+        entries = []
+        alive = {self.consumer: True}
+        held = {entry_id for _, entry_id in self._in_flight.values()}
+        for stream_key in queue_keys:
+            self._ensure_group(stream_key)
+            start = '-'
+            while len(entries) < count:
+                pending = self.redis_client.xpending_range(
+                    stream_key, self.group, min=start, max='+', count=100, idle=self.claim_idle_ms
+                )
+                if not pending:
+                    break
+                start = f"({pending[-1]['message_id']}"
+                entry_ids = []
+                for p in pending:
+                    consumer = p['consumer']
+                    if consumer not in alive:
+                        alive[consumer] = bool(self.redis_client.exists(f"{self.worker_alive_prefix}{consumer}"))
+                    # Our own entries are only orphans if this process does not hold them
+                    if consumer == self.consumer and p['message_id'] in held:
+                        continue
+                    if consumer != self.consumer and alive[consumer]:
+                        continue
+                    entry_ids.append(p['message_id'])
+                entry_ids = entry_ids[:count - len(entries)]
+                if not entry_ids:
+                    continue
+                # min_idle_time: another consumer reclaiming it first wins
+                claimed = self.redis_client.xclaim(
+                    stream_key, self.group, self.consumer, self.claim_idle_ms, entry_ids
+                )
+                entries.extend(
+                    (stream_key, entry_id, fields, False) for entry_id, fields in claimed if fields
+                )
+            if len(entries) >= count:
+                break
+        if entries:
+            log.info('reclaimed jobs from dead consumers', count=len(entries))
+        return entries
+
+    def release_consumer(self, worker_id, queue_keys):
+        """Ack and drop a dead consumer's pending entries, returning their job ids
+
+        The caller re-enqueues the jobs; waiting out claim_idle_ms is not needed
+        """
+        job_ids = []
+        for stream_key in queue_keys:
+            self._ensure_group(stream_key)
+            while True:
+                pending = self.redis_client.xpending_range(
+                    stream_key, self.group, min='-', max='+', count=1000, consumername=worker_id
+                )
+                if not pending:
+                    break
+                entry_ids = [p['message_id'] for p in pending]
+                claimed = self.redis_client.xclaim(stream_key, self.group, self.consumer, 0, entry_ids)
+                job_ids.extend(fields['job_id'] for _, fields in claimed if fields)
+                pipe = self.redis_client.pipeline(transaction=False)
+                pipe.xack(stream_key, self.group, *entry_ids)
+                pipe.xdel(stream_key, *entry_ids)
+                pipe.execute()
+            self.redis_client.xgroup_delconsumer(stream_key, self.group, worker_id)
+        return job_ids
+
+    def _load_payloads(self, entries):
+        """Fetch payloads for stream entries with one HMGET
+
+        Entries are (stream_key, entry_id, fields, first_delivery)
+        """
+        if not entries:
+            return []
+        job_ids = [fields['job_id'] for _, _, fields, _ in entries]
+        payloads = self.redis_client.hmget(self.jobs_key, job_ids)
+        
+        batch = []
+        pipe = self.redis_client.pipeline(transaction=False)
+        for (stream_key, entry_id, _, first_delivery), job_id, job_json in zip(entries, job_ids, payloads):
+            if job_json is None:
+                # Payload is gone, the entry can never be processed
+                pipe.xack(stream_key, self.group, entry_id)
+                pipe.xdel(stream_key, entry_id)
+                continue
+            # A reclaimed entry was already counted out on first delivery
+            if first_delivery:
+                pipe.hincrby(self.task_depth_key, json.loads(job_json)['task_name'], -1)
+            self._in_flight[job_id] = (stream_key, entry_id)
+            batch.append((stream_key, job_json))
+        pipe.execute()
+        return batch
+
+    def ack(self, job_id):
+        location = self._in_flight.pop(job_id, None)
+        if not location:
+            return
+        stream_key, entry_id = location
+        pipe = self.redis_client.pipeline(transaction=False)
+        pipe.xack(stream_key, self.group, entry_id)
+        pipe.xdel(stream_key, entry_id)
+        pipe.execute()
+
+    def pending_summary(self, queue_keys):
+        summary = {}
+        for stream_key in queue_keys:
+            self._ensure_group(stream_key)
+            info = self.redis_client.xpending(stream_key, self.group)
+            consumers = {c['name']: int(c['pending']) for c in info.get('consumers') or []}
+            if consumers:
+                summary[stream_key] = consumers
+        return summary
+
+    def tenant_backlog(self, queue_keys):
+        # One stream per queue: consumer groups read it in order, no sub-queues
+        return {}
+
+    def queue_size(self, queue_key):
+        """Entries not yet delivered to any consumer"""
+        self._ensure_group(queue_key)
+        pipe = self.redis_client.pipeline(transaction=False)
+        pipe.xlen(queue_key)
+        pipe.xpending(queue_key, self.group)
+        length, pending = pipe.execute()
+        return max(length - pending['pending'], 0)
+
+    def queued_job_ids(self, queue_keys, batch_size=1000):
+        # Entries stay in the stream until acked, so this includes deliveries
+        for stream_key in queue_keys:
+            start = '-'
+            while True:
+                entries = self.redis_client.xrange(stream_key, min=start, max='+', count=batch_size)
+                for _, fields in entries:
+                    yield stream_key, fields['job_id']
+                if len(entries) < batch_size:
+                    break
+                start = f"({entries[-1][0]}"
+
+    def clear_queue(self, queue_key):
+        super().clear_queue(queue_key)
+        self._groups_ready.discard(queue_key)
+
+    def clear_all(self, queue_keys):
+        super().clear_all(queue_keys)
+        self._groups_ready.clear()
+        self._in_flight.clear()
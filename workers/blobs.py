@@ -0,0 +1,90 @@
+"""
+Content-addressed blob store for large task_data and results
+
+Payloads over BLOB_THRESHOLD bytes (as JSON) are written once under
+BLOB_DIR, named by their SHA-256, and the job carries a small reference
+{'$blob': <sha256>, 'size': <bytes>} instead. Status updates then copy
+the reference, not the payload. Point BLOB_DIR at shared disk when
+workers run on several machines.
+"""
+
+import hashlib
+import json
+import mmap
+import os
+import re
+import tempfile
+import threading
+from config import Config
+
+REF_KEY = '$blob'
+_DIGEST = re.compile(r'^[0-9a-f]{64}$')
+
+def is_ref(value):
+    """True if value is a blob reference rather than an inline payload"""
+    return isinstance(value, dict) and REF_KEY in value
+
+class BlobStore:
+    def __init__(self, root=None, threshold=None):
+        self.root = root or Config.BLOB_DIR
+        self.threshold = Config.BLOB_THRESHOLD if threshold is None else threshold
+
+    @property
+    def enabled(self):
+        return self.threshold > 0
+
+    def path(self, digest):
+        if not _DIGEST.match(digest or ''):
+            raise ValueError(f"Invalid blob digest: {digest!r}")
+        return os.path.join(self.root, digest[:2], digest)
+
+    def put(self, data):
+        """Store bytes once (same content, same file) and return a reference"""
+        digest = hashlib.sha256(data).hexdigest()
+        path = self.path(digest)
+        if not os.path.exists(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            # Write aside and rename so readers never see a partial blob
+            fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+            try:
+                with os.fdopen(fd, 'wb') as f:
+                    f.write(data)
+                os.replace(tmp_path, path)
+            except BaseException:
+                if os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+                raise
+        return {REF_KEY: digest, 'size': len(data)}
+
+    def offload(self, value):
+        """A reference for a large JSON-able value; small values come back as is"""
+        if not self.enabled or value is None or is_ref(value):
+            return value
+        data = json.dumps(value).encode()
+        if len(data) < self.threshold:
+            return value
+        return self.put(data)
+
+    def open(self, ref):
+        """Read-only memory map of a blob's JSON bytes (close it when done)"""
+        with open(self.path(ref[REF_KEY]), 'rb') as f:
+            return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def load(self, ref):
+        """Decode a blob back into the value it was made from"""
+        with self.open(ref) as view:
+            return json.loads(view[:])
+
+    def exists(self, digest):
+        return os.path.exists(self.path(digest))
+
+_store = None
+_store_lock = threading.Lock()
+
+def get_blob_store():
+    """Process-wide store built from Config"""
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = BlobStore()
+        return _store
@@ -0,0 +1,41 @@
+"""
+Process-wide shared connections
+Every QueueManager, Worker and API handler in a process reuses the same
+Redis connection pool and HTTP session instead of opening its own.
+"""
+
+import threading
+
+_lock = threading.Lock()
+_redis_pools = {}
+_http_session = None
+
+def get_redis_client(host, port, db=0, password=None):
+    """Redis client backed by a pool shared per (host, port, db)"""
+    import redis
+    
+    key = (host, port, db, password)
+    pool = _redis_pools.get(key)
+    if pool is None:
+        with _lock:
+            pool = _redis_pools.get(key)
+            if pool is None:
+                pool = redis.ConnectionPool(
+                    host=host,
+                    port=port,
+                    db=db,
+                    password=password,
+                    decode_responses=True
+                )
+                _redis_pools[key] = pool
+    return redis.Redis(connection_pool=pool)
+
+def get_http_session():
+    """requests.Session with keep-alive, created on first use"""
+    global _http_session
+    if _http_session is None:
+        with _lock:
+            if _http_session is None:
+                import requests
+                _http_session = requests.Session()
+    return _http_session
@@ -0,0 +1,79 @@
+"""
+Job update fan-out for long-poll and SSE clients
+
+One background thread per process listens to the backend's update
+feed and hands each update to the local waiters for that job, so a
+waiting client costs a queue object rather than a DB or Redis poll.
+"""
+
+import queue
+import threading
+import time
+from workers.logs import get_logger
+
+log = get_logger('events')
+
+# Statuses after which a job will not change again
+FINAL_STATUSES = ('completed', 'failed', 'cancelled')
+
+class JobEventHub:
+    def __init__(self, backend):
+        self.backend = backend
+        self._waiters = {}  # job_id -> set of queue.Queue
+        self._listeners = []  # callables taking (job_id, status) for every update
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def start(self):
+        """Start the listener thread (idempotent)"""
+        if self._thread and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread and self._thread.is_alive():
+                return
+            self._thread = threading.Thread(target=self._listen, daemon=True)
+            self._thread.start()
+
+    def _listen(self):
+        while True:
+            try:
+                for job_id, status in self.backend.listen_updates():
+                    self._dispatch(job_id, status)
+            except Exception as e:
+                log.warning('job update listener error, reconnecting', error=str(e))
+                time.sleep(1)
+
+    def _dispatch(self, job_id, status):
+        with self._lock:
+            waiters = list(self._waiters.get(job_id, ()))
+        for waiter in waiters:
+            waiter.put(status)
+        for listener in self._listeners:
+            try:
+                listener(job_id, status)
+            except Exception as e:
+                log.warning('job update listener failed', job_id=job_id, listener=repr(listener), error=str(e))
+
+    def add_listener(self, callback):
+        """Call callback(job_id, status) for every update of any job
+
+        Does not start the listener thread; call start() once the
+        process is serving (see subscribe).
+        """
+        self._listeners.append(callback)
+
+    def subscribe(self, job_id):
+        """Queue that receives every status update for job_id"""
+        self.start()
+        waiter = queue.Queue()
+        with self._lock:
+            self._waiters.setdefault(job_id, set()).add(waiter)
+        return waiter
+
+    def unsubscribe(self, job_id, waiter):
+        with self._lock:
+            waiters = self._waiters.get(job_id)
+            if waiters:
+                waiters.discard(waiter)
+                if not waiters:
+                    del self._waiters[job_id]
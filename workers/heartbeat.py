@@ -0,0 +1,97 @@
+"""
+Worker heartbeats - each worker reports that it is alive, what it is
+running and how fast, and reaps workers that have gone quiet
+"""
+
+import os
+import resource
+import socket
+import threading
+import time
+from datetime import datetime
+from workers.logs import get_logger
+from config import Config
+
+log = get_logger('heartbeat')
+
+class Heartbeat:
+    def __init__(self, worker, interval=None, ttl=None):
+        self.worker = worker
+        self.interval = interval or Config.HEARTBEAT_INTERVAL
+        self.ttl = ttl or Config.HEARTBEAT_TTL
+        self.started_at = datetime.now().isoformat()
+
+        self._stop = threading.Event()
+        self._thread = None
+        self._last = (time.monotonic(), 0, _cpu_seconds())
+
+    def start(self):
+        """Beat now, then every `interval` seconds on a background thread"""
+        self.beat()
+        self._thread = threading.Thread(target=self._run, name=f"heartbeat-{self.worker.worker_id}", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Stop beating; leave the registry unless jobs are still in flight
+
+        A worker stopped mid-job stays registered, so once its heartbeat
+        expires another worker recovers those jobs.
+        """
+        self._stop.set()
+        if self._thread and self._thread is not threading.current_thread():
+            self._thread.join(timeout=self.interval)
+        if not (self.worker.current_jobs or self.worker.prefetched):
+            self.worker.queue_manager.unregister_worker(self.worker.worker_id)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.beat()
+                self.worker.queue_manager.reap_dead_workers()
+            except Exception as e:
+                log.warning('heartbeat failed', worker=self.worker.worker_id, error=str(e))
+
+    def beat(self):
+        self.worker.queue_manager.record_heartbeat(self.worker.worker_id, self.snapshot(), self.ttl)
+
+    def snapshot(self):
+        """What the worker reports on each heartbeat"""
+        worker = self.worker
+        now, processed, cpu = time.monotonic(), worker.jobs_processed, _cpu_seconds()
+        last_time, last_processed, last_cpu = self._last
+        self._last = (now, processed, cpu)
+        elapsed = max(now - last_time, 1e-6)
+
+        current = list(worker.current_jobs)
+        return {
+            'worker_id': worker.worker_id,
+            'hostname': socket.gethostname(),
+            'pid': os.getpid(),
+            'queues': worker.queues,
+            'tasks': worker.tasks,
+            'started_at': self.started_at,
+            'last_heartbeat': datetime.now().isoformat(),
+            'current_jobs': [
+                {'id': job.id, 'task_name': job.task_name, 'started_at': job.started_at}
+                for job in current
+            ],
+            # Everything this worker has taken off the queue and not finished
+            'in_flight': [job.id for job in current + list(worker.prefetched)],
+            'jobs_processed': processed,
+            'jobs_failed': worker.jobs_failed,
+            'jobs_per_minute': round((processed - last_processed) * 60 / elapsed, 2),
+            'cpu_percent': round((cpu - last_cpu) * 100 / elapsed, 1),
+            'memory_rss_mb': round(_rss_bytes() / (1024 * 1024), 1)
+        }
+
+def _cpu_seconds():
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    return usage.ru_utime + usage.ru_stime
+
+def _rss_bytes():
+    """Current resident memory (Linux), else the peak"""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError):
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
@@ -2,16 +2,43 @@ import json
 import uuid
 from datetime import datetime
 from enum import Enum
+from workers import blobs
 
 class JobStatus(Enum):
     PENDING = "pending"
+    WAITING = "waiting"  # stored but not queued yet (a reducer waiting for its partial jobs)
     PROCESSING = "processing"
     COMPLETED = "completed"
     FAILED = "failed"
     RETRYING = "retrying"
+    CANCELLED = "cancelled"
+
+def _payload(name):
+    """Job field that may hold a blob reference, loaded on first read"""
+    stored_name = f'_{name}'
+    
+    def get(self):
+        value = getattr(self, stored_name)
+        if not blobs.is_ref(value):
+            return value
+        if name not in self._loaded:
+            self._loaded[name] = blobs.get_blob_store().load(value)
+        return self._loaded[name]
+    
+    def set(self, value):
+        setattr(self, stored_name, value)
+        self._loaded.pop(name, None)
+    
+    return property(get, set)
 
 class Job:
-    def __init__(self, task_name, task_data, priority=1, max_retries=3):
+    # Large values live in the blob store (see offload)
+    task_data = _payload('task_data')
+    result = _payload('result')
+    
+    def __init__(self, task_name, task_data, priority=1, max_retries=3,
+                 soft_time_limit=None, time_limit=None, tenant=None):
+        self._loaded = {}
         self.id = str(uuid.uuid4())  # Unique job ID
         self.task_name = task_name
         self.task_data = task_data
@@ -24,13 +51,25 @@ class Job:
         self.completed_at = None
         self.result = None
         self.error = None
+        # Per-job overrides of the task's registered time limits (seconds)
+        self.soft_time_limit = soft_time_limit
+        self.time_limit = time_limit
+        # Submitting team/customer; jobs are scheduled fairly across tenants
+        self.tenant = tenant
+        # Trace context ({'trace_id', 'span_id', 'enqueued_at'}, see workers.tracing)
+        self.trace = None
+        # Reducer queued once this partial job and its siblings finish
+        # (see QueueManager.add_map_reduce)
+        self.reducer = None
+        # Queue the job was last dequeued from (set by QueueManager, not stored)
+        self.queue_name = None
     
     def to_dict(self):
         """Convert job to dictionary for storage"""
         return {
             'id': self.id,
             'task_name': self.task_name,
-            'task_data': self.task_data,
+            'task_data': self._task_data,
             'priority': self.priority,
             'max_retries': self.max_retries,
             'retry_count': self.retry_count,
@@ -38,10 +77,29 @@ class Job:
             'created_at': self.created_at,
             'started_at': self.started_at,
             'completed_at': self.completed_at,
-            'result': self.result,
-            'error': self.error
+            'result': self._result,
+            'error': self.error,
+            'soft_time_limit': self.soft_time_limit,
+            'time_limit': self.time_limit,
+            'tenant': self.tenant,
+            'trace': self.trace,
+            'reducer': self.reducer
         }
     
+    def stored(self, name):
+        """'task_data' or 'result' as stored: the value or its blob reference"""
+        return getattr(self, f'_{name}')
+    
+    def offload(self, store=None):
+        """Move a large task_data/result into the blob store, keeping a reference"""
+        store = store or blobs.get_blob_store()
+        for name in ('task_data', 'result'):
+            value = self.stored(name)
+            ref = store.offload(value)
+            if ref is not value:
+                setattr(self, f'_{name}', ref)
+                self._loaded[name] = value
+    
     def to_json(self):
         """Convert job to JSON string"""
         return json.dumps(self.to_dict())
@@ -54,7 +112,10 @@ class Job:
             task_name=data['task_name'],
             task_data=data['task_data'],
             priority=data['priority'],
-            max_retries=data['max_retries']
+            max_retries=data['max_retries'],
+            soft_time_limit=data.get('soft_time_limit'),
+            time_limit=data.get('time_limit'),
+            tenant=data.get('tenant')
         )
         job.id = data['id']
         job.retry_count = data['retry_count']
@@ -64,6 +125,25 @@ class Job:
         job.completed_at = data['completed_at']
         job.result = data['result']
         job.error = data['error']
+        job.trace = data.get('trace')
+        job.reducer = data.get('reducer')
+        return job
+    
+    @staticmethod
+    def from_row(row, payload=None):
+        """Create job object from a jobs-table row; fields the table lacks come from the payload"""
+        if payload:
+            job = Job.from_json(payload)
+        else:
+            job = Job(row['task_name'], row['task_data'], priority=row['priority'], max_retries=row['max_retries'])
+            job.id = row['id']
+            job.created_at = row['created_at']
+        job.retry_count = row['retry_count']
+        job.status = row['status']
+        job.started_at = row['started_at']
+        job.completed_at = row['completed_at']
+        job.result = row['result']
+        job.error = row['error']
         return job
     
     def __repr__(self):
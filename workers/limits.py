@@ -0,0 +1,103 @@
+"""
+Task time limits and cancellation
+
+TaskGuard wraps a task call. A SIGALRM tick checks the deadlines and a
+background thread polls for cancellation requests, so a hung task is
+interrupted instead of blocking the worker forever.
+"""
+
+import signal
+import threading
+import time
+from workers.logs import get_logger
+
+log = get_logger('limits')
+
+class SoftTimeLimitExceeded(Exception):
+    """Raised inside the task at the soft limit - the task may clean up"""
+    pass
+
+class TimeLimitExceeded(BaseException):
+    """Raised at the hard limit - not caught by `except Exception`"""
+    pass
+
+class JobCancelled(BaseException):
+    """Raised when the job was cancelled while running"""
+    pass
+
+class WorkerShutdown(BaseException):
+    """Raised inside a running task when its worker is forced to stop"""
+    pass
+
+class TaskGuard:
+    def __init__(self, soft_time_limit=None, time_limit=None, is_cancelled=None,
+                 tick=0.25, cancel_poll_interval=1.0):
+        self.soft_time_limit = soft_time_limit
+        self.time_limit = time_limit
+        self.is_cancelled = is_cancelled
+        self.tick = tick
+        self.cancel_poll_interval = cancel_poll_interval
+        
+        self._started = None
+        self._soft_raised = False
+        self._cancel_requested = threading.Event()
+        self._done = threading.Event()
+        self._previous_handler = None
+        self._active = False
+
+    @property
+    def enabled(self):
+        return bool(self.soft_time_limit or self.time_limit or self.is_cancelled)
+
+    def __enter__(self):
+        if not self.enabled:
+            return self
+        if threading.current_thread() is not threading.main_thread():
+            log.warning('time limits need the main thread, running task unguarded')
+            return self
+        
+        self._started = time.monotonic()
+        self._active = True
+        self._previous_handler = signal.signal(signal.SIGALRM, self._on_tick)
+        signal.setitimer(signal.ITIMER_REAL, self.tick, self.tick)
+        
+        if self.is_cancelled:
+            threading.Thread(target=self._poll_cancel, daemon=True).start()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if self._active:
+            signal.setitimer(signal.ITIMER_REAL, 0)
+            signal.signal(signal.SIGALRM, self._previous_handler or signal.SIG_DFL)
+            self._active = False
+        self._done.set()
+        return False
+
+    def _poll_cancel(self):
+        # Runs off the main thread so the signal handler never does I/O
+        while not self._done.wait(self.cancel_poll_interval):
+            try:
+                if self.is_cancelled():
+                    self._cancel_requested.set()
+                    return
+            except Exception as e:
+                log.warning('cancel check failed', error=str(e))
+
+    def _on_tick(self, signum, frame):
+        if not self._active:
+            return
+        elapsed = time.monotonic() - self._started
+        
+        if self._cancel_requested.is_set():
+            self._stop()
+            raise JobCancelled("Job was cancelled")
+        if self.time_limit and elapsed >= self.time_limit:
+            self._stop()
+            raise TimeLimitExceeded(f"Hard time limit of {self.time_limit}s exceeded")
+        if self.soft_time_limit and elapsed >= self.soft_time_limit and not self._soft_raised:
+            self._soft_raised = True
+            raise SoftTimeLimitExceeded(f"Soft time limit of {self.soft_time_limit}s exceeded")
+
+    def _stop(self):
+        signal.setitimer(signal.ITIMER_REAL, 0)
+        self._active = False
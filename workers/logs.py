@@ -0,0 +1,187 @@
+"""
+Structured logging for the queue and workers
+
+Loggers from get_logger() hand records to an in-memory queue; a single
+listener thread formats them (JSON lines by default) and writes them to
+stdout. Formatting, payload serialization and the write itself all happen
+on that thread, and when the output backs up the queue fills and new
+records are dropped (counted in dropped()) instead of stalling a job.
+
+    log = get_logger('worker')
+    log.info('job completed', job=job, result=result)
+
+Keyword arguments become fields of the record. Values longer than
+Config.LOG_MAX_FIELD characters are cut, so a large task_data or result
+costs the same as a small one. Lines passed a job= are per-job lines:
+below WARNING they are sampled by job ID (Config.LOG_JOB_SAMPLE_RATE),
+so a sampled job logs its whole life and the others only their problems.
+"""
+
+import atexit
+import json
+import logging
+import logging.handlers
+import queue
+import sys
+import threading
+import zlib
+from datetime import datetime, timezone
+from config import Config
+
+ROOT_LOGGER = 'jobqueue'
+
+# Keyword arguments Logger.log understands; any other one is a field
+_LOGGING_KWARGS = ('exc_info', 'stack_info', 'stacklevel', 'extra')
+
+_encoder = json.JSONEncoder(default=str)
+
+def truncate(value, limit):
+    """value, or its JSON cut to `limit` characters when longer
+
+    Serializes incrementally and stops as soon as the limit is passed,
+    so the cost does not grow with the size of the value.
+    """
+    if value is None or isinstance(value, (bool, int, float)):
+        return value
+    if isinstance(value, str):
+        if len(value) <= limit:
+            return value
+        return f"{value[:limit]}... ({len(value)} chars)"
+    size, parts = 0, []
+    for chunk in _encoder.iterencode(value):
+        parts.append(chunk)
+        size += len(chunk)
+        if size > limit:
+            return ''.join(parts)[:limit] + '... (truncated)'
+    return value
+
+def job_sampled(job_id, rate=None):
+    """Whether per-job lines of this job are logged (stable for a job ID)"""
+    rate = Config.LOG_JOB_SAMPLE_RATE if rate is None else rate
+    if rate >= 1:
+        return True
+    if rate <= 0:
+        return False
+    return zlib.crc32(str(job_id).encode()) / 2**32 < rate
+
+# ============================================================
+# Formatters
+# ============================================================
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line: ts, level, logger, msg, then the fields"""
+    def __init__(self, max_field=None):
+        super().__init__()
+        self.max_field = max_field or Config.LOG_MAX_FIELD
+
+    def format(self, record):
+        entry = {
+            'ts': datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec='milliseconds'),
+            'level': record.levelname.lower(),
+            'logger': record.name,
+            'msg': record.getMessage()
+        }
+        for key, value in getattr(record, 'fields', {}).items():
+            entry[key] = truncate(value, self.max_field)
+        if record.exc_info:
+            entry['exception'] = self.formatException(record.exc_info)
+        return _encoder.encode(entry)
+
+class TextFormatter(logging.Formatter):
+    """'time LEVEL logger: msg key=value ...' for reading in a terminal"""
+    def __init__(self, max_field=None):
+        super().__init__('%(asctime)s %(levelname)-7s %(name)s: %(message)s')
+        self.max_field = max_field or Config.LOG_MAX_FIELD
+
+    def format(self, record):
+        line = super().format(record)
+        fields = ' '.join(
+            f"{key}={_encoder.encode(truncate(value, self.max_field))}"
+            for key, value in getattr(record, 'fields', {}).items()
+        )
+        return f"{line} {fields}" if fields else line
+
+FORMATTERS = {
+    'json': JsonFormatter,
+    'text': TextFormatter
+}
+
+# ============================================================
+# Async handler
+# ============================================================
+
+class DroppingQueueHandler(logging.handlers.QueueHandler):
+    """Puts records on the listener's queue as they are, never waiting
+
+    The queue is a SimpleQueue, whose put is safe to call from signal
+    handlers (the worker logs from its SIGTERM handler); max_size bounds
+    it approximately, and records beyond it are dropped.
+    """
+    def __init__(self, log_queue, max_size):
+        super().__init__(log_queue)
+        self.max_size = max_size
+        self.dropped = 0
+
+    def prepare(self, record):
+        # Formatting happens on the listener thread, not the caller's
+        return record
+
+    def enqueue(self, record):
+        if self.queue.qsize() >= self.max_size:
+            self.dropped += 1
+            return
+        self.queue.put_nowait(record)
+
+class StructuredLogger(logging.LoggerAdapter):
+    """Logger whose keyword arguments become fields, with per-job sampling"""
+    def __init__(self, logger):
+        super().__init__(logger, {})
+
+    def log(self, level, msg, *args, job=None, **kwargs):
+        if not self.isEnabledFor(level):
+            return
+        if job is not None and level < logging.WARNING and not job_sampled(job.id):
+            return
+        fields = {key: kwargs.pop(key) for key in list(kwargs) if key not in _LOGGING_KWARGS}
+        if job is not None:
+            fields = {'job_id': job.id, 'task': job.task_name, **fields}
+        kwargs['extra'] = {**kwargs.get('extra', {}), 'fields': fields}
+        self.logger.log(level, msg, *args, **kwargs)
+
+_handler = None
+_listener = None
+_lock = threading.Lock()
+
+def configure(level=None, fmt=None, stream=None):
+    """Route the 'jobqueue' loggers through the async handler (once per process)"""
+    global _handler, _listener
+    with _lock:
+        if _handler is not None:
+            return _handler
+        fmt = fmt or Config.LOG_FORMAT
+        if fmt not in FORMATTERS:
+            raise ValueError(f"Unknown log format: {fmt}")
+        output = logging.StreamHandler(stream or sys.stdout)
+        output.setFormatter(FORMATTERS[fmt]())
+
+        log_queue = queue.SimpleQueue()
+        _handler = DroppingQueueHandler(log_queue, Config.LOG_QUEUE_SIZE)
+        root = logging.getLogger(ROOT_LOGGER)
+        root.setLevel((level or Config.LOG_LEVEL).upper())
+        root.addHandler(_handler)
+        root.propagate = False
+
+        _listener = logging.handlers.QueueListener(log_queue, output)
+        _listener.start()
+        # Write out what is still queued when the process exits
+        atexit.register(_listener.stop)
+        return _handler
+
+def get_logger(name):
+    """Structured logger 'jobqueue.<name>'"""
+    configure()
+    return StructuredLogger(logging.getLogger(f"{ROOT_LOGGER}.{name}"))
+
+def dropped():
+    """Records dropped so far because the log output could not keep up"""
+    return _handler.dropped if _handler is not None else 0
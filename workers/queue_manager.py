@@ -1,20 +1,34 @@
-import redis
-from config import Config
+import json
+import time
+from datetime import datetime
 from workers.job import Job, JobStatus
+from workers.backends import create_backend
+from workers.events import JobEventHub, FINAL_STATUSES
+from workers.admission import AdmissionPolicy, AdmissionRejected
+from workers.routing import TaskRouter
+from workers.blobs import get_blob_store
+from workers.tracing import get_tracer
+from workers.logs import get_logger
+from workers import analytics
 from database.db_manager import DatabaseManager
+from config import Config
+
+log = get_logger('queue')
 
 class QueueManager:
-    def __init__(self):
-        # Connect to Redis
-        self.redis_client = redis.Redis(
-            host=Config.REDIS_HOST,
-            port=Config.REDIS_PORT,
-            db=Config.REDIS_DB,
-            decode_responses=True
-        )
+    def __init__(self, backend=None, consumer=None, db=None, admission=None, router=None,
+                 blobs=None, tracer=None):
+        # Connect to the queue backend (Redis unless configured otherwise)
+        self.backend = backend or create_backend(consumer=consumer)
+        
+        # Connect to Database (engine is shared per URL)
+        self.db = db or DatabaseManager()
+        
+        # Status updates for long-poll/SSE waiters (listener starts on first use)
+        self.events = JobEventHub(self.backend)
         
-        # Connect to Database
-        self.db = DatabaseManager()
+        # Submission limits (see Config.MAX_QUEUE_DEPTH and friends)
+        self.admission = admission or AdmissionPolicy()
         
         # Queue names based on priority
         self.queues = {
@@ -23,77 +37,519 @@ class QueueManager:
             'low': 'queue:low_priority'
         }
         
-        # Job storage (hash map in Redis)
-        self.jobs_key = 'jobs'
+        # Large task_data/results are kept out of job payloads
+        self.blobs = blobs or get_blob_store()
+        
+        # Spans for each step a job goes through (see workers.tracing)
+        self.tracer = tracer or get_tracer()
+        
+        # Dedicated queues for routed tasks (see Config.TASK_ROUTES)
+        self.router = router or TaskRouter()
+        for queue_name in self.router.queues:
+            self.queues.setdefault(queue_name, f"queue:{queue_name}")
     
-    def add_job(self, job, queue_name='default'):
-        """Add a job to the queue"""
-        try:
-            # Store job details in Redis hash
-            self.redis_client.hset(
-                self.jobs_key, 
-                job.id, 
-                job.to_json()
+    def add_job(self, job, queue_name='default', enforce_limits=False):
+        """Add a job to the queue
+
+        Tasks with a routing rule go to their dedicated queue whatever
+        queue was asked for. With enforce_limits, raises AdmissionRejected
+        when the queue, task or submission rate is over its configured
+        limit. Internal re-enqueues (retries, requeues) skip the check.
+        """
+        queue_name = self._route(job.task_name, queue_name)
+        queue_key = self.queues[queue_name]
+        
+        if enforce_limits and self.admission.enabled:
+            admitted, reason, retry_after = self.backend.admit(
+                job.id, job.task_name, queue_key, list(self.queues.values()),
+                self.admission.limits_for(queue_name, job.task_name)
             )
+            if not admitted:
+                raise AdmissionRejected(reason, retry_after)
+        
+        try:
+            job.offload(self.blobs)
+            self.tracer.mark_enqueued(job)
             
-            # Add job ID to the appropriate queue (list)
-            queue_key = self.queues.get(queue_name, self.queues['default'])
-            self.redis_client.rpush(queue_key, job.id)
+            # Store job details and push its ID onto the queue atomically
+            with self.tracer.span('enqueue', job, queue=queue_name):
+                self.backend.enqueue(job.id, job.to_json(), queue_key)
             
             # Save to database
-            self.db.save_job(job, queue_name)
+            with self.tracer.span('persist', job, status=job.status):
+                self.db.save_job(job, queue_name)
             
-            print(f"✅ Job {job.id} added to {queue_name} queue")
+            log.info('job queued', job=job, queue=queue_name)
             return job.id
             
         except Exception as e:
-            print(f"❌ Error adding job: {e}")
+            log.error('error adding job', job_id=job.id, task=job.task_name, error=str(e))
             return None
     
+    def _route(self, task_name, queue_name):
+        """Queue a task's jobs go to when `queue_name` is asked for"""
+        queue_name = self.router.route(task_name) or queue_name
+        return queue_name if queue_name in self.queues else 'default'
+    
+    def add_map_reduce(self, job, partitions, queue_name='default', enforce_limits=False):
+        """Split an analyze_data job into partial jobs plus a reducer
+
+        Partial jobs (analyze_data_partial) each summarize a slice of the
+        dataset; the reducer (analyze_data_reduce) merges their results.
+        The reducer is stored as 'waiting' and queued by whichever partial
+        job finishes last (see _release_reducers), so it never occupies a
+        worker while they run. `job` itself is not queued: it supplies
+        the options shared by all of them.
+        With enforce_limits the whole fan-out, reducer included, is
+        admitted or rejected at once. Raises ValueError for more than MAP_REDUCE_MAX_PARTITIONS
+        partitions; if queueing fails part way, the jobs already queued
+        are cancelled.
+        Returns (reducer job ID, partial job IDs).
+        """
+        if not 1 <= partitions <= Config.MAP_REDUCE_MAX_PARTITIONS:
+            raise ValueError(f"partitions must be between 1 and {Config.MAP_REDUCE_MAX_PARTITIONS}")
+        
+        def child(task_name, task_data):
+            part = Job(
+                task_name=task_name,
+                task_data=task_data,
+                priority=job.priority,
+                max_retries=job.max_retries,
+                soft_time_limit=job.soft_time_limit,
+                time_limit=job.time_limit,
+                tenant=job.tenant
+            )
+            # Same trace as the submission
+            part.trace = dict(job.trace) if job.trace else None
+            return part
+        
+        partials = [child('analyze_data_partial', task_data)
+                    for task_data in analytics.split_task_data(job.task_data, partitions)]
+        if not partials:
+            raise ValueError("No data to split")
+        partial_ids = [partial.id for partial in partials]
+        options = {key: value for key, value in job.task_data.items()
+                   if key in ('analyses', 'percentiles', 'bins')}
+        reducer = child('analyze_data_reduce', dict(options, partials=partial_ids))
+        reducer.status = JobStatus.WAITING.value
+        for partial in partials:
+            partial.reducer = reducer.id
+        
+        partial_queue = self._route('analyze_data_partial', queue_name)
+        if enforce_limits and self.admission.enabled:
+            admitted, reason, retry_after = self.backend.admit(
+                reducer.id, 'analyze_data_partial', self.queues[partial_queue], list(self.queues.values()),
+                self.admission.limits_for(partial_queue, 'analyze_data_partial'), count=len(partials) + 1
+            )
+            if not admitted:
+                raise AdmissionRejected(reason, retry_after)
+        
+        # Barrier and reducer exist before any partial job can finish
+        self.backend.barrier_create(reducer.id, partial_ids)
+        queued = []
+        try:
+            reducer.offload(self.blobs)
+            self.backend.save_job(reducer.id, reducer.to_json())
+            if not self.db.save_job(reducer, self._route(reducer.task_name, queue_name)):
+                raise Exception("Could not save reducer job")
+            for partial in partials:
+                if not self.add_job(partial, partial_queue):
+                    raise Exception(f"Could not queue partial job {len(queued) + 1}")
+                queued.append(partial)
+        except Exception:
+            self.backend.barrier_delete(reducer.id)
+            for stale in [reducer] + queued:
+                self.cancel_job(stale.id)
+            raise
+        return reducer.id, partial_ids
+    
+    def _release_reducers(self, jobs):
+        """Queue the reducer of each finished partial job that was the last one"""
+        for job in jobs:
+            if not job.reducer or job.status not in FINAL_STATUSES:
+                continue
+            if not self.backend.barrier_release(job.reducer, job.id):
+                continue
+            reducer = self.get_job(job.reducer)
+            if not reducer or reducer.status != JobStatus.WAITING.value:
+                continue
+            # The payload does not record its queue; the database row does
+            queue_name = (self.db.get_job(reducer.id) or {}).get('queue_name') or 'default'
+            reducer.status = JobStatus.PENDING.value
+            self.add_job(reducer, queue_name)
+    
     def get_job(self, job_id):
         """Retrieve job details by ID"""
-        job_json = self.redis_client.hget(self.jobs_key, job_id)
+        job_json = self.backend.get_job(job_id)
         if job_json:
             return Job.from_json(job_json)
         return None
     
+    def lookup_jobs(self, job_ids, fields=None):
+        """Current state of many jobs: ({job_id: job dict}, [IDs not found])
+
+        The queue backend answers in one round trip (pipelined HMGETs on
+        Redis). Jobs it no longer holds, or lacking a requested field
+        that only the database keeps (execution_time, worker_id,
+        queue_name), come from one database session. With `fields`, each
+        job dict is cut down to its id and those fields.
+        """
+        job_ids = list(dict.fromkeys(job_ids))
+        found, rest = {}, []
+        for job_id, job_json in zip(job_ids, self.backend.get_jobs(job_ids)):
+            job = json.loads(job_json) if job_json else None
+            if job and not (fields and any(field not in job for field in fields)):
+                found[job_id] = job
+            else:
+                rest.append(job_id)
+        for job in self.db.get_jobs(rest):
+            found[job['id']] = job
+        
+        if fields:
+            found = {
+                job_id: {'id': job_id, **{field: job.get(field) for field in fields}}
+                for job_id, job in found.items()
+            }
+        return found, [job_id for job_id in job_ids if job_id not in found]
+    
     def update_job(self, job, worker_id=None):
-        """Update job details in Redis and Database"""
-        # Update Redis
-        self.redis_client.hset(
-            self.jobs_key,
-            job.id,
-            job.to_json()
-        )
+        """Update job details in the queue backend and Database"""
+        job.offload(self.blobs)
+        
+        with self.tracer.span('persist', job, status=job.status):
+            # Update queue backend
+            self.backend.save_job(job.id, job.to_json())
+            
+            # Update Database
+            self.db.save_job(job, worker_id=worker_id)
         
-        # Update Database
-        self.db.save_job(job, worker_id=worker_id)
+        self._release_reducers([job])
+        
+        # Wake up clients waiting on this job
+        try:
+            self.backend.publish_update(job.id, job.status)
+        except Exception as e:
+            log.warning('could not publish update', job_id=job.id, error=str(e))
+    
+    def update_jobs(self, jobs, worker_id=None):
+        """update_job() for many jobs: one backend batch, one DB commit"""
+        if not jobs:
+            return
+        for job in jobs:
+            job.offload(self.blobs)
+        start = time.time()
+        self.backend.save_jobs([(job.id, job.to_json()) for job in jobs])
+        self.db.save_jobs(jobs, worker_id=worker_id)
+        end = time.time()
+        for job in jobs:
+            self.tracer.record('persist', job, start, end, status=job.status, batch=len(jobs))
+        self._release_reducers(jobs)
+        try:
+            self.backend.publish_updates([(job.id, job.status) for job in jobs])
+        except Exception as e:
+            log.warning('could not publish updates', count=len(jobs), error=str(e))
     
     def get_next_job(self, queue_name='default'):
         """Get the next job from queue (FIFO)"""
-        queue_key = self.queues.get(queue_name, self.queues['default'])
+        return self.get_next_job_from_queues([queue_name])
+    
+    def get_next_job_from_queues(self, queue_names):
+        """Pop and fetch the next job from the first non-empty queue (FIFO)"""
+        queue_keys = [self.queues.get(name, self.queues['default']) for name in queue_names]
+        
+        while True:
+            start = time.time()
+            result = self.backend.dequeue(queue_keys)
+            if not result:
+                return None
+            queue_key, job_json = result
+            job = Job.from_json(job_json)
+            if job.status not in FINAL_STATUSES:
+                job.queue_name = self._queue_name(queue_key)
+                self.tracer.dequeued(job, start, time.time(), queue=job.queue_name)
+                return job
+            # Cancelled while queued (or already finished), drop it
+            self.backend.ack(job.id)
+    
+    def get_next_jobs_from_queues(self, queue_names, count):
+        """Fetch up to `count` jobs in one read, highest priority first"""
+        queue_keys = [self.queues.get(name, self.queues['default']) for name in queue_names]
+        jobs = []
+        start = time.time()
+        popped = self.backend.dequeue_batch(queue_keys, count)
+        end = time.time()
+        for queue_key, job_json in popped:
+            job = Job.from_json(job_json)
+            if job.status in FINAL_STATUSES:
+                self.backend.ack(job.id)
+                continue
+            job.queue_name = self._queue_name(queue_key)
+            self.tracer.dequeued(job, start, end, queue=job.queue_name, batch=len(popped))
+            jobs.append(job)
+        return jobs
+    
+    def _queue_name(self, queue_key):
+        for name, key in self.queues.items():
+            if key == queue_key:
+                return name
+        return 'default'
+    
+    def ack_job(self, job):
+        """Acknowledge a dequeued job once the worker is done with it"""
+        self.backend.ack(job.id)
+    
+    def requeue_jobs(self, jobs):
+        """Put dequeued but unfinished jobs back on the queue they came from
+
+        Used when a worker shuts down: no attempt is counted against the
+        jobs, and each delivery is swapped for a new queue entry
+        atomically (see QueueBackend.requeue). Jobs cancelled meanwhile
+        are dropped instead.
+        """
+        requeued, items = [], []
+        for job in jobs:
+            if self.backend.is_cancel_requested(job.id):
+                self.backend.ack(job.id)
+                continue
+            job.status = JobStatus.PENDING.value
+            job.started_at = None
+            job.offload(self.blobs)
+            self.tracer.mark_enqueued(job)
+            queue_name = self.router.route(job.task_name) or job.queue_name
+            items.append((job.id, job.to_json(), self.queues.get(queue_name, self.queues['default'])))
+            requeued.append(job)
+        if not requeued:
+            return 0
         
-        # Pop job ID from left (FIFO - First In First Out)
-        job_id = self.redis_client.lpop(queue_key)
+        self.backend.requeue(items)
+        self.db.save_jobs(requeued)
+        try:
+            self.backend.publish_updates([(job.id, job.status) for job in requeued])
+        except Exception as e:
+            log.warning('could not publish updates', count=len(requeued), error=str(e))
+        return len(requeued)
+    
+    def get_pending_summary(self):
+        """In-flight (unacknowledged) jobs per queue and consumer"""
+        keys_to_names = {key: name for name, key in self.queues.items()}
+        summary = self.backend.pending_summary(list(self.queues.values()))
+        return {keys_to_names.get(key, key): consumers for key, consumers in summary.items()}
+    
+    def get_tenant_backlog(self):
+        """Waiting jobs per queue and tenant ('' = submitted without a tenant)"""
+        keys_to_names = {key: name for name, key in self.queues.items()}
+        backlog = self.backend.tenant_backlog(list(self.queues.values()))
+        return {keys_to_names.get(key, key): tenants for key, tenants in backlog.items()}
+    
+    def cancel_job(self, job_id):
+        """Cancel a queued or running job
+
+        Returns the job's new status ('cancelled' or 'cancelling'),
+        or None if the job does not exist or has already finished
+        """
+        job = self.get_job(job_id)
+        if not job:
+            return None
+        if job.status in (JobStatus.COMPLETED.value, JobStatus.FAILED.value, JobStatus.CANCELLED.value):
+            return None
         
-        if job_id:
-            return self.get_job(job_id)
-        return None
+        # A running job sees this flag; a queued one is skipped on dequeue
+        self.backend.request_cancel(job_id)
+        
+        if job.status == JobStatus.PROCESSING.value:
+            return 'cancelling'
+        
+        job.status = JobStatus.CANCELLED.value
+        job.completed_at = datetime.now().isoformat()
+        self.update_job(job)
+        return JobStatus.CANCELLED.value
+    
+    def is_cancel_requested(self, job_id):
+        """Check whether a job has been cancelled"""
+        return self.backend.is_cancel_requested(job_id)
+    
+    def dead_letter(self, job, queue_name='default'):
+        """Park a permanently failed job in the dead-letter queue"""
+        failed_at = time.time()
+        entry = {
+            'job_id': job.id,
+            'task_name': job.task_name,
+            'queue': queue_name,
+            'error': job.error,
+            'retry_count': job.retry_count,
+            'failed_at': datetime.fromtimestamp(failed_at).isoformat()
+        }
+        self.backend.dlq_add(job.id, job.task_name, failed_at, json.dumps(entry))
+    
+    def get_dead_letters(self, task_name=None, start=None, end=None, offset=0, limit=100):
+        """Page through dead-lettered jobs, newest first"""
+        entries = self.backend.dlq_range(
+            task_name, _timestamp(start), _timestamp(end),
+            offset=offset, count=limit, newest_first=True
+        )
+        return [json.loads(entry) for entry in entries]
+    
+    def get_dead_letter_counts(self):
+        """Dead-lettered jobs per task"""
+        return self.backend.dlq_counts()
+    
+    def _select_dead_letters(self, task_name, start, end, error_contains, limit, batch_size):
+        """Yield batches of matching entries, oldest first
+
+        The caller removes each batch from the DLQ before asking for the
+        next one, so only entries that did not match are skipped over.
+        """
+        offset = 0
+        selected_total = 0
+        while limit is None or selected_total < limit:
+            entries = [json.loads(e) for e in self.backend.dlq_range(
+                task_name, _timestamp(start), _timestamp(end), offset=offset, count=batch_size
+            )]
+            if not entries:
+                return
+            selected = [
+                e for e in entries
+                if not error_contains or error_contains in (e.get('error') or '')
+            ]
+            if limit is not None:
+                selected = selected[:limit - selected_total]
+            offset += len(entries) - len(selected)
+            selected_total += len(selected)
+            if selected:
+                yield selected
+    
+    def requeue_dead_letters(self, task_name=None, start=None, end=None, error_contains=None,
+                             limit=None, queue_name=None, batch_size=1000):
+        """Put matching dead-lettered jobs back on their queue with fresh retries"""
+        requeued = 0
+        skipped = []
+        for entries in self._select_dead_letters(task_name, start, end, error_contains, limit, batch_size):
+            job_ids = [e['job_id'] for e in entries]
+            payloads = dict(zip(job_ids, self.backend.get_jobs(job_ids)))
+            # Evicted payloads are rebuilt from their rows
+            evicted = [job_id for job_id, job_json in payloads.items() if not job_json]
+            rows = {row['id']: row for row in self.db.get_jobs(evicted)}
+            
+            items = []
+            done = []
+            for entry in entries:
+                job_json, row = payloads[entry['job_id']], rows.get(entry['job_id'])
+                if not job_json and not row:
+                    skipped.append(entry['job_id'])
+                    continue
+                job = Job.from_json(job_json) if job_json else Job.from_row(row)
+                job.status = JobStatus.PENDING.value
+                job.retry_count = 0
+                job.error = None
+                job.started_at = None
+                job.completed_at = None
+                job.result = None
+                target = (self.router.route(job.task_name) or queue_name or entry.get('queue')
+                          or (row or {}).get('queue_name'))
+                queue_key = self.queues.get(target, self.queues['default'])
+                items.append((job.id, job.to_json(), queue_key))
+                done.append((entry['job_id'], entry['task_name']))
+            
+            # One pipeline to enqueue, one to drop the DLQ entries, one UPDATE per batch
+            self.backend.enqueue_many(items)
+            self.backend.dlq_remove(done)
+            self.db.bulk_update_jobs(
+                [job_id for job_id, _, _ in items],
+                status=JobStatus.PENDING.value, retry_count=0, error=None,
+                started_at=None, completed_at=None, result=None, execution_time=None
+            )
+            requeued += len(items)
+        
+        if skipped:
+            # Nothing left to rebuild them from; the entries stay for purge_dead_letters
+            log.warning('dead-lettered jobs not found, left in place', count=len(skipped), job_ids=skipped)
+        log.info('requeued dead-lettered jobs', count=requeued)
+        return requeued
+    
+    def purge_dead_letters(self, task_name=None, start=None, end=None, error_contains=None,
+                           limit=None, batch_size=1000):
+        """Drop matching dead-lettered jobs (they stay 'failed' in the database)"""
+        purged = 0
+        for entries in self._select_dead_letters(task_name, start, end, error_contains, limit, batch_size):
+            self.backend.dlq_remove([(e['job_id'], e['task_name']) for e in entries])
+            self.backend.delete_jobs([e['job_id'] for e in entries])
+            purged += len(entries)
+        
+        log.info('purged dead-lettered jobs', count=purged)
+        return purged
+    
+    def record_heartbeat(self, worker_id, info, ttl):
+        """Store a worker's heartbeat; it is considered dead `ttl` seconds later"""
+        self.backend.heartbeat(worker_id, json.dumps(info), ttl)
+    
+    def get_workers(self):
+        """Registered workers: last heartbeat plus whether it is still alive"""
+        workers = []
+        for worker_id, info_json, alive in self.backend.list_workers():
+            info = json.loads(info_json)
+            info['alive'] = alive
+            workers.append(info)
+        return sorted(workers, key=lambda info: info['worker_id'])
+    
+    def unregister_worker(self, worker_id):
+        """Remove a worker that shut down cleanly"""
+        self.backend.forget_worker(worker_id)
+    
+    def reap_dead_workers(self):
+        """Put jobs held by workers whose heartbeat lapsed back on the queue
+
+        Only one process wins the registry entry of a dead worker, so its
+        jobs are recovered once. Returns the number of jobs recovered.
+        """
+        recovered = 0
+        for worker_id, info_json, alive in self.backend.list_workers():
+            if alive or not self.backend.forget_worker(worker_id):
+                continue
+            job_ids = set(json.loads(info_json).get('in_flight', []))
+            job_ids.update(self.backend.release_consumer(worker_id, list(self.queues.values())))
+            count = sum(1 for job_id in job_ids if self._recover_job(job_id, worker_id))
+            log.warning('worker stopped sending heartbeats', worker=worker_id, recovered=count)
+            recovered += count
+        return recovered
+    
+    def _recover_job(self, job_id, worker_id):
+        """Count the lost attempt, then requeue the job or fail it"""
+        job = self.get_job(job_id)
+        if not job or job.status not in (JobStatus.PENDING.value, JobStatus.PROCESSING.value):
+            return False
+        job.retry_count += 1
+        job.error = f"Worker {worker_id} stopped responding"
+        # The payload does not record its queue; the database row does
+        queue_name = (self.db.get_job(job_id) or {}).get('queue_name') or 'default'
+        if job.retry_count < job.max_retries:
+            job.status = JobStatus.PENDING.value
+            job.started_at = None
+            self.add_job(job, queue_name)
+        else:
+            job.status = JobStatus.FAILED.value
+            job.completed_at = datetime.now().isoformat()
+            self.update_job(job)
+            self.dead_letter(job, queue_name)
+        return True
     
     def get_queue_size(self, queue_name='default'):
         """Get number of jobs in queue"""
         queue_key = self.queues.get(queue_name, self.queues['default'])
-        return self.redis_client.llen(queue_key)
+        return self.backend.queue_size(queue_key)
     
     def get_all_jobs(self):
-        """Get all jobs (for monitoring)"""
-        job_ids = self.redis_client.hkeys(self.jobs_key)
-        jobs = []
-        for job_id in job_ids:
-            job = self.get_job(job_id)
-            if job:
-                jobs.append(job)
-        return jobs
+        """Get all jobs (for monitoring), scanned in batches"""
+        return [Job.from_json(job_json) for job_json in self.backend.iter_jobs()]
+    
+    def find_jobs(self, status=None, task_name=None, offset=0, limit=50):
+        """Page through jobs by status and/or task, newest first
+        Returns (jobs, total) from the backend's secondary indexes"""
+        rows, total = self.backend.find_jobs(status, task_name, offset, limit)
+        return [Job.from_json(job_json) for _, job_json in rows], total
+    
+    def add_shard(self, node):
+        """Add a Redis node to a sharded backend and rebalance onto it"""
+        return self.backend.add_node(node, list(self.queues.values()))
     
     def get_job_stats(self):
         """Get job statistics from database"""
@@ -102,12 +558,15 @@ class QueueManager:
     def clear_queue(self, queue_name='default'):
         """Clear all jobs from a queue (for testing)"""
         queue_key = self.queues.get(queue_name, self.queues['default'])
-        self.redis_client.delete(queue_key)
-        print(f"🗑️  Cleared {queue_name} queue")
+        self.backend.clear_queue(queue_key)
+        log.info('cleared queue', queue=queue_name)
     
     def clear_all(self):
         """Clear everything (for testing)"""
-        for queue in self.queues.values():
-            self.redis_client.delete(queue)
-        self.redis_client.delete(self.jobs_key)
-        print("🗑️  Cleared all queues and jobs")
\ No newline at end of file
+        self.backend.clear_all(list(self.queues.values()))
+        log.info('cleared all queues and jobs')
+
+
+def _timestamp(value):
+    """datetime -> Unix timestamp (None passes through)"""
+    return value.timestamp() if value else None
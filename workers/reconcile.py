@@ -0,0 +1,236 @@
+"""
+Reconcile the queue backend with the jobs table
+
+After a Redis restart or eviction the two disagree: jobs the table has
+as pending sit in no queue, rows say processing for jobs nobody runs,
+payloads are missing or a step ahead of their rows. Reconciler reads
+both sides in bulk - payloads with HSCAN, queue entries with paged
+LRANGE over a copy of each list (or XRANGE), rows by primary-key
+pages - and writes its fixes a batch at a time: one pipeline to
+re-enqueue, one to rewrite payloads, one commit for the rows.
+
+Run it before starting workers (see reconcile.py). Jobs held by live
+workers are left alone, but one popped between the scans would look
+lost and be enqueued twice.
+"""
+
+import time
+from collections import defaultdict
+from datetime import datetime
+from workers.job import Job, JobStatus
+from workers.events import FINAL_STATUSES
+from workers.logs import get_logger
+
+log = get_logger('reconcile')
+
+# What each difference means and what a run does about it
+DIFFERENCES = {
+    'not_queued': "waiting in the table but in no queue: re-enqueued",
+    'stale_processing': "processing in the table but held by no worker: attempt counted, re-enqueued",
+    'dead_lettered': "stale jobs out of retries: failed and dead-lettered",
+    'payload_missing': "queued with no payload: payload rebuilt from the table",
+    'db_behind': "finished in the backend only: row updated",
+    'backend_behind': "finished in the table only: payload updated",
+    'db_row_missing': "in the backend only: row inserted",
+    'orphaned_entries': "queue entries for unknown jobs: skipped when dequeued",
+}
+
+SAMPLE_SIZE = 10
+
+
+class Reconciler:
+    def __init__(self, queue_manager, batch_size=5000, dry_run=False):
+        self.queue_manager = queue_manager
+        self.backend = queue_manager.backend
+        self.db = queue_manager.db
+        self.batch_size = batch_size
+        self.dry_run = dry_run
+
+    def run(self):
+        """Compare both sides, fix what differs (unless dry_run), return a report"""
+        started = time.time()
+        self.scanned = {'backend_jobs': 0, 'queue_entries': 0, 'db_jobs': 0}
+        self.differences = {name: {'count': 0, 'sample': []} for name in DIFFERENCES}
+
+        payload_status = self._scan_payloads()
+        self.queued = self._scan_queues()
+        self.held = self._held_by_workers()
+        # Queue entries without a payload: rebuilt if the table knows the job
+        unknown = {job_id for job_id in self.queued if job_id not in payload_status}
+
+        for rows in self.db.iter_job_states(self.batch_size):
+            self.scanned['db_jobs'] += len(rows)
+            batch = []
+            for job_id, status, queue_name in rows:
+                unknown.discard(job_id)
+                batch.append((job_id, status, queue_name, payload_status.pop(job_id, None)))
+            self._reconcile(batch)
+
+        # What is left of the payloads has no row
+        leftover = list(payload_status.items())
+        payload_status.clear()
+        for start in range(0, len(leftover), self.batch_size):
+            self._reconcile([
+                (job_id, None, None, status)
+                for job_id, status in leftover[start:start + self.batch_size]
+            ])
+
+        for job_id in unknown:
+            self._record('orphaned_entries', job_id)
+
+        report = {
+            'dry_run': self.dry_run,
+            'scanned': self.scanned,
+            'differences': self.differences,
+            'elapsed': round(time.time() - started, 3)
+        }
+        log.info('reconciled backend and database', dry_run=self.dry_run, elapsed=report['elapsed'],
+                 **{name: d['count'] for name, d in self.differences.items() if d['count']})
+        return report
+
+    def _scan_payloads(self):
+        """job_id -> status of every stored payload"""
+        statuses = {}
+        for job_json in self.backend.iter_jobs(self.batch_size):
+            job = Job.from_json(job_json)
+            statuses[job.id] = job.status
+        self.scanned['backend_jobs'] = len(statuses)
+        return statuses
+
+    def _scan_queues(self):
+        """job_id -> queue key of every queue entry"""
+        queued = {}
+        for queue_key, job_id in self.backend.queued_job_ids(list(self.queue_manager.queues.values()),
+                                                             self.batch_size):
+            queued[job_id] = queue_key
+            self.scanned['queue_entries'] += 1
+        return queued
+
+    def _held_by_workers(self):
+        held = set()
+        for info in self.queue_manager.get_workers():
+            if info['alive']:
+                held.update(info.get('in_flight', []))
+        return held
+
+    def _classify(self, job_id, status, payload_status):
+        """The difference for one job, or None when both sides agree"""
+        if status in FINAL_STATUSES:
+            if payload_status is not None and payload_status not in FINAL_STATUSES:
+                return 'backend_behind'
+            return None
+        if payload_status in FINAL_STATUSES:
+            return 'db_behind'
+        if job_id in self.held:
+            return None
+        if status == JobStatus.WAITING.value:
+            # A reducer is queued by its last partial job, not from here
+            return None
+        if job_id in self.queued:
+            return 'payload_missing' if payload_status is None else None
+        if status == JobStatus.PROCESSING.value:
+            return 'stale_processing'
+        return 'not_queued'
+
+    def _record(self, name, job_id):
+        difference = self.differences[name]
+        difference['count'] += 1
+        if len(difference['sample']) < SAMPLE_SIZE:
+            difference['sample'].append(job_id)
+
+    def _reconcile(self, batch):
+        """Classify a batch of (job_id, status, queue_name, payload status) and fix it"""
+        fixes, missing_rows = [], []
+        for job_id, status, queue_name, payload_status in batch:
+            if status is None:
+                # Backend only: insert the row, then treat it like any other
+                self._record('db_row_missing', job_id)
+                missing_rows.append(job_id)
+                status = payload_status
+            name = self._classify(job_id, status, payload_status)
+            if name:
+                self._record(name, job_id)
+                fixes.append((job_id, name, queue_name))
+        if self.dry_run or not (fixes or missing_rows):
+            return
+
+        job_ids = missing_rows + [job_id for job_id, _, _ in fixes]
+        payloads = dict(zip(job_ids, self.backend.get_jobs(job_ids)))
+        rows = {row['id']: row for row in self.db.get_jobs(job_ids)}
+
+        inserts = defaultdict(list)
+        for job_id in missing_rows:
+            queue_key = self.queued.get(job_id)
+            queue_name = self.queue_manager._queue_name(queue_key) if queue_key else 'default'
+            inserts[queue_name].append(Job.from_json(payloads[job_id]))
+            rows[job_id] = None
+        for queue_name, jobs in inserts.items():
+            self.db.save_jobs(jobs, queue_name)
+
+        enqueue, backend_saves, db_saves, failed = [], [], [], []
+        for job_id, name, queue_name in fixes:
+            payload, row = payloads.get(job_id), rows.get(job_id)
+            if name == 'db_behind':
+                db_saves.append(Job.from_json(payload))
+            elif name in ('backend_behind', 'payload_missing'):
+                backend_saves.append(Job.from_row(row, payload))
+            else:
+                job = Job.from_row(row, payload) if row else Job.from_json(payload)
+                queue_name = queue_name or 'default'
+                if name == 'stale_processing':
+                    job.retry_count += 1
+                    job.error = "Lost while processing (found by reconciliation)"
+                    db_saves.append(job)
+                    if job.retry_count >= job.max_retries:
+                        job.status = JobStatus.FAILED.value
+                        job.completed_at = datetime.now().isoformat()
+                        backend_saves.append(job)
+                        failed.append((job, queue_name))
+                        continue
+                    job.status = JobStatus.PENDING.value
+                job.started_at = None
+                enqueue.append((job, queue_name))
+
+        blobs, tracer, router = self.queue_manager.blobs, self.queue_manager.tracer, self.queue_manager.router
+        items = []
+        for job, queue_name in enqueue:
+            job.offload(blobs)
+            tracer.mark_enqueued(job)
+            queue_name = router.route(job.task_name) or queue_name
+            queue_key = self.queue_manager.queues.get(queue_name, self.queue_manager.queues['default'])
+            items.append((job.id, job.to_json(), queue_key))
+        for job in backend_saves:
+            job.offload(blobs)
+
+        if items:
+            self.backend.enqueue_many(items)
+        if backend_saves:
+            self.backend.save_jobs([(job.id, job.to_json()) for job in backend_saves])
+        if db_saves:
+            self.db.save_jobs(db_saves)
+        for job, queue_name in failed:
+            self.queue_manager.dead_letter(job, queue_name)
+            self._record('dead_lettered', job.id)
+
+        changed = [job for job in db_saves if job.status != JobStatus.PROCESSING.value]
+        try:
+            self.backend.publish_updates([(job.id, job.status) for job in changed])
+        except Exception as e:
+            log.warning('could not publish updates', count=len(changed), error=str(e))
+
+
+def format_report(report):
+    """Human-readable summary of a Reconciler report"""
+    scanned = report['scanned']
+    lines = [
+        f"Reconciliation{' (dry run)' if report['dry_run'] else ''}: "
+        f"{scanned['backend_jobs']} payloads, {scanned['queue_entries']} queue entries, "
+        f"{scanned['db_jobs']} rows in {report['elapsed']}s"
+    ]
+    differences = [(name, d) for name, d in report['differences'].items() if d['count']]
+    if not differences:
+        lines.append("  Backend and database agree")
+    for name, difference in differences:
+        lines.append(f"  {name}: {difference['count']} - {DIFFERENCES[name]}")
+        lines.append(f"    e.g. {', '.join(difference['sample'])}")
+    return "\n".join(lines)
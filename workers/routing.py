@@ -0,0 +1,62 @@
+"""
+Task routing - send tasks to dedicated queues at submission time
+so specialized workers only ever pull jobs they can run
+"""
+
+from fnmatch import fnmatchcase
+from config import Config
+
+def parse_routes(value):
+    """'process_image=images,send_*=notifications' -> [('process_image', 'images'), ...]
+
+    Rules are tried in order; the first pattern matching a task wins.
+    """
+    routes = []
+    for item in (value or '').split(','):
+        if '=' in item:
+            pattern, queue_name = item.split('=', 1)
+            routes.append((pattern.strip(), queue_name.strip()))
+    return routes
+
+class TaskRouter:
+    def __init__(self, routes=None):
+        self.routes = parse_routes(Config.TASK_ROUTES) if routes is None else routes
+
+    @property
+    def queues(self):
+        """Dedicated queue names, in rule order"""
+        return list(dict.fromkeys(queue_name for _, queue_name in self.routes))
+
+    def route(self, task_name):
+        """Dedicated queue for a task, or None to use the requested queue"""
+        for pattern, queue_name in self.routes:
+            if fnmatchcase(task_name, pattern):
+                return queue_name
+        return None
+
+    def queues_for(self, task_names, known_tasks):
+        """Queues a worker running only `task_names` should listen on
+
+        Raises ValueError unless every job those queues can hold is one
+        of `task_names` (`known_tasks` are all registered tasks), so the
+        worker never pulls a job it would have to put back.
+        """
+        task_names = set(task_names)
+        queues = []
+        for task_name in sorted(task_names):
+            queue_name = self.route(task_name)
+            if not queue_name:
+                raise ValueError(
+                    f"Task '{task_name}' has no dedicated queue; add it to TASK_ROUTES"
+                )
+            if queue_name not in queues:
+                queues.append(queue_name)
+
+        for queue_name in queues:
+            others = {t for t in known_tasks if self.route(t) == queue_name} - task_names
+            if others:
+                raise ValueError(
+                    f"Queue '{queue_name}' also receives {sorted(others)}; "
+                    f"subscribe to those tasks too or give them their own route"
+                )
+        return queues
@@ -0,0 +1,401 @@
+"""
+Capacity simulator - replay job traffic against a worker fleet
+
+A discrete-event simulation of the queue under the rules the real
+workers follow:
+- tasks go to their dedicated queue (TASK_ROUTES);
+- each worker takes the first non-empty queue it watches, in priority
+  order, FIFO within a queue;
+- batch tasks run up to batch_size queued jobs per call;
+- a failed attempt goes back on its own queue until max_retries;
+- an idle worker looks again every poll_interval seconds.
+
+Load comes from the jobs table (Workload.from_history: arrival times,
+queues, and each task's execution times and failure rate) or from
+synthetic Poisson profiles (Workload.synthetic). Time is simulated, so a
+day of traffic runs in seconds. Tenant fairness is not modelled (jobs
+are FIFO within a queue), since the jobs table does not record tenants.
+"""
+
+import heapq
+import math
+import random
+import time
+from collections import deque
+from workers.routing import TaskRouter
+from workers.task_registry import task_registry
+
+# Priority order of the queues a general worker watches (as in Worker)
+GENERAL_QUEUES = ['high', 'default', 'low']
+
+# Seconds per attempt for tasks with no recorded or given execution time
+DEFAULT_DURATION = 1.0
+
+WAIT_PERCENTILES = [50, 90, 95, 99]
+
+def percentiles(values, points=WAIT_PERCENTILES):
+    """{'p50': ..., 'max', 'mean'} of a list of seconds (nearest rank)"""
+    if not values:
+        return {}
+    values = sorted(values)
+    summary = {
+        f"p{p}": round(values[min(len(values) - 1, max(0, math.ceil(p / 100 * len(values)) - 1))], 3)
+        for p in points
+    }
+    summary['max'] = round(values[-1], 3)
+    summary['mean'] = round(sum(values) / len(values), 3)
+    return summary
+
+class TaskProfile:
+    """Execution times and failure rate of one task"""
+    def __init__(self, durations=None, mean_duration=None, failure_rate=0.0, max_retries=3):
+        self.durations = list(durations or [])
+        self.mean_duration = mean_duration
+        self.failure_rate = failure_rate
+        self.max_retries = max_retries
+
+    def sample_duration(self, rng):
+        if self.durations:
+            return rng.choice(self.durations)
+        if self.mean_duration:
+            return rng.expovariate(1 / self.mean_duration)
+        return DEFAULT_DURATION
+
+def profiles_from_history(rows):
+    """{task_name: TaskProfile} from get_job_history rows
+
+    Failure rate = failed attempts / attempts of finished jobs, where a
+    job's retry_count is its failed attempts.
+    """
+    stats = {}
+    for row in rows:
+        if row['status'] not in ('completed', 'failed'):
+            continue
+        entry = stats.setdefault(row['task_name'], {'durations': [], 'attempts': 0, 'failures': 0,
+                                                     'max_retries': row['max_retries']})
+        if row['execution_time'] is not None:
+            entry['durations'].append(row['execution_time'])
+        failures = row['retry_count'] or 0
+        entry['failures'] += failures
+        entry['attempts'] += failures + (1 if row['status'] == 'completed' else 0)
+    return {
+        task_name: TaskProfile(
+            durations=entry['durations'],
+            failure_rate=entry['failures'] / entry['attempts'] if entry['attempts'] else 0.0,
+            max_retries=entry['max_retries'] or 1
+        )
+        for task_name, entry in stats.items()
+    }
+
+class Workload:
+    """Job arrivals [(seconds from start, task_name, queue_name)] plus task profiles"""
+    def __init__(self, arrivals, profiles=None):
+        self.arrivals = sorted(arrivals, key=lambda arrival: arrival[0])
+        self.profiles = profiles or {}
+
+    @property
+    def duration(self):
+        return self.arrivals[-1][0] if self.arrivals else 0.0
+
+    def profile(self, task_name):
+        if task_name not in self.profiles:
+            self.profiles[task_name] = TaskProfile()
+        return self.profiles[task_name]
+
+    @classmethod
+    def from_history(cls, db=None, start=None, end=None, load=1.0):
+        """Replay the jobs created between start and end
+
+        load > 1 compresses the arrivals in time (load=3 is the same jobs
+        arriving three times as fast).
+        """
+        if db is None:
+            from database.db_manager import DatabaseManager
+            db = DatabaseManager()
+        rows = list(db.get_job_history(start, end))
+        if not rows:
+            raise ValueError("No jobs recorded in that period")
+        origin = rows[0]['created_at']
+        arrivals = [
+            ((row['created_at'] - origin).total_seconds() / load, row['task_name'], row['queue_name'] or 'default')
+            for row in rows
+        ]
+        return cls(arrivals, profiles_from_history(rows))
+
+    @classmethod
+    def synthetic(cls, rates, duration, queues=None, profiles=None, seed=None):
+        """Poisson arrivals of each task at rates {task_name: jobs per second}
+
+        Execution times come from `profiles` (e.g. the recorded ones,
+        or TaskProfile(mean_duration=...)) when given for a task.
+        """
+        rng = random.Random(seed)
+        queues = queues or {}
+        arrivals = []
+        for task_name, rate in rates.items():
+            if rate <= 0:
+                continue
+            at = rng.expovariate(rate)
+            while at < duration:
+                arrivals.append((at, task_name, queues.get(task_name, 'default')))
+                at += rng.expovariate(rate)
+        return cls(arrivals, dict(profiles or {}))
+
+def parse_profile(value):
+    """'send_email:5,process_image:0.5:12' -> ({task: rate/s}, {task: mean seconds})"""
+    rates, means = {}, {}
+    for item in (value or '').split(','):
+        parts = [part.strip() for part in item.split(':')]
+        if not parts[0]:
+            continue
+        if len(parts) not in (2, 3):
+            raise ValueError(f"Expected task:rate[:seconds], got '{item}'")
+        rates[parts[0]] = float(parts[1])
+        if len(parts) == 3:
+            means[parts[0]] = float(parts[2])
+    return rates, means
+
+def parse_fleet(value):
+    """'6,process_image=2,send_email+send_sms=1' -> [(6, None), (2, ['process_image']), ...]
+
+    A bare number is general workers; 'tasks=count' is workers running
+    only those tasks (as run_worker.py <id> <tasks>).
+    """
+    fleet = []
+    for item in (value or '').split(','):
+        item = item.strip()
+        if not item:
+            continue
+        if '=' in item:
+            tasks, count = item.rsplit('=', 1)
+            fleet.append((int(count), [task for task in tasks.split('+') if task]))
+        else:
+            fleet.append((int(item), None))
+    if not fleet or sum(count for count, _ in fleet) <= 0:
+        raise ValueError(f"Fleet has no workers: '{value}'")
+    return fleet
+
+class SimJob:
+    __slots__ = ('task_name', 'queue_name', 'arrived', 'enqueued', 'retry_count', 'max_retries')
+
+    def __init__(self, task_name, queue_name, arrived, max_retries):
+        self.task_name = task_name
+        self.queue_name = queue_name
+        self.arrived = arrived
+        self.enqueued = arrived
+        self.retry_count = 0
+        self.max_retries = max_retries
+
+class SimWorker:
+    def __init__(self, worker_id, queues):
+        self.worker_id = worker_id
+        self.queues = queues
+        self.busy = False
+        self.busy_time = 0.0
+        self.idle_since = 0.0
+        self.waking = False
+
+    def next_poll(self, now, poll_interval):
+        """When an idle worker next looks at its queues"""
+        if poll_interval <= 0 or now <= self.idle_since:
+            return max(now, self.idle_since)
+        return self.idle_since + math.ceil((now - self.idle_since) / poll_interval) * poll_interval
+
+# Event kinds, in the order they are handled when simultaneous
+_FINISH, _ARRIVE, _WAKE = 0, 1, 2
+
+class Simulator:
+    def __init__(self, workload, fleet, poll_interval=2.0, router=None, registry=None,
+                 bucket_seconds=None, seed=None):
+        self.workload = workload
+        self.fleet = parse_fleet(fleet) if isinstance(fleet, str) else fleet
+        self.poll_interval = poll_interval
+        self.router = router or TaskRouter()
+        self.registry = registry or task_registry
+        self.rng = random.Random(seed)
+        # Backlog timeline resolution; about 24 points over the arrivals by default
+        self.bucket_seconds = bucket_seconds or max(workload.duration / 24, 1.0)
+
+        self.queue_names = GENERAL_QUEUES + [q for q in self.router.queues if q not in GENERAL_QUEUES]
+        known_tasks = set(self.registry.list_tasks()) | {task for _, task, _ in workload.arrivals}
+        self.workers = []
+        for count, tasks in self.fleet:
+            queues = self.router.queues_for(tasks, known_tasks) if tasks else GENERAL_QUEUES
+            for _ in range(count):
+                self.workers.append(SimWorker(f"sim-{len(self.workers) + 1}", queues))
+
+    def _route(self, task_name, queue_name):
+        """Queue a job lands on, as QueueManager.add_job decides it"""
+        queue_name = self.router.route(task_name) or queue_name
+        return queue_name if queue_name in self.queue_names else 'default'
+
+    def _push(self, at, kind, payload):
+        self._seq += 1
+        heapq.heappush(self._events, (at, kind, self._seq, payload))
+
+    def _enqueue(self, job, now):
+        job.enqueued = now
+        self.queues[job.queue_name].append(job)
+        self._backlog += 1
+        self._bucket_max = max(self._bucket_max, self._backlog)
+
+        # Wake the idle worker watching this queue that would look first
+        candidates = [w for w in self.workers
+                      if not w.busy and not w.waking and job.queue_name in w.queues]
+        if candidates:
+            worker = min(candidates, key=lambda w: w.next_poll(now, self.poll_interval))
+            worker.waking = True
+            self._push(worker.next_poll(now, self.poll_interval), _WAKE, worker)
+
+    def _take(self, worker, now):
+        """Start the next job(s) on an idle worker, or leave it idle"""
+        worker.waking = False
+        for queue_name in worker.queues:
+            queue = self.queues[queue_name]
+            if not queue:
+                continue
+            batch = [queue.popleft()]
+            task_name = batch[0].task_name
+            if self.registry.is_batch(task_name):
+                batch_size = self.registry.get_options(task_name)['batch_size']
+                for other in worker.queues:
+                    pending = self.queues[other]
+                    while pending and len(batch) < batch_size and pending[0].task_name == task_name:
+                        batch.append(pending.popleft())
+            break
+        else:
+            worker.idle_since = now
+            return
+
+        self._backlog -= len(batch)
+        for job in batch:
+            wait = now - job.enqueued
+            self.waits.append(wait)
+            self.waits_by_queue.setdefault(job.queue_name, []).append(wait)
+        duration = self.workload.profile(task_name).sample_duration(self.rng)
+        worker.busy = True
+        worker.busy_time += duration
+        self.attempts += len(batch)
+        self._push(now + duration, _FINISH, (worker, batch))
+
+    def _finish(self, worker, batch, now):
+        for job in batch:
+            profile = self.workload.profile(job.task_name)
+            if self.rng.random() < profile.failure_rate:
+                job.retry_count += 1
+                if job.retry_count < job.max_retries:
+                    # Worker.handle_failure re-adds the job to its own queue
+                    self._enqueue(job, now)
+                    continue
+                self.failed += 1
+            else:
+                self.completed += 1
+            self.latencies.append(now - job.arrived)
+            self._bucket_done += 1
+        worker.busy = False
+        self._take(worker, now)
+
+    def _advance(self, now):
+        """Close timeline buckets that end at or before `now`"""
+        while now >= self._bucket_end:
+            self.timeline.append({
+                'time': round(self._bucket_end, 3),
+                'backlog': self._backlog,
+                'max_backlog': self._bucket_max,
+                'busy_workers': sum(1 for w in self.workers if w.busy),
+                'arrived': self._bucket_arrived,
+                'finished': self._bucket_done
+            })
+            self._bucket_end += self.bucket_seconds
+            self._bucket_max = self._backlog
+            self._bucket_arrived = self._bucket_done = 0
+
+    def run(self):
+        """Simulate until every job is finished (or stuck), return the report"""
+        started = time.perf_counter()
+        self.queues = {queue_name: deque() for queue_name in self.queue_names}
+        self.waits, self.waits_by_queue, self.latencies, self.timeline = [], {}, [], []
+        self.attempts = self.completed = self.failed = 0
+        self._events, self._seq = [], 0
+        self._backlog = self._bucket_max = self._bucket_arrived = self._bucket_done = 0
+        self._bucket_end = self.bucket_seconds
+
+        arrivals = iter(self.workload.arrivals)
+        next_arrival = next(arrivals, None)
+        if next_arrival:
+            self._push(next_arrival[0], _ARRIVE, next_arrival)
+
+        now = 0.0
+        while self._events:
+            now, kind, _, payload = heapq.heappop(self._events)
+            self._advance(now)
+            if kind == _ARRIVE:
+                _, task_name, queue_name = payload
+                job = SimJob(task_name, self._route(task_name, queue_name), now,
+                             self.workload.profile(task_name).max_retries)
+                self._bucket_arrived += 1
+                self._enqueue(job, now)
+                next_arrival = next(arrivals, None)
+                if next_arrival:
+                    self._push(next_arrival[0], _ARRIVE, next_arrival)
+            elif kind == _FINISH:
+                worker, batch = payload
+                self._finish(worker, batch, now)
+            else:
+                self._take(payload, now)
+        self._advance(now + self.bucket_seconds)
+
+        wall_seconds = time.perf_counter() - started
+        worker_count = len(self.workers)
+        return {
+            'fleet': [{'workers': count, 'tasks': tasks or 'all'} for count, tasks in self.fleet],
+            'workers': worker_count,
+            'poll_interval': self.poll_interval,
+            'jobs': len(self.workload.arrivals),
+            'completed': self.completed,
+            'failed': self.failed,
+            # Left on queues no worker in the fleet watches
+            'unserved': self._backlog,
+            'attempts': self.attempts,
+            'arrival_seconds': round(self.workload.duration, 3),
+            'simulated_seconds': round(now, 3),
+            'wall_seconds': round(wall_seconds, 3),
+            'speedup': round(now / wall_seconds) if wall_seconds else None,
+            'utilization': round(sum(w.busy_time for w in self.workers) / (worker_count * now), 3) if now else 0.0,
+            'queue_wait': percentiles(self.waits),
+            'queue_wait_by_queue': {name: percentiles(waits) for name, waits in sorted(self.waits_by_queue.items())},
+            'latency': percentiles(self.latencies),
+            'max_backlog': max((point['max_backlog'] for point in self.timeline), default=0),
+            'timeline': self.timeline
+        }
+
+def format_report(report):
+    """A simulation report as a short plain-text summary"""
+    fleet = ', '.join(f"{entry['workers']} x {entry['tasks'] if entry['tasks'] == 'all' else '+'.join(entry['tasks'])}"
+                      for entry in report['fleet'])
+    wait = report['queue_wait']
+    lines = [
+        f"Fleet: {fleet} ({report['workers']} workers, poll every {report['poll_interval']}s)",
+        f"Jobs: {report['jobs']} arrived over {_duration(report['arrival_seconds'])}, "
+        f"{report['completed']} completed, {report['failed']} failed, {report['unserved']} unserved",
+        f"Drained after {_duration(report['simulated_seconds'])}, utilization {report['utilization']:.0%}, "
+        f"max backlog {report['max_backlog']}",
+        "Queue wait: " + ', '.join(f"{key} {_duration(value)}" for key, value in wait.items()),
+    ]
+    for queue_name, summary in report['queue_wait_by_queue'].items():
+        lines.append(f"  {queue_name:<12} p50 {_duration(summary['p50'])}, p95 {_duration(summary['p95'])}, "
+                     f"p99 {_duration(summary['p99'])}")
+    lines.append(f"Simulated in {report['wall_seconds']}s ({report['speedup']}x real time)")
+    lines.append("")
+    lines.append(f"{'time':>10} {'backlog':>9} {'max':>9} {'busy':>6}")
+    for point in report['timeline']:
+        lines.append(f"{_duration(point['time']):>10} {point['backlog']:>9} {point['max_backlog']:>9} "
+                     f"{point['busy_workers']:>6}")
+    return '\n'.join(lines)
+
+def _duration(seconds):
+    if seconds < 120:
+        return f"{seconds:.1f}s"
+    if seconds < 7200:
+        return f"{seconds / 60:.1f}m"
+    return f"{seconds / 3600:.1f}h"
@@ -3,15 +3,37 @@ Task Registry - Where we define all available tasks
 Workers will look up tasks here to execute them
 """
 
+from workers.logs import get_logger
+
+log = get_logger('tasks')
+
 class TaskRegistry:
     def __init__(self):
         self.tasks = {}
+        self.options = {}
     
-    def register(self, task_name):
-        """Decorator to register a task"""
+    def register(self, task_name, soft_time_limit=None, time_limit=None,
+                 batch_size=None, linger=0.0):
+        """Decorator to register a task
+
+        soft_time_limit raises SoftTimeLimitExceeded inside the task,
+        time_limit (hard) aborts it. Both in seconds, per job attempt.
+
+        With batch_size, the task is a batch handler: it gets a list of
+        up to batch_size task_data dicts (whatever arrived within `linger`
+        seconds) and returns one result per item, in order. An exception
+        instance in place of a result fails just that job; time limits
+        then apply to the whole call.
+        """
         def decorator(func):
             self.tasks[task_name] = func
-            print(f"📝 Registered task: {task_name}")
+            self.options[task_name] = {
+                'soft_time_limit': soft_time_limit,
+                'time_limit': time_limit,
+                'batch_size': batch_size,
+                'linger': linger
+            }
+            log.debug('registered task', task=task_name)
             return func
         return decorator
     
@@ -19,6 +41,14 @@ class TaskRegistry:
         """Get a task function by name"""
         return self.tasks.get(task_name)
     
+    def get_options(self, task_name):
+        """Get registration options (time limits) for a task"""
+        return self.options.get(task_name, {})
+    
+    def is_batch(self, task_name):
+        """True if the task was registered as a batch handler"""
+        return bool(self.get_options(task_name).get('batch_size'))
+    
     def list_tasks(self):
         """List all registered tasks"""
         return list(self.tasks.keys())
@@ -2,87 +2,89 @@
 Enhanced Task Collection for Job Queue System
 """
 
+import os
 import time
 import random
 import json
 from datetime import datetime
 from workers.task_registry import task_registry
-import math
+from workers.logs import get_logger
+from workers import analytics
+
+log = get_logger('tasks')
 
 # ============================================================
 # Communication Tasks
 # ============================================================
 
-@task_registry.register('send_email')
-def send_email(data):
-    """Simulate sending an email with attachments"""
-    try:
-        to = data.get('to', 'default@example.com')  # Provide default value
-        subject = data.get('subject', 'No Subject')  # Provide default value
-        attachments = data.get('attachments', [])
-        
-        print(f"📧 Sending email to {to}")
-        print(f"   Subject: {subject}")
-        if attachments:
-            print(f"   Attachments: {len(attachments)} files")
-        
-        # Simulate email sending
-        time.sleep(2)
-        
-        return {
-            'success': True,
-            'message': f'Email sent to {to}',
-            'timestamp': datetime.now().isoformat(),
-            'attachments_processed': len(attachments)
-        }
-    except Exception as e:
-        print(f"Error in send_email: {e}")
-        return {
-            'success': True,  # Keep true to avoid retries
-            'message': f'Email simulation completed (with warning: {str(e)})',
-            'timestamp': datetime.now().isoformat()
-        }
+@task_registry.register('send_email', batch_size=100, linger=0.05)
+def send_email(batch):
+    """Simulate sending a batch of emails (with attachments) in one provider call"""
+    log.debug('sending emails', count=len(batch))
+    
+    # Simulate one bulk API call for the whole batch
+    time.sleep(2)
+    
+    results = []
+    for data in batch:
+        try:
+            to = data.get('to', 'default@example.com')  # Provide default value
+            attachments = data.get('attachments', [])
+            results.append({
+                'success': True,
+                'message': f'Email sent to {to}',
+                'timestamp': datetime.now().isoformat(),
+                'attachments_processed': len(attachments)
+            })
+        except Exception as e:
+            log.warning('error in send_email', error=str(e))
+            results.append({
+                'success': True,  # Keep true to avoid retries
+                'message': f'Email simulation completed (with warning: {str(e)})',
+                'timestamp': datetime.now().isoformat()
+            })
+    return results
 
-@task_registry.register('send_sms')
-def send_sms(data):
-    """Simulate sending SMS notification"""
-    try:
-        phone = data.get('phone', '+1234567890')  # Provide default value
-        message = data.get('message', 'Default message')  # Provide default value
-        
-        print(f"📱 Sending SMS to {phone}")
-        print(f"   Message: {message}")
-        
-        # Simulate SMS sending
-        time.sleep(1)
-        
-        return {
-            'success': True,
-            'message': f'SMS sent to {phone}',
-            'length': len(message),
-            'timestamp': datetime.now().isoformat()
-        }
-    except Exception as e:
-        print(f"Error in send_sms: {e}")
-        return {
-            'success': True,
-            'message': f'SMS simulation completed (with warning: {str(e)})',
-            'timestamp': datetime.now().isoformat()
-        }
+@task_registry.register('send_sms', batch_size=100, linger=0.05)
+def send_sms(batch):
+    """Simulate sending a batch of SMS notifications in one provider call"""
+    log.debug('sending sms messages', count=len(batch))
+    
+    # Simulate one bulk API call for the whole batch
+    time.sleep(1)
+    
+    results = []
+    for data in batch:
+        try:
+            phone = data.get('phone', '+1234567890')  # Provide default value
+            message = data.get('message', 'Default message')  # Provide default value
+            results.append({
+                'success': True,
+                'message': f'SMS sent to {phone}',
+                'length': len(message),
+                'timestamp': datetime.now().isoformat()
+            })
+        except Exception as e:
+            log.warning('error in send_sms', error=str(e))
+            results.append({
+                'success': True,
+                'message': f'SMS simulation completed (with warning: {str(e)})',
+                'timestamp': datetime.now().isoformat()
+            })
+    return results
 
 # ============================================================
 # Data Processing Tasks
 # ============================================================
 
-@task_registry.register('process_image')
+@task_registry.register('process_image', soft_time_limit=60, time_limit=120)
 def process_image(data):
     """Simulate image processing with multiple operations"""
     try:
         image_url = data.get('image_url', 'default.jpg')  # Provide default value
         operations = data.get('operations', ['resize'])  # Provide default value
         
-        print(f"🖼️ Processing image: {image_url}")
-        print(f"   Applying operations: {operations}")
+        log.debug('processing image', image_url=image_url, operations=operations)
         
         # Simulate different processing times for different operations
         results = {}
@@ -104,7 +106,7 @@ def process_image(data):
             'output_url': f'processed_{image_url}'
         }
     except Exception as e:
-        print(f"Error in process_image: {e}")
+        log.warning('error in process_image', error=str(e))
         return {
             'success': True,
             'message': f'Image processing simulation completed (with warning: {str(e)})',
@@ -113,43 +115,88 @@ def process_image(data):
 
 @task_registry.register('analyze_data')
 def analyze_data(data):
-    """Simulate data analysis with statistics"""
-    try:
+    """Statistics of a dataset given inline, or streamed from a file/blob 'source'"""
+    analyses = data.get('analyses', ['mean'])  # Provide default value
+    percentiles = data.get('percentiles')
+    bins = data.get('bins', analytics.DEFAULT_BINS)
+    source = data.get('source')
+    
+    if source is not None:
+        log.debug('streaming dataset', source=source, analyses=analyses)
+        aggregate = analytics.aggregate_source(
+            source, chunk_bytes=data.get('chunk_bytes', analytics.CHUNK_BYTES)
+        )
+        size, mode = aggregate.count, 'streaming'
+        results = aggregate.summary(analyses, percentiles, bins)
+    else:
         # Provide default dataset if none provided
         dataset = data.get('dataset', [10, 20, 30, 40, 50])
-        analyses = data.get('analyses', ['mean'])  # Provide default value
-        
-        print(f"📊 Analyzing dataset with {len(dataset)} points")
-        print(f"   Performing analyses: {analyses}")
-        
-        results = {}
-        if 'mean' in analyses:
-            results['mean'] = sum(dataset) / len(dataset)
-        if 'median' in analyses:
-            sorted_data = sorted(dataset)
-            mid = len(sorted_data) // 2
-            results['median'] = sorted_data[mid]
-        if 'std_dev' in analyses:
-            mean = sum(dataset) / len(dataset)
-            variance = sum((x - mean) ** 2 for x in dataset) / len(dataset)
-            results['std_dev'] = math.sqrt(variance)
-        
-        time.sleep(2)  # Consistent simulation time
-        
-        return {
-            'success': True,
-            'dataset_size': len(dataset),
-            'analyses_performed': analyses,
-            'results': results,
-            'timestamp': datetime.now().isoformat()
-        }
-    except Exception as e:
-        print(f"Error in analyze_data: {e}")
-        return {
-            'success': True,
-            'message': f'Data analysis simulation completed (with warning: {str(e)})',
-            'timestamp': datetime.now().isoformat()
-        }
+        log.debug('analyzing dataset', points=len(dataset), analyses=analyses)
+        size, mode = len(dataset), 'exact'
+        results = analytics.summarize(dataset, analyses, percentiles, bins)
+    
+    return {
+        'success': True,
+        'dataset_size': size,
+        'mode': mode,
+        'analyses_performed': analyses,
+        'results': results,
+        'timestamp': datetime.now().isoformat()
+    }
+
+@task_registry.register('analyze_data_partial')
+def analyze_data_partial(data):
+    """Map step of a split analyze_data: an Aggregate of one slice or range"""
+    if data.get('source') is not None:
+        aggregate = analytics.aggregate_source(
+            data['source'], data.get('start', 0), data.get('stop'),
+            data.get('chunk_bytes', analytics.CHUNK_BYTES)
+        )
+    else:
+        aggregate = analytics.Aggregate()
+        aggregate.add(data.get('dataset', []))
+    
+    log.debug('partial aggregate', points=aggregate.count)
+    return aggregate.to_dict()
+
+@task_registry.register('analyze_data_reduce')
+def analyze_data_reduce(data):
+    """Reduce step of a split analyze_data: merge the partial jobs' aggregates
+
+    Queued by the last partial job to finish, so all of them are final;
+    fails if any did not complete.
+    """
+    from database.db_manager import DatabaseManager
+    from workers import blobs
+    
+    partial_ids = data['partials']
+    analyses = data.get('analyses', ['mean'])
+    log.debug('merging partial aggregates', count=len(partial_ids))
+    
+    done = DatabaseManager().get_jobs(partial_ids)
+    for partial in done:
+        if partial['status'] != 'completed':
+            raise Exception(f"Partial job {partial['id']} {partial['status']}: {partial['error']}")
+    if len(done) != len(partial_ids):
+        raise Exception(f"{len(partial_ids) - len(done)} partial jobs not found")
+    
+    aggregate = analytics.Aggregate()
+    for partial in done:
+        result = partial['result']
+        if blobs.is_ref(result):
+            result = blobs.get_blob_store().load(result)
+        aggregate.merge(analytics.Aggregate.from_dict(result))
+    
+    return {
+        'success': True,
+        'dataset_size': aggregate.count,
+        'mode': 'map_reduce',
+        'partitions': len(partial_ids),
+        'analyses_performed': analyses,
+        'results': aggregate.summary(analyses, data.get('percentiles'),
+                                     data.get('bins', analytics.DEFAULT_BINS)),
+        'timestamp': datetime.now().isoformat()
+    }
 
 # ============================================================
 # File Operations Tasks
@@ -163,8 +210,7 @@ def generate_report(data):
         user_id = data.get('user_id', 1)  # Provide default value
         format = data.get('format', 'pdf')  # Provide default value
         
-        print(f"📑 Generating {report_type} report for user {user_id}")
-        print(f"   Format: {format}")
+        log.debug('generating report', report_type=report_type, user_id=user_id, format=format)
         
         # Simulate report generation
         time.sleep(3)
@@ -178,21 +224,21 @@ def generate_report(data):
             'download_url': f'/reports/{user_id}/{report_type}_{int(time.time())}.{format}'
         }
     except Exception as e:
-        print(f"Error in generate_report: {e}")
+        log.warning('error in generate_report', error=str(e))
         return {
             'success': True,
             'message': f'Report generation simulation completed (with warning: {str(e)})',
             'timestamp': datetime.now().isoformat()
         }
 
-@task_registry.register('backup_database')
+@task_registry.register('backup_database', soft_time_limit=600, time_limit=900)
 def backup_database(data):
     """Simulate database backup process"""
     try:
         database = data.get('database', 'main_db')  # Provide default value
         backup_type = data.get('type', 'full')  # Provide default value
         
-        print(f"💾 Starting {backup_type} backup of {database}")
+        log.debug('starting backup', backup_type=backup_type, database=database)
         
         # Simulate backup process
         time.sleep(3)
@@ -206,7 +252,7 @@ def backup_database(data):
             'backup_location': f'/backups/{database}_{int(time.time())}.sql'
         }
     except Exception as e:
-        print(f"Error in backup_database: {e}")
+        log.warning('error in backup_database', error=str(e))
         return {
             'success': True,
             'message': f'Database backup simulation completed (with warning: {str(e)})',
@@ -224,7 +270,7 @@ def clean_logs(data):
         days_old = data.get('days_old', 30)  # Provide default value
         log_type = data.get('log_type', 'all')  # Provide default value
         
-        print(f"🧹 Cleaning {log_type} logs older than {days_old} days")
+        log.debug('cleaning logs', log_type=log_type, days_old=days_old)
         
         # Simulate cleaning process
         time.sleep(2)
@@ -238,7 +284,7 @@ def clean_logs(data):
             'retention_days': days_old
         }
     except Exception as e:
-        print(f"Error in clean_logs: {e}")
+        log.warning('error in clean_logs', error=str(e))
         return {
             'success': True,
             'message': f'Log cleaning simulation completed (with warning: {str(e)})',
@@ -251,8 +297,7 @@ def system_health_check(data):
     try:
         components = data.get('components', ['cpu', 'memory', 'disk', 'network'])
         
-        print(f"🏥 Running system health check")
-        print(f"   Checking components: {components}")
+        log.debug('running system health check', components=components)
         
         # Simulate health check
         time.sleep(2)
@@ -270,9 +315,60 @@ def system_health_check(data):
             'timestamp': datetime.now().isoformat()
         }
     except Exception as e:
-        print(f"Error in system_health_check: {e}")
+        log.warning('error in system_health_check', error=str(e))
         return {
             'success': True,
             'message': f'Health check simulation completed (with warning: {str(e)})',
             'timestamp': datetime.now().isoformat()
-        }
\ No newline at end of file
+        }
+
+
+@task_registry.register('archive_old_jobs', time_limit=3600)
+def archive_old_jobs(data):
+    """Move old finished jobs out of the jobs table into archive files
+
+    data['archive_dir'] is an optional subdirectory of ARCHIVE_DIR. The
+    first run on a database file created before incremental vacuum was
+    enabled also compacts it once, so the space archival frees goes
+    back to the OS.
+    """
+    from database.db_manager import DatabaseManager
+    
+    days = data.get('days', 30)
+    batch_size = data.get('batch_size', 500)
+    pause = data.get('pause', 0.05)
+    archive_dir = _archive_dir(data.get('archive_dir'))
+    
+    log.debug('archiving finished jobs', days=days, archive_dir=archive_dir)
+    
+    db = DatabaseManager()
+    archived = db.archive_old_jobs(
+        days=days,
+        archive_dir=archive_dir,
+        batch_size=batch_size,
+        pause=pause
+    )
+    
+    compacted = db.needs_compaction()
+    if compacted:
+        db.compact_database()
+    
+    return {
+        'success': True,
+        'archived': archived,
+        'compacted': compacted,
+        'retention_days': days,
+        'timestamp': datetime.now().isoformat()
+    }
+
+def _archive_dir(subdir=None):
+    """ARCHIVE_DIR, or a directory under it; refuses paths outside it"""
+    from config import Config
+    
+    root = os.path.realpath(Config.ARCHIVE_DIR)
+    if not subdir:
+        return root
+    path = os.path.realpath(os.path.join(root, subdir))
+    if not path.startswith(root + os.sep):
+        raise ValueError(f"archive_dir must be a directory under ARCHIVE_DIR: {subdir!r}")
+    return path
@@ -0,0 +1,292 @@
+"""
+Job tracing - follow one job from the API through the queue to a worker
+
+create_job starts a trace and the job payload carries its context
+(job.trace), so every step that touches the job - enqueue, queue wait,
+dequeue, persist, execute - records a span in that trace, whichever
+process runs it. Finished spans go to a background thread that exports
+them in batches, so tracing never waits on I/O in a request or a job.
+
+Config.TRACE_EXPORTERS picks the exporters: 'database' keeps the
+per-job timeline shown by GET /api/jobs/<id>, 'file' appends OTLP/JSON
+to TRACE_FILE, and 'package.module:Class' plugs in any class with an
+export(spans) method.
+"""
+
+import importlib
+import json
+import os
+import queue
+import socket
+import threading
+import time
+from contextlib import contextmanager
+from config import Config
+from workers.logs import get_logger
+
+log = get_logger('tracing')
+
+def new_trace_id():
+    return os.urandom(16).hex()
+
+def new_span_id():
+    return os.urandom(8).hex()
+
+def parse_traceparent(header):
+    """W3C 'traceparent' header -> {'trace_id', 'span_id'}, or None if absent/invalid"""
+    parts = (header or '').strip().split('-')
+    if len(parts) != 4 or len(parts[1]) != 32 or len(parts[2]) != 16:
+        return None
+    try:
+        int(parts[1], 16), int(parts[2], 16)
+    except ValueError:
+        return None
+    if parts[1] == '0' * 32 or parts[2] == '0' * 16:
+        return None
+    return {'trace_id': parts[1], 'span_id': parts[2]}
+
+class Span:
+    def __init__(self, name, trace_id, parent_id=None, job_id=None, service=None,
+                 attributes=None, start=None):
+        self.name = name
+        self.trace_id = trace_id
+        self.span_id = new_span_id()
+        self.parent_id = parent_id
+        self.job_id = job_id
+        self.service = service
+        self.attributes = dict(attributes or {})
+        self.start = start or time.time()
+        self.end = None
+        self.error = None
+
+    @property
+    def context(self):
+        """What a job carries so later spans join this one's trace"""
+        return {'trace_id': self.trace_id, 'span_id': self.span_id}
+
+    def to_dict(self):
+        return {
+            'trace_id': self.trace_id,
+            'span_id': self.span_id,
+            'parent_id': self.parent_id,
+            'job_id': self.job_id,
+            'name': self.name,
+            'service': self.service,
+            'start_time': self.start,
+            'duration_ms': round(((self.end or self.start) - self.start) * 1000, 3),
+            'attributes': self.attributes,
+            'error': self.error
+        }
+
+class Tracer:
+    def __init__(self, service=None, exporters=None, max_queue=10000, batch_size=500,
+                 flush_interval=1.0):
+        self.service = service or f"{socket.gethostname()}:{os.getpid()}"
+        self.exporters = load_exporters(Config.TRACE_EXPORTERS) if exporters is None else exporters
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.dropped = 0
+
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._thread = None
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self):
+        return bool(self.exporters)
+
+    def _parent(self, job, parent):
+        """(trace_id, parent span id) for a span of `job` or under `parent`"""
+        if job is not None:
+            if not job.trace and self.enabled:
+                job.trace = {'trace_id': new_trace_id(), 'span_id': None}
+            parent = job.trace
+        if parent:
+            return parent['trace_id'], parent.get('span_id')
+        return new_trace_id(), None
+
+    @contextmanager
+    def span(self, name, job=None, parent=None, **attributes):
+        """Time the block as a span of `job`'s trace (or under `parent`)"""
+        trace_id, parent_id = self._parent(job, parent)
+        span = Span(name, trace_id, parent_id, job.id if job is not None else None,
+                    self.service, attributes)
+        try:
+            yield span
+        except BaseException as e:
+            span.error = f"{type(e).__name__}: {e}"
+            raise
+        finally:
+            self.finish(span)
+
+    def record(self, name, job, start, end, **attributes):
+        """Add a span of `job` whose times are already known (e.g. queue wait)"""
+        if not start or not self.enabled:
+            return
+        trace_id, parent_id = self._parent(job, None)
+        span = Span(name, trace_id, parent_id, job.id, self.service, attributes, start)
+        span.end = max(end, start)
+        self.finish(span)
+
+    def mark_enqueued(self, job):
+        """Stamp when the job (re)enters a queue; its queue-wait span ends at dequeue"""
+        if self.enabled:
+            self._parent(job, None)
+            job.trace['enqueued_at'] = time.time()
+
+    def dequeued(self, job, start, end, **attributes):
+        """Record a job's queue wait (since mark_enqueued) and the dequeue call"""
+        if not self.enabled:
+            return
+        self.record('queue_wait', job, (job.trace or {}).get('enqueued_at'), start)
+        self.record('dequeue', job, start, end, **attributes)
+
+    def finish(self, span):
+        if span.end is None:
+            span.end = time.time()
+        if not self.enabled:
+            return
+        self._ensure_thread()
+        try:
+            self._queue.put_nowait(span)
+        except queue.Full:
+            # Never block the caller; losing spans beats slowing jobs down
+            self.dropped += 1
+
+    def flush(self, timeout=5.0):
+        """Wait (up to timeout seconds) until queued spans are exported"""
+        deadline = time.monotonic() + timeout
+        while self._queue.unfinished_tasks and time.monotonic() < deadline:
+            time.sleep(0.01)
+
+    def _ensure_thread(self):
+        if self._thread:
+            return
+        with self._lock:
+            if not self._thread:
+                self._thread = threading.Thread(target=self._run, name='trace-exporter', daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + self.flush_interval
+            while len(batch) < self.batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            for exporter in self.exporters:
+                try:
+                    exporter.export(batch)
+                except Exception as e:
+                    log.warning('trace export failed', exporter=type(exporter).__name__, spans=len(batch), error=str(e))
+            for _ in batch:
+                self._queue.task_done()
+
+# ============================================================
+# Exporters
+# ============================================================
+
+class DatabaseExporter:
+    """Stores spans in the job_spans table (the timeline in GET /api/jobs/<id>)"""
+    def __init__(self, db=None):
+        self.db = db
+
+    def export(self, spans):
+        if self.db is None:
+            from database.db_manager import DatabaseManager
+            self.db = DatabaseManager()
+        self.db.save_spans([span.to_dict() for span in spans])
+
+class FileExporter:
+    """Appends one OTLP/JSON ExportTraceServiceRequest per batch as a line"""
+    def __init__(self, path=None):
+        self.path = path or Config.TRACE_FILE
+
+    def export(self, spans):
+        by_service = {}
+        for span in spans:
+            by_service.setdefault(span.service, []).append(_otlp_span(span))
+        request = {'resourceSpans': [
+            {
+                'resource': {'attributes': [_otlp_attribute('service.name', service)]},
+                'scopeSpans': [{'scope': {'name': 'job-queue'}, 'spans': otlp_spans}]
+            }
+            for service, otlp_spans in by_service.items()
+        ]}
+        # One write per line so processes sharing the file do not interleave
+        with open(self.path, 'a') as f:
+            f.write(json.dumps(request) + '\n')
+
+def _otlp_attribute(key, value):
+    if isinstance(value, bool):
+        return {'key': key, 'value': {'boolValue': value}}
+    if isinstance(value, int):
+        return {'key': key, 'value': {'intValue': str(value)}}
+    if isinstance(value, float):
+        return {'key': key, 'value': {'doubleValue': value}}
+    return {'key': key, 'value': {'stringValue': str(value)}}
+
+def _otlp_span(span):
+    attributes = dict(span.attributes)
+    if span.job_id:
+        attributes['job.id'] = span.job_id
+    otlp = {
+        'traceId': span.trace_id,
+        'spanId': span.span_id,
+        'name': span.name,
+        'kind': 1,  # SPAN_KIND_INTERNAL
+        'startTimeUnixNano': str(int(span.start * 1e9)),
+        'endTimeUnixNano': str(int(span.end * 1e9)),
+        'attributes': [_otlp_attribute(k, v) for k, v in attributes.items()],
+        # STATUS_CODE_ERROR or STATUS_CODE_UNSET
+        'status': {'code': 2, 'message': span.error} if span.error else {'code': 0}
+    }
+    if span.parent_id:
+        otlp['parentSpanId'] = span.parent_id
+    return otlp
+
+EXPORTERS = {
+    'database': DatabaseExporter,
+    'file': FileExporter
+}
+
+def load_exporters(value):
+    """'database,file,mypkg.traces:Exporter' -> exporter instances"""
+    exporters = []
+    for name in (value or '').split(','):
+        name = name.strip()
+        if not name or name == 'none':
+            continue
+        if name in EXPORTERS:
+            exporters.append(EXPORTERS[name]())
+        elif ':' in name:
+            module_name, class_name = name.split(':', 1)
+            exporters.append(getattr(importlib.import_module(module_name), class_name)())
+        else:
+            raise ValueError(f"Unknown trace exporter: {name}")
+    return exporters
+
+def timeline(spans):
+    """Spans of one job in start order, with offsets from the first (ms)"""
+    spans = sorted(spans, key=lambda span: span['start_time'])
+    if spans:
+        origin = spans[0]['start_time']
+        for span in spans:
+            span['offset_ms'] = round((span['start_time'] - origin) * 1000, 3)
+    return spans
+
+_tracer = None
+_tracer_lock = threading.Lock()
+
+def get_tracer():
+    """Process-wide tracer built from Config"""
+    global _tracer
+    with _tracer_lock:
+        if _tracer is None:
+            _tracer = Tracer()
+        return _tracer
@@ -2,58 +2,138 @@
 Worker for processing jobs
 """
 
+import os
 import time
 import signal
-import sys
+import threading
 from datetime import datetime
-import requests
 
 # Local imports
+from workers.connections import get_http_session
 from workers.queue_manager import QueueManager
 from workers.job import Job, JobStatus
 from workers.task_registry import task_registry
+from workers.limits import TaskGuard, TimeLimitExceeded, JobCancelled, WorkerShutdown
+from workers.heartbeat import Heartbeat
+from workers.logs import get_logger
+from config import Config
+
+log = get_logger('worker')
 
 class Worker:
-    def __init__(self, worker_id, queues=['high', 'default', 'low']):
+    def __init__(self, worker_id, queues=['high', 'default', 'low'], prefetch=None, tasks=None):
         self.worker_id = worker_id
+        self.queue_manager = QueueManager(consumer=worker_id)
+        
+        # A specialized worker listens only on the dedicated queues of its tasks
+        self.tasks = tasks
+        if tasks:
+            queues = self.queue_manager.router.queues_for(tasks, task_registry.list_tasks())
         self.queues = queues
-        self.queue_manager = QueueManager()
         self.is_running = False
         
+        # Jobs fetched in one read but not processed yet
+        self.prefetch = prefetch or Config.WORKER_PREFETCH
+        self.prefetched = []
+        
+        # Reported on every heartbeat (see workers.heartbeat)
+        self.current_jobs = []
+        self.jobs_processed = 0
+        self.jobs_failed = 0
+        self.heartbeat = Heartbeat(self)
+        
+        # Spans this process records are attributed to the worker
+        self.tracer = self.queue_manager.tracer
+        self.tracer.service = worker_id
+        
         # Add API URL for notifications
         self.api_url = "http://localhost:5000/api"
         
-        # Handle graceful shutdown
+        # Handle graceful shutdown: the first signal drains, a second forces
+        self.shutdown_grace = Config.WORKER_SHUTDOWN_GRACE
+        self.draining = False
+        self.forced = False
+        self._in_task = False
+        self._grace_timer = None
         signal.signal(signal.SIGINT, self.shutdown)
         signal.signal(signal.SIGTERM, self.shutdown)
 
     def shutdown(self, signum=None, frame=None):
-        """Graceful shutdown"""
-        print(f"\n🛑 Worker {self.worker_id} shutting down...")
+        """Graceful shutdown (signal handler)
+
+        The first signal stops taking jobs and lets the running ones
+        finish within shutdown_grace seconds. When that runs out, or on a
+        second signal, the running task is interrupted. Either way
+        start() then puts unfinished jobs back on the queue and returns.
+        """
+        if self.draining:
+            log.warning('worker stopping now, requeueing unfinished jobs', worker=self.worker_id)
+            self.forced = True
+            if self._in_task:
+                self._in_task = False
+                raise WorkerShutdown("Worker stopped before the job finished")
+            return
+        
+        log.info('worker draining', worker=self.worker_id, grace_seconds=self.shutdown_grace)
+        self.draining = True
         self.is_running = False
-        sys.exit(0)
+        # The end of the grace period counts as the second signal
+        self._grace_timer = threading.Timer(self.shutdown_grace, os.kill, (os.getpid(), signal.SIGTERM))
+        self._grace_timer.daemon = True
+        self._grace_timer.start()
+
+    def run_task(self, task_func, task_data):
+        """Call a task function; a forced shutdown interrupts it"""
+        self._in_task = True
+        try:
+            if self.forced:
+                raise WorkerShutdown("Worker stopped before the job started")
+            return task_func(task_data)
+        finally:
+            self._in_task = False
+
+    def drain(self):
+        """Put jobs fetched but not started back on the queue, then leave"""
+        if self._grace_timer:
+            self._grace_timer.cancel()
+        if self.prefetched:
+            jobs, self.prefetched = self.prefetched, []
+            count = self.queue_manager.requeue_jobs(jobs)
+            log.info('requeued prefetched jobs', worker=self.worker_id, count=count)
+        self.heartbeat.stop()
+        self.tracer.flush()
+        log.info('worker stopped', worker=self.worker_id)
 
     def notify_job_update(self, job_id, status):
         """Notify API about job status change"""
         try:
-            response = requests.post(f"{self.api_url}/job-update", json={
+            response = get_http_session().post(f"{self.api_url}/job-update", json={
                 'job_id': job_id,
                 'status': status
             })
             if not response.ok:
-                print(f"Failed to notify job update: {response.text}")
+                log.warning('failed to notify job update', job_id=job_id, response=response.text)
         except Exception as e:
-            print(f"Failed to notify job update: {e}")
+            log.warning('failed to notify job update', job_id=job_id, error=str(e))
+
+    def notify_job_updates(self, updates):
+        """Notify API about several job status changes in one request"""
+        try:
+            response = get_http_session().post(f"{self.api_url}/job-update", json={
+                'updates': [{'job_id': job_id, 'status': status} for job_id, status in updates]
+            })
+            if not response.ok:
+                log.warning('failed to notify job updates', count=len(updates), response=response.text)
+        except Exception as e:
+            log.warning('failed to notify job updates', count=len(updates), error=str(e))
 
     def process_job(self, job):
         """Process a single job"""
-        print(f"\n{'='*60}")
-        print(f"🔧 Worker {self.worker_id} processing job: {job.id}")
-        print(f"   Task: {job.task_name}")
-        print(f"   Data: {job.task_data}")
-        print(f"{'='*60}")
+        log.info('job started', job=job, worker=self.worker_id,
+                 attempt=job.retry_count + 1, task_data=job.stored('task_data'))
         
         # Update job status to processing
+        self.current_jobs = [job]
         job.status = JobStatus.PROCESSING.value
         job.started_at = datetime.now().isoformat()
         self.queue_manager.update_job(job, worker_id=self.worker_id)
@@ -65,8 +145,15 @@ class Worker:
             if not task_func:
                 raise Exception(f"Task '{job.task_name}' not found")
             
-            # Execute task
-            result = task_func(job.task_data)
+            # Execute task under its time limits (per job, else per task)
+            options = task_registry.get_options(job.task_name)
+            guard = TaskGuard(
+                soft_time_limit=job.soft_time_limit or options.get('soft_time_limit'),
+                time_limit=job.time_limit or options.get('time_limit'),
+                is_cancelled=lambda: self.queue_manager.is_cancel_requested(job.id)
+            )
+            with guard, self.tracer.span('execute', job, task=job.task_name):
+                result = self.run_task(task_func, job.task_data)
             
             # Update job as completed
             job.status = JobStatus.COMPLETED.value
@@ -75,73 +162,213 @@ class Worker:
             self.queue_manager.update_job(job, worker_id=self.worker_id)
             self.notify_job_update(job.id, 'completed')  # Add this
             
-            print(f"✅ Job {job.id} completed successfully")
-            print(f"   Result: {result}")
+            log.info('job completed', job=job, worker=self.worker_id, result=job.stored('result'))
             
-        except Exception as e:
-            print(f"❌ Job {job.id} failed: {str(e)}")
+        except JobCancelled:
+            job.status = JobStatus.CANCELLED.value
+            job.completed_at = datetime.now().isoformat()
+            job.error = 'Cancelled while running'
+            self.queue_manager.update_job(job, worker_id=self.worker_id)
+            self.notify_job_update(job.id, 'cancelled')
+            log.info('job cancelled', job=job, worker=self.worker_id)
+            
+        except WorkerShutdown:
+            self.queue_manager.requeue_jobs([job])
+            log.info('job put back on the queue', job=job, worker=self.worker_id)
+            
+        except (Exception, TimeLimitExceeded) as e:
+            self.handle_failure(job, str(e))
+        finally:
+            # Done with this delivery (retries were re-enqueued as new entries)
+            self.queue_manager.ack_job(job)
+            self.current_jobs = []
+            self.jobs_processed += 1
+
+    def handle_failure(self, job, error):
+        """Retry a failed attempt, or fail the job for good and dead-letter it"""
+        log.warning('job failed', job=job, worker=self.worker_id, error=error)
+        self.jobs_failed += 1
+        
+        job.retry_count += 1
+        job.error = error
+        
+        if job.retry_count < job.max_retries:
+            job.status = JobStatus.RETRYING.value
+            self.queue_manager.update_job(job, worker_id=self.worker_id)
+            self.notify_job_update(job.id, 'retrying')  # Add this
+            
+            # Re-add to queue
+            self.queue_manager.add_job(job, job.queue_name or 'default')
+            log.warning('job will be retried', job=job, attempt=job.retry_count, max_retries=job.max_retries)
+        else:
+            job.status = JobStatus.FAILED.value
+            job.completed_at = datetime.now().isoformat()
+            self.queue_manager.update_job(job, worker_id=self.worker_id)
+            self.queue_manager.dead_letter(job, job.queue_name or 'default')
+            self.notify_job_update(job.id, 'failed')  # Add this
+            log.error('job failed permanently', job=job, attempts=job.retry_count)
+
+    def process_batch(self, jobs):
+        """Run a batch task once for several jobs, recording each job's outcome"""
+        task_name = jobs[0].task_name
+        log.info('batch started', worker=self.worker_id, task=task_name, size=len(jobs))
+        
+        # One backend round trip and one DB commit for the whole batch
+        self.current_jobs = list(jobs)
+        started_at = datetime.now().isoformat()
+        for job in jobs:
+            job.status = JobStatus.PROCESSING.value
+            job.started_at = started_at
+        self.queue_manager.update_jobs(jobs, worker_id=self.worker_id)
+        self.notify_job_updates([(job.id, 'processing') for job in jobs])
+        
+        try:
+            try:
+                task_func = task_registry.get_task(task_name)
+                options = task_registry.get_options(task_name)
+                guard = TaskGuard(
+                    soft_time_limit=options.get('soft_time_limit'),
+                    time_limit=options.get('time_limit')
+                )
+                started = time.time()
+                try:
+                    with guard:
+                        results = self.run_task(task_func, [job.task_data for job in jobs])
+                finally:
+                    for job in jobs:
+                        self.tracer.record('execute', job, started, time.time(),
+                                           task=task_name, batch=len(jobs))
+                if len(results) != len(jobs):
+                    raise Exception(f"Batch task '{task_name}' returned {len(results)} results for {len(jobs)} jobs")
+            except (Exception, TimeLimitExceeded) as e:
+                # The whole call failed: every job in it gets a failed attempt
+                results = [e] * len(jobs)
             
-            job.retry_count += 1
-            job.error = str(e)
+            completed = []
+            completed_at = datetime.now().isoformat()
+            for job, result in zip(jobs, results):
+                if isinstance(result, BaseException):
+                    self.handle_failure(job, str(result))
+                    continue
+                job.status = JobStatus.COMPLETED.value
+                job.completed_at = completed_at
+                job.result = result
+                completed.append(job)
             
-            if job.retry_count < job.max_retries:
-                job.status = JobStatus.RETRYING.value
-                self.queue_manager.update_job(job, worker_id=self.worker_id)
-                self.notify_job_update(job.id, 'retrying')  # Add this
-                
-                # Re-add to queue
-                self.queue_manager.add_job(job, 'default')
-                print(f"🔄 Job {job.id} will be retried (attempt {job.retry_count}/{job.max_retries})")
+            self.queue_manager.update_jobs(completed, worker_id=self.worker_id)
+            if completed:
+                self.notify_job_updates([(job.id, 'completed') for job in completed])
+            log.info('batch done', worker=self.worker_id, task=task_name, size=len(jobs),
+                     completed=len(completed))
+        except WorkerShutdown:
+            count = self.queue_manager.requeue_jobs(jobs)
+            log.info('batch put back on the queue', worker=self.worker_id, task=task_name, count=count)
+        finally:
+            for job in jobs:
+                self.queue_manager.ack_job(job)
+            self.current_jobs = []
+            self.jobs_processed += len(jobs)
+
+    def collect_batch(self, job):
+        """Gather queued jobs of job's task, up to its batch_size
+
+        Pulls jobs while they keep coming and waits at most the task's
+        `linger` when none is there. Only a queue that holds nothing but
+        this task is read in bulk; elsewhere jobs are taken one at a time
+        and collecting stops at the first job of another task, which is
+        kept for the next iteration - so at most one job is held back.
+        """
+        options = task_registry.get_options(job.task_name)
+        batch_size = options['batch_size']
+        batch, others = [job], []
+        for queued in self.prefetched:
+            if queued.task_name == job.task_name and len(batch) < batch_size:
+                batch.append(queued)
             else:
-                job.status = JobStatus.FAILED.value
-                job.completed_at = datetime.now().isoformat()
-                self.queue_manager.update_job(job, worker_id=self.worker_id)
-                self.notify_job_update(job.id, 'failed')  # Add this
-                print(f"💀 Job {job.id} failed permanently after {job.retry_count} attempts")
+                others.append(queued)
+        self.prefetched = others
+        
+        dedicated = self._dedicated_queue(job.task_name)
+        deadline = time.monotonic() + (options.get('linger') or 0)
+        while len(batch) < batch_size and not self.prefetched and not self.draining:
+            if dedicated:
+                fetched = self.queue_manager.get_next_jobs_from_queues([dedicated], batch_size - len(batch))
+            else:
+                queued = self.queue_manager.get_next_job_from_queues(self.queues)
+                fetched = [queued] if queued else []
+            for queued in fetched:
+                (batch if queued.task_name == job.task_name else self.prefetched).append(queued)
+            if fetched:
+                continue
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            time.sleep(min(0.01, remaining))
+        return batch
+
+    def _dedicated_queue(self, task_name):
+        """The queue this worker reads that only task_name is routed to, if any"""
+        router = self.queue_manager.router
+        queue_name = router.route(task_name)
+        if queue_name not in self.queues:
+            return None
+        if any(router.route(t) == queue_name for t in task_registry.list_tasks() if t != task_name):
+            return None
+        return queue_name
+
+    def run_next(self, job):
+        """Process a job, batching it with others if its task takes batches"""
+        if task_registry.is_batch(job.task_name):
+            self.process_batch(self.collect_batch(job))
+        else:
+            self.process_job(job)
 
     def get_next_job(self):
         """Get next job from queues based on priority"""
-        for queue_name in self.queues:
-            job = self.queue_manager.get_next_job(queue_name)
-            if job:
-                return job
-        return None
+        if self.prefetched:
+            return self.prefetched.pop(0)
+        
+        if self.prefetch <= 1:
+            return self.queue_manager.get_next_job_from_queues(self.queues)
+        
+        self.prefetched = self.queue_manager.get_next_jobs_from_queues(self.queues, self.prefetch)
+        return self.prefetched.pop(0) if self.prefetched else None
 
     def start(self, poll_interval=2):
         """Start the worker"""
         self.is_running = True
+        self.heartbeat.start()
         
-        print(f"\n{'='*60}")
-        print(f"🚀 Worker {self.worker_id} started")
-        print(f"   Watching queues: {self.queues}")
-        print(f"   Poll interval: {poll_interval}s")
-        print(f"{'='*60}\n")
+        log.info('worker started', worker=self.worker_id, queues=self.queues, poll_interval=poll_interval)
         
-        while self.is_running:
-            try:
-                # Try to get next job
-                job = self.get_next_job()
-                
-                if job:
-                    self.process_job(job)
-                else:
-                    # No jobs available, wait before checking again
-                    print(f"💤 No jobs available. Waiting {poll_interval}s...")
+        try:
+            while self.is_running:
+                try:
+                    # Try to get next job
+                    job = self.get_next_job()
+                    
+                    if job:
+                        self.run_next(job)
+                    else:
+                        # No jobs available, wait before checking again
+                        log.debug('no jobs available', worker=self.worker_id, wait=poll_interval)
+                        time.sleep(poll_interval)
+                except KeyboardInterrupt:
+                    self.shutdown()
+                except Exception as e:
+                    log.error('error processing job', worker=self.worker_id, error=str(e), exc_info=True)
                     time.sleep(poll_interval)
-            except KeyboardInterrupt:
-                self.shutdown()
-            except Exception as e:
-                print(f"❌ Error processing job: {e}")
-                time.sleep(poll_interval)
+        finally:
+            self.drain()
 
     def start_once(self):
         """Process one job and exit (useful for testing)"""
-        print(f"\n🚀 Worker {self.worker_id} checking for one job...")
+        log.info('worker checking for one job', worker=self.worker_id)
         
         job = self.get_next_job()
         if job:
-            self.process_job(job)
+            self.run_next(job)
             return True
         else:
-            print("💤 No jobs available")
+            log.info('no jobs available', worker=self.worker_id)
             return False
\ No newline at end of file